@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CAM', '0003_camerafeed_trafficlog_delete_camera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camerafeed',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='camerafeed',
+            name='processed_frames',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='camerafeed',
+            name='processed_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='camerafeed',
+            name='tracker_epoch',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trafficlog',
+            name='tracker_epoch',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='trafficlog',
+            index=models.Index(fields=['camera', 'tracker_epoch', 'car_id'], name='CAM_traffic_camera__e96f58_idx'),
+        ),
+    ]
@@ -4,6 +4,11 @@ class CameraFeed(models.Model):
     camera_name = models.CharField(max_length=50, unique=True) # e.g., "Cam1", "Cam2"
     video_file = models.FileField(upload_to='camera_feeds/')
     last_processed = models.DateTimeField(auto_now=True)
+    # What the last scan covered, so the next one only processes new footage
+    processed_size = models.BigIntegerField(default=0)
+    processed_frames = models.IntegerField(default=0) # Next frame to read
+    fingerprint = models.CharField(max_length=64, blank=True) # Hash of the first bytes of the file
+    tracker_epoch = models.IntegerField(default=0) # Bumped whenever tracking (and car ids) restart
 
 class TrafficLog(models.Model):
     camera = models.ForeignKey(CameraFeed, on_delete=models.CASCADE)
@@ -11,6 +16,10 @@ class TrafficLog(models.Model):
     car_id = models.IntegerField() # Tracker ID from SORT
     timestamp = models.DateTimeField(auto_now_add=True)
     confidence = models.FloatField()
+    tracker_epoch = models.IntegerField(default=0) # car_id is unique per camera and epoch
+
+    class Meta:
+        indexes = [models.Index(fields=['camera', 'tracker_epoch', 'car_id'])]
 
     def __str__(self):
         return f"{self.license_plate} detected by {self.camera.camera_name}"
\ No newline at end of file
@@ -1,15 +1,83 @@
+import hashlib
 import os
 import random
-import pandas as pd
 from django.conf import settings
 from .models import CameraFeed, TrafficLog
-from alpr.core.algorithm import LicensePlateDetector
+from alpr.core.checkpoint import Checkpointer
+from alpr.jobs import check_lease
+from alpr.services import build_detector, detector_options
+
+# Bytes hashed to tell a recording that grew from a replaced file
+FINGERPRINT_BYTES = 1 << 20
+
+def head_fingerprint(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+
+def tracker_checkpoint(feed, fingerprint):
+    # Tracker state of the camera between scans; only valid for the same file, tracking run and options
+    path = os.path.join(settings.MEDIA_ROOT, 'checkpoints', f'camera_{feed.pk}.ckpt')
+    return Checkpointer(path, key=[fingerprint, feed.tracker_epoch, repr(sorted(detector_options().items()))])
+
+def plan_scan(feed):
+    """
+    Decide what a scan has to process for a feed.
+
+    Unchanged files (same size, not modified since last_processed) are skipped without reading
+    them. A file that kept its first bytes and grew is a recording being appended to: only the
+    frames from processed_frames on are processed, continuing the saved tracks. Anything else
+    is a new file, processed from the start in a new tracker epoch.
+
+    Returns:
+        tuple: (start_frame, stream snapshot or None, fingerprint, size), or None to skip the feed.
+    """
+    path = feed.video_file.path
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if stat.st_size == feed.processed_size and feed.last_processed is not None \
+            and stat.st_mtime <= feed.last_processed.timestamp():
+        return None
+
+    fingerprint = head_fingerprint(path)
+    appended = fingerprint == feed.fingerprint and stat.st_size >= feed.processed_size
+    if appended and stat.st_size == feed.processed_size:
+        # Only touched: remember it so the next scan skips it without hashing
+        feed.save(update_fields=['last_processed'])
+        return None
+
+    resume = tracker_checkpoint(feed, fingerprint).load() if appended else None
+    if resume is None:
+        # New file, or the tracks of the last scan are lost: car ids start over
+        feed.tracker_epoch += 1
+    start_frame = feed.processed_frames if appended else 0
+    return start_frame, resume['stream'] if resume else None, fingerprint, stat.st_size
+
+def log_best_reads(feed, df):
+    # One TrafficLog row per car and tracking run: a car seen again by a later scan updates its row
+    for car_id in df['car_id'].unique():
+        car_group = df[df['car_id'] == car_id]
+        # Get the best read based on confidence score
+        best_row = car_group.sort_values('license_number_score', ascending=False).iloc[0]
+        license_plate = str(best_row['license_number']).strip().upper()
+        confidence = float(best_row['license_number_score'])
+
+        log = TrafficLog.objects.filter(camera=feed, tracker_epoch=feed.tracker_epoch, car_id=int(car_id)).first()
+        if log is None:
+            TrafficLog.objects.create(
+                camera=feed, # Stores which camera (Cam1, Cam2, etc.)
+                car_id=int(car_id),
+                tracker_epoch=feed.tracker_epoch,
+                license_plate=license_plate,
+                confidence=confidence
+            )
+        elif confidence > log.confidence:
+            log.license_plate = license_plate
+            log.confidence = confidence
+            log.save(update_fields=['license_plate', 'confidence'])
 
 def process_random_camera_feeds():
-    detector = LicensePlateDetector(
-        model_path_yolo='yolov8n.pt', 
-        model_path_plate='license_plate_detector.pt'
-    )
+    from alpr.core.results_io import load_results_dataframe
 
     # Get all 5 camera feeds
     feeds = list(CameraFeed.objects.all())
@@ -17,27 +85,52 @@ def process_random_camera_feeds():
     # Randomly shuffle them if you want 'random' processing order
     random.shuffle(feeds)
 
+    # Only the footage added since the last scan is processed
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'checkpoints'), exist_ok=True)
+    plans = {}
+    for feed in feeds:
+        plan = plan_scan(feed)
+        if plan is not None:
+            plans[feed.camera_name] = plan
+    feeds = [feed for feed in feeds if feed.camera_name in plans]
+    if not feeds:
+        return
+
+    detector = build_detector()
+
+    # Define path for each camera's output
+    results_format = getattr(settings, 'ALPR_RESULTS_FORMAT', 'csv')
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'csvs'), exist_ok=True)
+    raw_csvs = {
+        feed.camera_name: os.path.join(settings.MEDIA_ROOT, 'csvs', f'{feed.camera_name}_results.{results_format}')
+        for feed in feeds
+    }
+
+    # 1. Run detection on all cameras together
+    # Frames of every feed are interleaved round-robin into shared model batches; each camera is
+    # its own stream, so tracks and car ids never mix between feeds
+    next_frames = detector.process_videos([
+        (feed.camera_name, feed.video_file.path, raw_csvs[feed.camera_name]) + tuple(plans[feed.camera_name][:2])
+        for feed in feeds
+    ])
+
+    # A scan that overran its lease may be running again on another worker: logging its reads
+    # and moving the feeds forward would then happen twice
+    check_lease()
+
     for feed in feeds:
-        # Define path for this specific camera's output
-        raw_csv = os.path.join(settings.MEDIA_ROOT, 'csvs', f'{feed.camera_name}_results.csv')
-        
-        # 1. Run detection
-        # This uses the process_video method from your algorithm.py
-        detector.process_video(feed.video_file.path, raw_csv)
+        raw_csv = raw_csvs[feed.camera_name]
+        _, _, fingerprint, size = plans[feed.camera_name]
 
         # 2. Read results and log them to the database
         if os.path.exists(raw_csv):
-            df = pd.read_csv(raw_csv)
+            df = load_results_dataframe(raw_csv, boxes=False)
             df = df[df['license_number'] != '0'] # Filter out non-detections
-            
-            for car_id in df['car_id'].unique():
-                car_group = df[df['car_id'] == car_id]
-                # Get the best read based on confidence score
-                best_row = car_group.sort_values('license_number_score', ascending=False).iloc[0]
-
-                TrafficLog.objects.create(
-                    camera=feed, # Stores which camera (Cam1, Cam2, etc.)
-                    car_id=int(car_id),
-                    license_plate=str(best_row['license_number']).strip().upper(),
-                    confidence=float(best_row['license_number_score'])
-                )
\ No newline at end of file
+            log_best_reads(feed, df)
+
+        # 3. Remember where this scan stopped, with the tracks still open at that point
+        feed.processed_frames = next_frames[feed.camera_name]
+        feed.processed_size = size
+        feed.fingerprint = fingerprint
+        tracker_checkpoint(feed, fingerprint).save(feed.processed_frames, detector.streams.get(feed.camera_name), None)
+        feed.save()
\ No newline at end of file
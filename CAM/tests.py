@@ -1,3 +1,112 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from .models import CameraFeed
+from .services import FINGERPRINT_BYTES, head_fingerprint, plan_scan, tracker_checkpoint
+
+
+class FakeStream:
+    def snapshot(self):
+        return {'tracks': [1, 2]}
+
+
+class PlanScanTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(self.media, 'camera_feeds'))
+        os.makedirs(os.path.join(self.media, 'checkpoints'))
+
+        self.feed = CameraFeed.objects.create(camera_name='Cam1', video_file='camera_feeds/cam1.mp4')
+        self.path = self.feed.video_file.path
+        self.write(os.urandom(FINGERPRINT_BYTES + 1000))
+
+    def write(self, data, mode='wb'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def scanned(self, processed_frames=40, checkpoint=True):
+        """ Record the current file as scanned up to processed_frames, as process_random_camera_feeds does """
+        self.feed.tracker_epoch += 1
+        self.feed.fingerprint = head_fingerprint(self.path)
+        self.feed.processed_size = os.path.getsize(self.path)
+        self.feed.processed_frames = processed_frames
+        if checkpoint:
+            tracker_checkpoint(self.feed, self.feed.fingerprint).save(processed_frames, FakeStream(), None)
+        self.feed.save()
+        # the scan ended a while ago, and the file is older than the scan
+        scanned_at = time.time() - 60
+        CameraFeed.objects.filter(pk=self.feed.pk).update(
+            last_processed=datetime.fromtimestamp(scanned_at, timezone.utc))
+        self.feed.refresh_from_db()
+        os.utime(self.path, (scanned_at - 60, scanned_at - 60))
+
+    def test_missing_file(self):
+        os.remove(self.path)
+        self.assertIsNone(plan_scan(self.feed))
+
+    def test_new_file(self):
+        self.assertEqual(plan_scan(self.feed), (0, None, head_fingerprint(self.path), os.path.getsize(self.path)))
+        self.assertEqual(self.feed.tracker_epoch, 1)
+
+    def test_unchanged_file_is_skipped(self):
+        self.scanned()
+        with self.assertNumQueries(0):
+            self.assertIsNone(plan_scan(self.feed))
+        self.assertEqual(self.feed.tracker_epoch, 1)
+
+    def test_touched_file_is_skipped_and_remembered(self):
+        self.scanned()
+        scanned_at = self.feed.last_processed
+        touched = time.time() - 10
+        os.utime(self.path, (touched, touched))
+        self.assertIsNone(plan_scan(self.feed))
+        self.feed.refresh_from_db()
+        self.assertGreater(self.feed.last_processed, scanned_at)
+        # the next scan skips it without hashing
+        with mock.patch('CAM.services.head_fingerprint') as fingerprint:
+            self.assertIsNone(plan_scan(self.feed))
+        fingerprint.assert_not_called()
+
+    def test_appended_file_resumes_the_tracks(self):
+        self.scanned()
+        self.write(b'more footage', 'ab')
+        self.assertEqual(plan_scan(self.feed), (40, {'tracks': [1, 2]}, self.feed.fingerprint,
+                                                os.path.getsize(self.path)))
+        self.assertEqual(self.feed.tracker_epoch, 1)
+
+    def test_appended_file_without_saved_tracks_starts_a_new_epoch(self):
+        self.scanned(checkpoint=False)
+        self.write(b'more footage', 'ab')
+        start_frame, resume, _, _ = plan_scan(self.feed)
+        self.assertEqual((start_frame, resume, self.feed.tracker_epoch), (40, None, 2))
+
+    def test_tracks_of_other_detector_options_are_not_resumed(self):
+        self.scanned()
+        self.write(b'more footage', 'ab')
+        with self.settings(ALPR_DETECTOR_OPTIONS={'batch_size': 8}):
+            start_frame, resume, _, _ = plan_scan(self.feed)
+        self.assertEqual((start_frame, resume, self.feed.tracker_epoch), (40, None, 2))
+
+    def test_replaced_file_starts_over(self):
+        self.scanned()
+        self.write(os.urandom(FINGERPRINT_BYTES + 5000))
+        self.assertEqual(plan_scan(self.feed), (0, None, head_fingerprint(self.path), os.path.getsize(self.path)))
+        self.assertEqual(self.feed.tracker_epoch, 2)
+
+    def test_truncated_file_starts_over(self):
+        self.scanned()
+        with open(self.path, 'r+b') as f:
+            f.truncate(FINGERPRINT_BYTES + 10)
+        self.assertEqual(plan_scan(self.feed)[:2], (0, None))
+        self.assertEqual(self.feed.tracker_epoch, 2)
@@ -1,8 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from .models import TrafficLog, CameraFeed
-from .services import process_random_camera_feeds 
-import threading
+from alpr.jobs import PRIORITY_CAMERA_SCAN, enqueue
 
 # --- CONFIGURATION: CAMERA LOCATIONS ---
 # (Latitude, Longitude) for your 5 cameras
@@ -63,7 +62,7 @@ def unified_dashboard(request):
     })
 
 def trigger_processing(request):
-    thread = threading.Thread(target=process_random_camera_feeds)
-    thread.start()
+    # Picked up by a `manage.py run_jobs` worker
+    enqueue('camera_scan', priority=PRIORITY_CAMERA_SCAN)
     messages.success(request, "SYSTEM SCAN INITIATED: Processing feeds...")
     return redirect('dashboard')
\ No newline at end of file
@@ -1,3 +1,104 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import textwrap
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.test import SimpleTestCase
+
+from .utils import super_resolution
+from .utils.super_resolution import upscale_plates
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that cost seconds and hundreds of MB to import: only the code paths that use them may load them
+HEAVY_MODULES = ('tensorflow', 'tensorflow_hub', 'easyocr', 'torch', 'ultralytics')
+
+
+class LazyImportTests(SimpleTestCase):
+
+    def test_plate_utils_import_without_heavy_modules(self):
+        # a fresh interpreter, so modules imported by other tests don't count; every attempt to
+        # import a heavy module is recorded, even one that is not installed or caught by the caller
+        script = textwrap.dedent("""
+            import sys
+
+            HEAVY = %r
+            attempts = []
+
+            class Recorder:
+                def find_spec(self, name, path=None, target=None):
+                    if name.split('.')[0] in HEAVY:
+                        attempts.append(name)
+                    return None
+
+            sys.meta_path.insert(0, Recorder())
+            import LicensePlate.utils.LicensePlate
+            import LicensePlate.utils.super_resolution
+            print(sorted(set(attempts) | {name for name in sys.modules if name.split('.')[0] in HEAVY}))
+        """ % (HEAVY_MODULES,))
+        result = subprocess.run([sys.executable, '-c', script], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+
+class UpscalePlatesTests(SimpleTestCase):
+
+    def setUp(self):
+        # 80 px: legible, 40 px: bicubic, 10-16 px: ESRGAN, 3 px: too small for ESRGAN
+        self.crops = [np.full((height, 2 * height, 3), height, np.uint8) for height in (80, 10, 40, 12, 3, 16)]
+        patch = mock.patch.object(super_resolution, '_esrgan_error', None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def assertInterpolated(self, crop, upscaled):
+        self.assertEqual(upscaled.shape, (crop.shape[0] * 4, crop.shape[1] * 4, 3))
+        self.assertTrue((upscaled == crop[0, 0]).all())
+
+    def test_tiers(self):
+        def esrgan_batch(crops):
+            return [np.full((crop.shape[0] * 4, crop.shape[1] * 4, 3), 255, np.uint8) for crop in crops]
+
+        with mock.patch.object(super_resolution, 'get_esrgan_model') as get_esrgan_model, \
+                mock.patch.object(super_resolution, '_esrgan_batch', side_effect=esrgan_batch) as batch:
+            upscaled = upscale_plates(self.crops, batch_size=2)
+
+        get_esrgan_model.assert_called_with()
+        # the three tiny crops, in batches of at most two
+        self.assertEqual([[crop.shape[0] for crop in call.args[0]] for call in batch.call_args_list], [[10, 12], [16]])
+        self.assertIs(upscaled[0], self.crops[0])
+        for i in (2, 4):
+            self.assertInterpolated(self.crops[i], upscaled[i])
+        for i in (1, 3, 5):
+            self.assertEqual(upscaled[i].shape, (self.crops[i].shape[0] * 4, self.crops[i].shape[1] * 4, 3))
+            self.assertTrue((upscaled[i] == 255).all())
+
+    def test_tier_heights_from_settings(self):
+        with self.settings(SR_SKIP_HEIGHT=12, SR_ESRGAN_HEIGHT=4), \
+                mock.patch.object(super_resolution, '_esrgan_batch') as batch:
+            upscaled = upscale_plates(self.crops)
+        batch.assert_not_called()
+        for i in (0, 2, 3, 5):
+            self.assertIs(upscaled[i], self.crops[i])
+        for i in (1, 4):
+            self.assertInterpolated(self.crops[i], upscaled[i])
+
+    def test_bicubic_without_esrgan(self):
+        with mock.patch.object(super_resolution, 'get_esrgan_model',
+                               side_effect=ImportError("No module named 'tensorflow'")) as get_esrgan_model, \
+                mock.patch.object(super_resolution, '_esrgan_batch') as batch, \
+                self.assertLogs(super_resolution.logger, 'WARNING') as logs:
+            upscaled = upscale_plates(self.crops)
+            upscale_plates(self.crops)
+
+        batch.assert_not_called()
+        # the failed load is neither retried nor logged again
+        get_esrgan_model.assert_called_once_with()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('tensorflow', logs.output[0])
+        self.assertIs(upscaled[0], self.crops[0])
+        for i in range(1, len(self.crops)):
+            self.assertInterpolated(self.crops[i], upscaled[i])
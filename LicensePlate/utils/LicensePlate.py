@@ -1,14 +1,16 @@
-import cv2
 import os
 import re
-from ultralytics import YOLO
-import easyocr
-from .super_resolution import upscale_plate_opencv
+from django.conf import settings
+from alpr.core.backends import backend_options
+from alpr.core.registry import get_ocr_reader, get_yolo
+from .super_resolution import upscale_plates
 
 MODEL_PATH = "license_plate_detector.pt"
-model = YOLO(MODEL_PATH)
 
-ocr_reader = easyocr.Reader(['en'], gpu=False)
+
+def get_plate_model():
+    # e.g. LICENSE_PLATE_BACKEND = {'backend': 'openvino', 'int8': True, 'calibration': 'media/calibration'}
+    return get_yolo(MODEL_PATH, **backend_options(getattr(settings, 'LICENSE_PLATE_BACKEND', None)))
 
 
 def clean_plate_text(text):
@@ -17,13 +19,20 @@ def clean_plate_text(text):
     return text
 
 
-def detect_license_plates(image_path, save_dir="media/plates/"):
+def read_plate_text(ocr_detections):
+    return clean_plate_text(" ".join(ocr_detections))
+
+
+def detect_license_plates(image_path, save_dir="media/plates/", ocr_executor=None):
+    import cv2
+
     os.makedirs(save_dir, exist_ok=True)
 
     image = cv2.imread(image_path)
-    results = model.predict(source=image, conf=0.25, verbose=False)
+    results = get_plate_model().predict(source=image, conf=0.25, verbose=False)
 
-    plates_data = []
+    crop_paths = []
+    cropped_plates = []
 
     for result in results:
         if result.boxes is None:
@@ -32,21 +41,25 @@ def detect_license_plates(image_path, save_dir="media/plates/"):
         for i, box in enumerate(result.boxes.xyxy):
             x1, y1, x2, y2 = map(int, box)
 
-            cropped_plate = image[y1:y2, x1:x2]
-
-            # 🔥 SUPER RESOLUTION
-            upscaled_plate = upscale_plate_opencv(cropped_plate)
+            cropped_plates.append(image[y1:y2, x1:x2])
+            crop_paths.append(os.path.join(save_dir, f"plate_{i}.jpg"))
 
-            crop_path = os.path.join(save_dir, f"plate_{i}.jpg")
-            cv2.imwrite(crop_path, upscaled_plate)
+    # 🔥 SUPER RESOLUTION: large plates skipped, medium interpolated, tiny ones batched through ESRGAN
+    upscaled_plates = upscale_plates(cropped_plates)
+    for crop_path, upscaled_plate in zip(crop_paths, upscaled_plates):
+        cv2.imwrite(crop_path, upscaled_plate)
 
-            # OCR on UPSCALED image
-            ocr_result = ocr_reader.readtext(upscaled_plate, detail=0)
-            plate_text = clean_plate_text(" ".join(ocr_result))
+    # OCR on UPSCALED images, batched in the OCR worker processes when available
+    if ocr_executor is not None:
+        plate_texts = ocr_executor.read(upscaled_plates, parse=read_plate_text, detail=0)
+    else:
+        plate_texts = [read_plate_text(get_ocr_reader().readtext(plate, detail=0)) for plate in upscaled_plates]
 
-            plates_data.append({
-                "image": crop_path,
-                "text": plate_text
-            })
+    plates_data = []
+    for crop_path, plate_text in zip(crop_paths, plate_texts):
+        plates_data.append({
+            "image": crop_path,
+            "text": plate_text
+        })
 
     return plates_data
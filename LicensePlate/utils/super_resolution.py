@@ -1,40 +1,147 @@
-import tensorflow as tf
-import tensorflow_hub as hub
-import numpy as np
-import cv2
+import logging
+import os
+
+from django.conf import settings
+
+from alpr.core.registry import get_model
+
+logger = logging.getLogger(__name__)
 
-# Load ESRGAN model ONCE
 ESRGAN_MODEL_URL = "https://tfhub.dev/captain-pool/esrgan-tf2/1"
-esrgan_model = hub.load(ESRGAN_MODEL_URL)
+# Local copy of the ESRGAN SavedModel, filled from tfhub the first time it is needed
+ESRGAN_MODEL_DIR = os.environ.get("ESRGAN_MODEL_DIR", os.path.join("models", "esrgan-tf2"))
+
+# Super-resolution tiers, by plate height in pixels (override in settings):
+#   height >= SR_SKIP_HEIGHT                      -> legible already, left as is
+#   SR_ESRGAN_HEIGHT <= height < SR_SKIP_HEIGHT   -> OpenCV bicubic x4
+#   height < SR_ESRGAN_HEIGHT                     -> ESRGAN x4, batched
+SR_SKIP_HEIGHT = 64
+SR_ESRGAN_HEIGHT = 24
+SR_SCALE = 4  # ESRGAN upscales x4, the interpolation tier matches it
+SR_BATCH_SIZE = 16
 
+# Why ESRGAN could not be loaded in this process, once it failed (tiny crops then use bicubic)
+_esrgan_error = None
 
-def upscale_plate_opencv(cropped_plate):
+
+def esrgan_model_dir():
+    return getattr(settings, "ESRGAN_MODEL_DIR", ESRGAN_MODEL_DIR)
+
+
+def get_esrgan_model():
     """
-    Takes OpenCV BGR image → returns upscaled OpenCV BGR image
+    Load ESRGAN ONCE per process, on first use.
+
+    The SavedModel is read from the local model cache; only when the cache is empty is it
+    downloaded from tfhub and saved there, so later processes start without network.
     """
+    def load():
+        import tensorflow as tf
 
-    # Convert BGR → RGB
-    img_rgb = cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2RGB)
+        model_dir = esrgan_model_dir()
+        if os.path.exists(os.path.join(model_dir, "saved_model.pb")):
+            return tf.saved_model.load(model_dir)
+
+        import tensorflow_hub as hub
+        model = hub.load(ESRGAN_MODEL_URL)
+        os.makedirs(model_dir, exist_ok=True)
+        tf.saved_model.save(model, model_dir)
+        return model
+
+    return get_model(("esrgan", os.path.abspath(esrgan_model_dir())), load)
+
+
+def esrgan_available():
+    """
+    Whether ESRGAN can run in this process, loading it if needed.
+
+    A failed load (tensorflow not installed, no cached model and no network, ...) is logged once
+    and not retried.
+    """
+    global _esrgan_error
+    if _esrgan_error is not None:
+        return False
+    try:
+        get_esrgan_model()
+    except Exception as e:
+        _esrgan_error = e
+        logger.warning("ESRGAN unavailable, upscaling tiny plates with bicubic interpolation: %s", e)
+        return False
+    return True
+
+
+def _esrgan_batch(crops):
+    """
+    Upscale BGR crops x4 with a single ESRGAN call.
+
+    The crops are trimmed to multiples of 4, edge-padded to a common size so they can be stacked,
+    and the padding is cut off the outputs again.
+    """
+    import cv2
+    import numpy as np
+    import tensorflow as tf
+
+    rgb = [cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) for crop in crops]
+    rgb = [img[:(img.shape[0] // 4) * 4, :(img.shape[1] // 4) * 4] for img in rgb]
+    height = max(img.shape[0] for img in rgb)
+    width = max(img.shape[1] for img in rgb)
+    batch = np.stack([
+        cv2.copyMakeBorder(img, 0, height - img.shape[0], 0, width - img.shape[1], cv2.BORDER_REPLICATE)
+        for img in rgb
+    ])
+
+    sr_batch = get_esrgan_model()(tf.convert_to_tensor(batch, dtype=tf.float32))
+    sr_batch = tf.cast(tf.clip_by_value(sr_batch, 0, 255), tf.uint8).numpy()
+
+    return [
+        cv2.cvtColor(sr[:img.shape[0] * SR_SCALE, :img.shape[1] * SR_SCALE], cv2.COLOR_RGB2BGR)
+        for sr, img in zip(sr_batch, rgb)
+    ]
+
+
+def upscale_plates(crops, skip_height=None, esrgan_height=None, batch_size=None):
+    """
+    Size-gated super resolution of plate crops.
+
+    Args:
+        crops (list): OpenCV BGR plate crops.
+        skip_height (int): Crops at least this tall are returned unchanged (SR_SKIP_HEIGHT).
+        esrgan_height (int): Crops shorter than this go through ESRGAN, the others through
+            bicubic interpolation (SR_ESRGAN_HEIGHT). Without ESRGAN (see esrgan_available)
+            they are interpolated too.
+        batch_size (int): Maximum number of crops per ESRGAN call (SR_BATCH_SIZE).
+
+    Returns:
+        list: Upscaled crops, in the order of crops.
+    """
+    import cv2
 
-    # Make dimensions divisible by 4
-    h, w, _ = img_rgb.shape
-    h = (h // 4) * 4
-    w = (w // 4) * 4
-    img_rgb = img_rgb[:h, :w]
+    skip_height = skip_height or getattr(settings, "SR_SKIP_HEIGHT", SR_SKIP_HEIGHT)
+    esrgan_height = esrgan_height or getattr(settings, "SR_ESRGAN_HEIGHT", SR_ESRGAN_HEIGHT)
+    batch_size = batch_size or getattr(settings, "SR_BATCH_SIZE", SR_BATCH_SIZE)
 
-    # Convert to Tensor
-    img_tensor = tf.convert_to_tensor(img_rgb, dtype=tf.float32)
-    img_tensor = tf.expand_dims(img_tensor, axis=0)
+    upscaled = list(crops)
+    interpolated = []
+    tiny = []
+    for i, crop in enumerate(crops):
+        h, w = crop.shape[:2]
+        if h >= skip_height or h == 0 or w == 0:
+            continue
+        if h < esrgan_height and h >= 4 and w >= 4:
+            tiny.append(i)
+        else:
+            interpolated.append(i)
 
-    # Super Resolution
-    sr_tensor = esrgan_model(img_tensor)
-    sr_tensor = tf.squeeze(sr_tensor)
+    if tiny and not esrgan_available():
+        interpolated, tiny = interpolated + tiny, []
 
-    # Normalize and convert back to uint8
-    sr_image = tf.clip_by_value(sr_tensor, 0, 255)
-    sr_image = tf.cast(sr_image, tf.uint8).numpy()
+    for i in interpolated:
+        h, w = crops[i].shape[:2]
+        upscaled[i] = cv2.resize(crops[i], (w * SR_SCALE, h * SR_SCALE), interpolation=cv2.INTER_CUBIC)
 
-    # RGB → BGR (for OpenCV + EasyOCR)
-    sr_bgr = cv2.cvtColor(sr_image, cv2.COLOR_RGB2BGR)
+    for start in range(0, len(tiny), batch_size):
+        indices = tiny[start:start + batch_size]
+        for i, sr in zip(indices, _esrgan_batch([crops[i] for i in indices])):
+            upscaled[i] = sr
 
-    return sr_bgr
+    return upscaled
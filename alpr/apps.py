@@ -1,5 +1,17 @@
+import logging
+import os
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class AlprConfig(AppConfig):
     name = 'alpr'
+
+    def ready(self):
+        # Preload-then-fork (e.g. gunicorn --preload): load the models once in the master
+        # process so every forked worker shares the weights instead of loading its own copy.
+        if os.environ.get('ALPR_PRELOAD_MODELS'):
+            from .services import preload_models
+            for model in preload_models():
+                logger.info("Preloaded %s: %s MB in %s s", model['model'], model['rss_mb'], model['load_seconds'])
@@ -1,145 +1,450 @@
+import logging
+
 import cv2
 import numpy as np
-import pandas as pd
-import ast
-from scipy.interpolate import interp1d
-from ultralytics import YOLO
-from alpr.sort.sort import Sort
-from .utils_alpr import get_car, read_license_plate, write_csv
+from concurrent.futures import Future
+from alpr.sort.bank import BankSort
+from alpr.sort.sort import Sort, iou_batch
+from .backends import backend_options
+from .consensus import PlateReadingAccumulator
+from .interpolation import interpolate_columns, interpolate_rows
+from .motion import MotionGate
+from .ocr_cache import PlateOCRCache
+from .pipeline import run_pipelined
+from .fused import LookbackRenderer
+from .results_io import CAR_BBOX, PLATE_BBOX, load_results_dataframe, open_result_writer, open_row_writer
+from .registry import get_ocr_executor, get_yolo
+from .scheduler import process_streams
+from .streams import StreamState, TrackerManager
+from .utils_alpr import assign_plates_to_cars, parse_license_plate, read_license_plate
+
+logger = logging.getLogger(__name__)
+
+# 'bank' runs the Kalman filters of all tracks as one vectorized filter bank, with the same output as 'sort'
+TRACKERS = {'sort': Sort, 'bank': BankSort}
 
 class LicensePlateDetector:
-    def __init__(self, model_path_yolo, model_path_plate):
-        self.coco_model = YOLO(model_path_yolo)
-        self.license_plate_detector = YOLO(model_path_plate)
-        self.mot_tracker = Sort()
+    def __init__(self, model_path_yolo, model_path_plate, batch_size=1, cascade=False, cascade_padding=0.1,
+                 ocr_budget=None, motion_gate=None, pipeline=False, ocr_workers=4, queue_size=8,
+                 ocr_processes=0, vehicle_backend=None, plate_backend=None, ocr_cache=None,
+                 tracker='sort', tracker_options=None):
+        # inference backend per detector: None (PyTorch), 'onnx', 'openvino' or a dict of load_yolo options
+        # models come from the process-wide registry, so building a detector per job is cheap
+        self.coco_model = get_yolo(model_path_yolo, **backend_options(vehicle_backend))
+        self.license_plate_detector = get_yolo(model_path_plate, **backend_options(plate_backend))
+        if tracker not in TRACKERS:
+            raise ValueError(f"Unknown tracker {tracker!r}, expected one of {tuple(TRACKERS)}")
+        self.tracker = tracker
+        # Sort/BankSort arguments, e.g. {'association': 'gated'} for crowded wide-angle scenes
+        self.tracker_options = tracker_options or {}
         self.vehicles = [2, 3, 5, 7]  # classes for cars, trucks, etc.
+        # number of decoded frames sent to each model call
+        self.batch_size = max(1, int(batch_size))
+        # cascade mode: look for plates only inside (padded) tracked vehicle boxes
+        self.cascade = cascade
+        self.cascade_padding = cascade_padding
+        # per-track OCR budget: None reads every plate, a dict holds PlateReadingAccumulator options
+        self.ocr_budget = ocr_budget
+        # adaptive frame stride on quiet scenes: None runs every frame, a dict holds MotionGate options
+        self.motion_gate = motion_gate
+        # staged mode: decoder thread -> detection -> OCR thread pool, with bounded queues in between
+        self.pipeline = pipeline
+        self.ocr_workers = ocr_workers
+        self.queue_size = queue_size
+        # OCR in a pool of worker processes with batched recognition instead of in this process
+        self.ocr_executor = get_ocr_executor(workers=ocr_processes) if ocr_processes else None
+        # reuse the OCR result of near-duplicate crops of a track: None disables, a dict holds PlateOCRCache options
+        self.ocr_cache = ocr_cache
+        # SORT state and track ids per camera/video stream
+        self.streams = TrackerManager(self.new_stream)
+
+    def new_stream(self, stream_id):
+        """ Fresh tracking state for a stream, with this detector's tracker and OCR options """
+        return StreamState(
+            stream_id,
+            TRACKERS[self.tracker](**self.tracker_options),
+            readings=PlateReadingAccumulator(**self.ocr_budget) if self.ocr_budget is not None else None,
+            gate=MotionGate(**self.motion_gate) if self.motion_gate is not None else None,
+            ocr_cache=PlateOCRCache(**self.ocr_cache) if self.ocr_cache is not None else None,
+        )
+
+    def track_counts(self):
+        """ Live tracks per stream, for monitoring """
+        return self.streams.track_counts()
 
     def interpolate_bounding_boxes(self, data):
-        # Extract necessary data columns from input data
-        frame_numbers = np.array([int(row['frame_nmr']) for row in data])
-        car_ids = np.array([int(float(row['car_id'])) for row in data])
-        car_bboxes = np.array([list(map(float, row['car_bbox'][1:-1].split())) for row in data])
-        license_plate_bboxes = np.array([list(map(float, row['license_plate_bbox'][1:-1].split())) for row in data])
-
-        interpolated_data = []
-        unique_car_ids = np.unique(car_ids)
-        for car_id in unique_car_ids:
-            frame_numbers_ = [p['frame_nmr'] for p in data if int(float(p['car_id'])) == int(float(car_id))]
-
-            # Filter data for a specific car ID
-            car_mask = car_ids == car_id
-            car_frame_numbers = frame_numbers[car_mask]
-            car_bboxes_interpolated = []
-            license_plate_bboxes_interpolated = []
-
-            first_frame_number = car_frame_numbers[0]
-            # last_frame_number = car_frame_numbers[-1]
-
-            for i in range(len(car_bboxes[car_mask])):
-                frame_number = car_frame_numbers[i]
-                car_bbox = car_bboxes[car_mask][i]
-                license_plate_bbox = license_plate_bboxes[car_mask][i]
-
-                if i > 0:
-                    prev_frame_number = car_frame_numbers[i - 1]
-                    prev_car_bbox = car_bboxes_interpolated[-1]
-                    prev_license_plate_bbox = license_plate_bboxes_interpolated[-1]
-
-                    if frame_number - prev_frame_number > 1:
-                        # Interpolate missing frames' bounding boxes
-                        frames_gap = frame_number - prev_frame_number
-                        x = np.array([prev_frame_number, frame_number])
-                        x_new = np.linspace(prev_frame_number, frame_number, num=frames_gap, endpoint=False)
-                        interp_func = interp1d(x, np.vstack((prev_car_bbox, car_bbox)), axis=0, kind='linear')
-                        interpolated_car_bboxes = interp_func(x_new)
-                        interp_func = interp1d(x, np.vstack((prev_license_plate_bbox, license_plate_bbox)), axis=0, kind='linear')
-                        interpolated_license_plate_bboxes = interp_func(x_new)
-
-                        car_bboxes_interpolated.extend(interpolated_car_bboxes[1:])
-                        license_plate_bboxes_interpolated.extend(interpolated_license_plate_bboxes[1:])
-
-                car_bboxes_interpolated.append(car_bbox)
-                license_plate_bboxes_interpolated.append(license_plate_bbox)
-
-            for i in range(len(car_bboxes_interpolated)):
-                frame_number = first_frame_number + i
-                row = {}
-                row['frame_nmr'] = str(frame_number)
-                row['car_id'] = str(car_id)
-                row['car_bbox'] = ' '.join(map(str, car_bboxes_interpolated[i]))
-                row['license_plate_bbox'] = ' '.join(map(str, license_plate_bboxes_interpolated[i]))
-
-                if str(frame_number) not in frame_numbers_:
-                    # Imputed row, set the following fields to '0'
-                    row['license_plate_bbox_score'] = '0'
-                    row['license_number'] = '0'
-                    row['license_number_score'] = '0'
-                else:
-                    # Original row, retrieve values from the input data if available
-                    original_row = [p for p in data if int(p['frame_nmr']) == frame_number and int(float(p['car_id'])) == int(float(car_id))][0]
-                    row['license_plate_bbox_score'] = original_row['license_plate_bbox_score'] if 'license_plate_bbox_score' in original_row else '0'
-                    row['license_number'] = original_row['license_number'] if 'license_number' in original_row else '0'
-                    row['license_number_score'] = original_row['license_number_score'] if 'license_number_score' in original_row else '0'
+        """
+        Fills the frame gaps of every track with interpolated boxes.
+        data is a list of CSV rows (returns rows) or the typed columns of results_io.load_results
+        (returns columns); imputed rows get '0' / 0 for their scores and license number.
+        """
+        if isinstance(data, dict):
+            return interpolate_columns(data)
+        return interpolate_rows(data)
+
+    def read_frames(self, cap, stream, keep_skipped=False, start_frame=0, end_frame=None):
+        """
+        Yields (frame_nmr, frame, detect) for the frames of a video, or only of frames
+        [start_frame, end_frame) of it (end_frame None reads to the end).
+
+        With a MotionGate on the stream, frames of a quiet scene without live tracks are not detected and the
+        following stride - 1 frames are only grabbed, not decoded. keep_skipped still decodes and
+        yields those frames (with detect False) for callers that render every frame. The track
+        check happens at read time, so in batched mode it can lag by up to one batch.
+        """
+        gate = stream.gate
+        if start_frame:
+            # OpenCV seeks by frame index: exact for constant frame rate videos
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_nmr = start_frame - 1
+        while end_frame is None or frame_nmr + 1 < end_frame:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_nmr += 1
 
-                interpolated_data.append(row)
+            if gate is not None and not gate.should_detect(frame, stream.track_count() > 0):
+                if keep_skipped:
+                    yield frame_nmr, frame, False
+                for _ in range(gate.stride - 1):
+                    if end_frame is not None and frame_nmr + 1 >= end_frame:
+                        break
+                    if keep_skipped:
+                        ret, frame = cap.read()
+                    else:
+                        ret, frame = cap.grab(), None
+                    if not ret:
+                        break
+                    frame_nmr += 1
+                    if keep_skipped:
+                        yield frame_nmr, frame, False
+            else:
+                yield frame_nmr, frame, True
+
+    def read_batches(self, cap, stream, keep_skipped=False, start_frame=0, end_frame=None):
+        """ read_frames grouped into lists of up to batch_size frames """
+        batch = []
+        for item in self.read_frames(cap, stream, keep_skipped, start_frame, end_frame):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def detect_plates_in_tracks(self, frame, track_ids, iou_threshold=0.5):
+        """
+        Runs the plate detector on padded crops of the tracked vehicles, in one batch.
+
+        Returns a list of (license_plate, car) pairs with the plate box mapped back to
+        frame coordinates, in the same layout as get_car uses. The padded crops of overlapping cars
+        can hold the same plate: boxes of several crops overlapping by more than iou_threshold are
+        one plate (the best scored box is kept), and each plate goes to its car by the rule of
+        assign_plates_to_cars, as in the full-frame path.
+        """
+        if len(track_ids) == 0:
+            return []
+
+        frame_h, frame_w = frame.shape[:2]
+        crops = []
+        offsets = []
+        for xcar1, ycar1, xcar2, ycar2, car_id in track_ids:
+            pad_x = (xcar2 - xcar1) * self.cascade_padding
+            pad_y = (ycar2 - ycar1) * self.cascade_padding
+            cx1 = int(max(0, xcar1 - pad_x))
+            cy1 = int(max(0, ycar1 - pad_y))
+            cx2 = int(min(frame_w, xcar2 + pad_x))
+            cy2 = int(min(frame_h, ycar2 + pad_y))
+            if cx2 <= cx1 or cy2 <= cy1:
+                continue
+            crops.append(frame[cy1:cy2, cx1:cx2, :])
+            offsets.append((cx1, cy1, [xcar1, ycar1, xcar2, ycar2, car_id]))
+
+        if not crops:
+            return []
+
+        plates = []
+        crop_index = []
+        for k, (crop_plates, (off_x, off_y, _)) in enumerate(zip(self.license_plate_detector(crops), offsets)):
+            for x1, y1, x2, y2, score, class_id in crop_plates.boxes.data.tolist():
+                plates.append([x1 + off_x, y1 + off_y, x2 + off_x, y2 + off_y, score, class_id])
+                crop_index.append(k)
+        if not plates:
+            return []
+
+        boxes = np.asarray(plates)
+        overlap = iou_batch(boxes, boxes) > iou_threshold
+        keep = np.ones(len(plates), dtype=bool)
+        # a box found in another crop is dropped when a better scored box there covers the same plate
+        for i in np.argsort(-boxes[:, 4], kind='stable'):
+            if keep[i]:
+                keep &= ~(overlap[i] & (np.asarray(crop_index) != crop_index[i]))
+                keep[i] = True
+        plates = [plate for plate, kept in zip(plates, keep) if kept]
+
+        # the padding can pull in a neighbour's plate, so the usual containment rule decides the car
+        cars = assign_plates_to_cars(plates, [car for _, _, car in offsets]).tolist()
+        return [(plate, car) for plate, car in zip(plates, cars) if car[4] != -1]
+
+    def track_frame(self, stream, frame, vehicle_detections, license_plates=None, frame_nmr=None):
+        """
+        Tracks vehicles of a stream and prepares the plate reads of a single frame, given its raw
+        model outputs. license_plates is None in cascade mode, where plates are searched inside the tracks.
+
+        Returns a (frame_results, ocr_jobs) tuple: the rows of tracks whose reading has converged
+        in the stream's readings (a PlateReadingAccumulator) and one job per plate crop that still needs OCR.
+        """
+        readings = stream.readings
+        ocr_cache = stream.ocr_cache
+        frame_results = {}
+        ocr_jobs = []
+        if vehicle_detections is None:
+            # skipped by the motion gate, decoded only to be rendered
+            return frame_results, ocr_jobs
+
+        detections_ = []
+        for detection in vehicle_detections.boxes.data.tolist():
+            x1, y1, x2, y2, score, class_id = detection
+            if int(class_id) in self.vehicles:
+                detections_.append([x1, y1, x2, y2, score])
+
+        # track vehicles
+        track_ids = stream.tracker.update(np.asarray(detections_))
+
+        if license_plates is None:
+            assignments = self.detect_plates_in_tracks(frame, track_ids)
+        else:
+            # assign all license plates of the frame to cars at once
+            plates = license_plates.boxes.data.tolist()
+            assignments = list(zip(plates, assign_plates_to_cars(plates, track_ids).tolist()))
+
+        for license_plate, car in assignments:
+            x1, y1, x2, y2, score, class_id = license_plate
+            xcar1, ycar1, xcar2, ycar2, car_id = car
+
+            if car_id != -1 and readings is not None and \
+               not readings.should_read(car_id, frame_nmr, [xcar1, ycar1, xcar2, ycar2]):
+                # this track's reading has converged, reuse it
+                license_plate_text, license_plate_text_score, _ = readings.consensus(car_id)
+                frame_results[car_id] = {
+                    'car': {'bbox': [xcar1, ycar1, xcar2, ycar2]},
+                    'license_plate': {
+                        'bbox': [x1, y1, x2, y2],
+                        'text': license_plate_text,
+                        'bbox_score': score,
+                        'text_score': license_plate_text_score
+                    }
+                }
+
+            elif car_id != -1:
+                # crop license plate
+                license_plate_crop = frame[int(y1):int(y2), int(x1): int(x2), :]
+
+                # process license plate
+                license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+                _, license_plate_crop_thresh = cv2.threshold(license_plate_crop_gray, 64, 255, cv2.THRESH_BINARY_INV)
+
+                job = {
+                    'car_id': car_id,
+                    'car_bbox': [xcar1, ycar1, xcar2, ycar2],
+                    'bbox': [x1, y1, x2, y2],
+                    'bbox_score': score,
+                    'crop': license_plate_crop_thresh
+                }
+                if ocr_cache is not None:
+                    # a near-duplicate of an earlier crop of this track skips OCR
+                    job['crop_hash'] = ocr_cache.fingerprint(license_plate_crop_thresh)
+                    cached = ocr_cache.get(car_id, job['crop_hash'])
+                    if cached is not None:
+                        job['cached'] = cached
+                ocr_jobs.append(job)
+        return frame_results, ocr_jobs
+
+    def add_reading(self, stream, frame_results, job, license_plate_text, license_plate_text_score, frame_nmr=None):
+        """ Stores the OCR result of a job from track_frame into frame_results """
+        if stream.readings is not None:
+            stream.readings.add(job['car_id'], frame_nmr, job['car_bbox'], license_plate_text, license_plate_text_score)
+        if 'crop_hash' in job and 'cached' not in job:
+            stream.ocr_cache.put(job['car_id'], job['crop_hash'], license_plate_text, license_plate_text_score)
+
+        if license_plate_text is not None:
+            frame_results[job['car_id']] = {
+                'car': {'bbox': job['car_bbox']},
+                'license_plate': {
+                    'bbox': job['bbox'],
+                    'text': license_plate_text,
+                    'bbox_score': job['bbox_score'],
+                    'text_score': license_plate_text_score
+                }
+            }
 
-        return interpolated_data
+    def process_frame(self, stream, frame, vehicle_detections, license_plates=None, frame_nmr=None):
+        """ Tracks vehicles and reads the plates of a single frame of a stream, given its raw model outputs """
+        frame_results, ocr_jobs = self.track_frame(stream, frame, vehicle_detections, license_plates, frame_nmr)
+        # read license plate numbers
+        for job, future in zip(ocr_jobs, self.submit_jobs(ocr_jobs)):
+            license_plate_text, license_plate_text_score = future.result()
+            self.add_reading(stream, frame_results, job, license_plate_text, license_plate_text_score, frame_nmr)
+        return frame_results
+
+    def submit_ocr(self, crops, pool=None):
+        """
+        Queues plate crops for OCR and returns one future of (text, score) per crop.
+        Uses the OCR process pool if configured, else pool (a thread pool) or the calling thread.
+        """
+        if self.ocr_executor is not None:
+            return self.ocr_executor.submit(crops, parse=parse_license_plate)
+
+        futures = []
+        for crop in crops:
+            if pool is not None:
+                futures.append(pool.submit(read_license_plate, crop))
+            else:
+                future = Future()
+                future.set_result(read_license_plate(crop))
+                futures.append(future)
+        return futures
+
+    def submit_jobs(self, ocr_jobs, pool=None):
+        """ submit_ocr for the jobs of track_frame; jobs answered by the OCR cache get a finished future """
+        futures = [None] * len(ocr_jobs)
+        misses = [i for i, job in enumerate(ocr_jobs) if 'cached' not in job]
+        for i, future in zip(misses, self.submit_ocr([ocr_jobs[i]['crop'] for i in misses], pool)):
+            futures[i] = future
+        for i, job in enumerate(ocr_jobs):
+            if 'cached' in job:
+                futures[i] = Future()
+                futures[i].set_result(job['cached'])
+        return futures
+
+    def detect_batches(self, batches):
+        """
+        Runs the models over each batch and yields (frame_nmr, frame, vehicle_detections, license_plates)
+        in order; vehicle_detections is None for frames the motion gate skipped.
+        """
+        for batch in batches:
+            frames = [frame for _, frame, detect in batch if detect]
+            vehicle_detections = []
+            license_plates = []
+            if frames:
+                # detect vehicles and license plates for the whole batch at once
+                vehicle_detections = self.coco_model(frames)
+                if self.cascade:
+                    # plates are detected per frame, once the tracks are known
+                    license_plates = [None] * len(frames)
+                else:
+                    license_plates = self.license_plate_detector(frames)
 
-    def process_video(self, video_path, output_csv_path):
-        """ Runs YOLO + SORT + OCR """
+            i = 0
+            for frame_nmr, frame, detect in batch:
+                if detect:
+                    yield frame_nmr, frame, vehicle_detections[i], license_plates[i]
+                    i += 1
+                else:
+                    yield frame_nmr, frame, None, None
+
+    def detect_video(self, video_path, on_frame, keep_skipped=False, stream_id=None, start_frame=0, end_frame=None,
+                     resume=None, on_batch=None):
+        """
+        Runs YOLO + SORT + OCR over a video, batch_size frames per model call (plate model per frame
+        in cascade mode), and calls on_frame(frame_nmr, frame, frame_results) for each frame in order.
+        Tracking state comes from stream_id's stream (see TrackerManager), or a fresh one when None.
+        start_frame / end_frame limit the run to frames [start_frame, end_frame) of the video.
+
+        resume is a StreamState.snapshot() to continue from. on_batch(stream, next_frame) is called
+        after every batch, when the stream's state matches exactly the frames passed to on_frame
+        (not in pipeline mode, where tracking runs ahead of the frames waiting for OCR). The stream's
+        OCR cache counters are logged at the end (StreamState.log_metrics).
+        """
         cap = cv2.VideoCapture(video_path)
-        results = {}
-        frame_nmr = -1
-        ret = True
 
-        while ret:
-            frame_nmr += 1
-            ret, frame = cap.read()
-            if ret:
-                results[frame_nmr] = {}
-                # detect vehicles
-                detections = self.coco_model(frame)[0]
-                detections_ = []
-                for detection in detections.boxes.data.tolist():
-                    x1, y1, x2, y2, score, class_id = detection
-                    if int(class_id) in self.vehicles:
-                        detections_.append([x1, y1, x2, y2, score])
-
-                # track vehicles
-                track_ids = self.mot_tracker.update(np.asarray(detections_))
-
-                # detect license plates
-                license_plates = self.license_plate_detector(frame)[0]
-                for license_plate in license_plates.boxes.data.tolist():
-                    x1, y1, x2, y2, score, class_id = license_plate
-
-                    # assign license plate to car
-                    xcar1, ycar1, xcar2, ycar2, car_id = get_car(license_plate, track_ids)
-
-                    if car_id != -1:
-                        # crop license plate
-                        license_plate_crop = frame[int(y1):int(y2), int(x1): int(x2), :]
-                        
-                        # process license plate
-                        license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
-                        _, license_plate_crop_thresh = cv2.threshold(license_plate_crop_gray, 64, 255, cv2.THRESH_BINARY_INV)
-
-                        # read license plate number
-                        license_plate_text, license_plate_text_score = read_license_plate(license_plate_crop_thresh)
-
-                        if license_plate_text is not None:
-                            results[frame_nmr][car_id] = {
-                                'car': {'bbox': [xcar1, ycar1, xcar2, ycar2]},
-                                'license_plate': {
-                                    'bbox': [x1, y1, x2, y2],
-                                    'text': license_plate_text,
-                                    'bbox_score': score,
-                                    'text_score': license_plate_text_score
-                                }
-                            }
-        cap.release()
-        write_csv(results, output_csv_path)
+        try:
+            with self.streams.open(stream_id) as stream:
+                if resume is not None:
+                    stream.restore(resume)
+                if self.pipeline:
+                    run_pipelined(self, cap, on_frame, stream, keep_skipped, start_frame, end_frame)
+                else:
+                    # SORT and OCR must still see the frames in order
+                    for batch in self.read_batches(cap, stream, keep_skipped, start_frame, end_frame):
+                        for frame_nmr, frame, vehicle_detections, license_plates in self.detect_batches([batch]):
+                            on_frame(frame_nmr, frame, self.process_frame(stream, frame, vehicle_detections,
+                                                                          license_plates, frame_nmr=frame_nmr))
+                        if on_batch is not None:
+                            on_batch(stream, batch[-1][0] + 1)
+                stream.log_metrics()
+        finally:
+            cap.release()
+
+    def process_video(self, video_path, output_csv_path, keep_results=False, stream_id=None,
+                      start_frame=0, end_frame=None, checkpoint=None):
+        """
+        Runs YOLO + SORT + OCR and streams the rows to output_csv_path (CSV, or columnar for a
+        .npz path) as frames finish. The results dict is only kept in memory and returned when
+        keep_results is set. stream_id names the camera whose tracks continue across calls.
+        start_frame / end_frame process only frames [start_frame, end_frame), e.g. one chunk of a
+        long video (see chunking.process_video_chunked).
+
+        With a checkpoint.Checkpointer, progress is saved every checkpoint.every frames and a run
+        that finds a checkpoint continues from it (only the results of the resumed part are
+        kept in memory). Pipeline mode never reaches a point where the stream matches the
+        written frames, so it saves no checkpoints (a checkpoint saved earlier is still resumed).
+        """
+        if checkpoint is not None and self.pipeline:
+            logger.warning("Pipeline mode saves no checkpoints: %s will not be updated", checkpoint.path)
+        results = {} if keep_results else None
+        resume = checkpoint.load() if checkpoint is not None else None
+        if resume is not None:
+            start_frame = resume['next_frame']
+
+        with open_result_writer(output_csv_path, resume_from=resume['writer'] if resume else None) as writer:
+            def on_frame(frame_nmr, frame, frame_results):
+                writer.write_frame(frame_nmr, frame_results)
+                if results is not None:
+                    results[frame_nmr] = frame_results
+
+            def on_batch(stream, next_frame):
+                checkpoint.maybe_save(next_frame, stream, writer)
+
+            self.detect_video(video_path, on_frame, stream_id=stream_id, start_frame=start_frame, end_frame=end_frame,
+                              resume=resume['stream'] if resume else None,
+                              on_batch=on_batch if checkpoint is not None else None)
+
         return results
+
+    def process_videos(self, jobs, batch_size=None):
+        """
+        process_video for several cameras at once: jobs is a list of (stream_id, video_path, output_path),
+        optionally with a start frame and stream snapshot (see process_streams). Frames of all the
+        cameras are interleaved round-robin into shared model batches. Returns the next frame to
+        read per stream.
+        """
+        return process_streams(self, jobs, batch_size=batch_size)
+
+    def process_and_render(self, video_path, output_csv_path, output_video_path, lookback=30, stream_id=None):
+        """
+        Fused mode: detection, interpolation and rendering in a single decode of the video.
+
+        Frames are held back for lookback frames, so gaps of up to lookback frames in a track are
+        interpolated before the frame is drawn and encoded; the interpolated rows are streamed to
+        output_csv_path. No intermediate results file is written.
+
+        Returns:
+            str: Path of the rendered video.
+        """
+        cap = cv2.VideoCapture(video_path)
+        out, final_output_path = self.open_video_writer(cap, output_video_path)
+        cap.release()
+
+        with open_row_writer(output_csv_path) as writer:
+            renderer = LookbackRenderer(self, out, writer, lookback)
+            try:
+                self.detect_video(video_path, renderer.push, keep_skipped=True, stream_id=stream_id)
+                renderer.close()
+            finally:
+                out.release()
+
+        return final_output_path
     
     def draw_border(self, img, top_left, bottom_right, color=(0, 255, 0), thickness=10, line_length_x=200, line_length_y=200):
         x1, y1 = top_left
@@ -159,11 +464,8 @@ class LicensePlateDetector:
 
         return img
 
-    def visualize(self, video_path, csv_path, output_video_path):
-        """ Draws boxes and saves video """
-        results = pd.read_csv(csv_path)
-        cap = cv2.VideoCapture(video_path)
-        
+    def open_video_writer(self, cap, output_video_path):
+        """ WebM writer with the size and fps of cap; returns (writer, final_output_path) """
         # 1. Get Video Properties FIRST
         fps = cap.get(cv2.CAP_PROP_FPS)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -176,49 +478,66 @@ class LicensePlateDetector:
         # Note: We ensure the extension is .webm
         final_output_path = output_video_path.replace('.mp4', '.webm')
         out = cv2.VideoWriter(final_output_path, fourcc, fps, (width, height))
+        return out, final_output_path
 
-        license_plate = {}
-        for car_id in np.unique(results['car_id']):
-            max_ = np.amax(results[results['car_id'] == car_id]['license_number_score'])
-            license_plate[car_id] = {
-                'license_crop': None,
-                'license_plate_number': results[(results['car_id'] == car_id) & (results['license_number_score'] == max_)]['license_number'].iloc[0]
-            }
-            cap.set(cv2.CAP_PROP_POS_FRAMES, results[(results['car_id'] == car_id) & (results['license_number_score'] == max_)]['frame_nmr'].iloc[0])
-            ret, frame = cap.read()
+    def draw_detection(self, frame, car_bbox, license_plate_bbox):
+        # draw car
+        car_x1, car_y1, car_x2, car_y2 = car_bbox
+        self.draw_border(frame, (int(car_x1), int(car_y1)), (int(car_x2), int(car_y2)), (0, 255, 0), 25, line_length_x=200, line_length_y=200)
 
-            x1, y1, x2, y2 = ast.literal_eval(results[(results['car_id'] == car_id) & (results['license_number_score'] == max_)]['license_plate_bbox'].iloc[0].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
+        # draw license plate
+        x1, y1, x2, y2 = license_plate_bbox
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 12)
 
-            license_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
-            license_crop = cv2.resize(license_crop, (int((x2 - x1) * 400 / (y2 - y1)), 400))
+    def crop_license_plate(self, frame, license_plate_bbox):
+        """ Plate crop resized to a height of 400 px, as shown next to the car """
+        x1, y1, x2, y2 = license_plate_bbox
+        license_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
+        return cv2.resize(license_crop, (int((x2 - x1) * 400 / (y2 - y1)), 400))
 
-            license_plate[car_id]['license_crop'] = license_crop
+    def visualize(self, video_path, csv_path, output_video_path):
+        """
+        Draws boxes and saves video.
+        The video is decoded exactly once: rows are indexed by frame up front and the best
+        plate crop of every car is taken during the same forward pass, without seeking.
+        """
+        results = load_results_dataframe(csv_path)
+        cap = cv2.VideoCapture(video_path)
+        out, final_output_path = self.open_video_writer(cap, output_video_path)
+
+        # frame -> positions of its rows, built once
+        frame_rows = results.groupby('frame_nmr').indices
+        car_ids = results['car_id'].to_numpy()
+        car_bboxes = results[CAR_BBOX].to_numpy()
+        license_plate_bboxes = results[PLATE_BBOX].to_numpy()
+
+        # best read of every car (first row with its highest score) and the frames to crop them from
+        license_plate = {}
+        crop_frames = {}
+        if len(results):
+            for car_id, row_indx in results.groupby('car_id')['license_number_score'].idxmax().items():
+                license_plate[car_id] = {
+                    'license_crop': None,
+                    'license_plate_number': results.at[row_indx, 'license_number']
+                }
+                crop_frames.setdefault(results.at[row_indx, 'frame_nmr'], []).append((car_id, license_plate_bboxes[row_indx]))
 
         frame_nmr = -1
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        ret = True
-        while ret:
+        while True:
             ret, frame = cap.read()
             frame_nmr += 1
-            if ret:
-                df_ = results[results['frame_nmr'] == frame_nmr]
-                for row_indx in range(len(df_)):
-                    # draw car
-                    car_x1, car_y1, car_x2, car_y2 = ast.literal_eval(df_.iloc[row_indx]['car_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-                    self.draw_border(frame, (int(car_x1), int(car_y1)), (int(car_x2), int(car_y2)), (0, 255, 0), 25, line_length_x=200, line_length_y=200)
-
-                    # draw license plate
-                    x1, y1, x2, y2 = ast.literal_eval(df_.iloc[row_indx]['license_plate_bbox'].replace('[ ', '[').replace('   ', ' ').replace('  ', ' ').replace(' ', ','))
-                    cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 12)
-
-                    # crop license plate
-                    license_crop = license_plate[df_.iloc[row_indx]['car_id']]['license_crop']
-                    H, W, _ = license_crop.shape
-
-                out.write(frame)
-            else:
+            if not ret:
                 break # Stop loop if no frame returned
+
+            # crop license plates before anything is drawn on the frame
+            for car_id, license_plate_bbox in crop_frames.get(frame_nmr, []):
+                license_plate[car_id]['license_crop'] = self.crop_license_plate(frame, license_plate_bbox)
+
+            for row_indx in frame_rows.get(frame_nmr, []):
+                self.draw_detection(frame, car_bboxes[row_indx], license_plate_bboxes[row_indx])
+
+            out.write(frame)
                 
         out.release()
         cap.release()
-        return final_output_path
\ No newline at end of file
+        return final_output_path
@@ -0,0 +1,192 @@
+import glob
+import os
+import shutil
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.webm', '.mkv')
+
+
+def backend_options(config):
+    """
+    Normalise a per-detector backend setting.
+
+    Args:
+        config (None | str | dict): None for the PyTorch path, a backend name, or a dict such as
+            {'backend': 'openvino', 'int8': True, 'calibration': 'media/calibration'}.
+
+    Returns:
+        dict: Keyword arguments for load_yolo.
+    """
+    if config is None:
+        return {}
+    if isinstance(config, str):
+        config = {'backend': config}
+    if config.get('backend', 'torch') not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {config['backend']!r}, expected one of {BACKENDS}")
+    return dict(config)
+
+
+def exported_path(model_path, backend, int8=False, imgsz=640):
+    """ Where the exported graph of model_path at input size imgsz lives, next to the .pt weights """
+    stem = f"{os.path.splitext(model_path)[0]}_{imgsz}" + ('_int8' if int8 else '')
+    if backend == 'onnx':
+        return stem + '.onnx'
+    return stem + '_openvino_model'
+
+
+def letterbox(frame, imgsz=640):
+    """ Model input the way ultralytics preprocesses it: padded resize, RGB, NCHW float32 in [0, 1] """
+    import cv2
+    import numpy as np
+
+    h, w = frame.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    padded = cv2.copyMakeBorder(resized, top, imgsz - new_h - top, left, imgsz - new_w - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    rgb = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(rgb.transpose(2, 0, 1)[None], dtype=np.float32) / 255.
+
+
+def calibration_frames(source, limit=300, imgsz=640):
+    """
+    Sample up to limit preprocessed frames from our own footage for int8 calibration.
+
+    Args:
+        source (str | list): Image/video files or directories containing them.
+        limit (int): Maximum number of frames.
+        imgsz (int): Model input size.
+
+    Returns:
+        list: Arrays of shape (1, 3, imgsz, imgsz).
+    """
+    import cv2
+
+    paths = []
+    for item in ([source] if isinstance(source, str) else source):
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, '*'))))
+        else:
+            paths.append(item)
+
+    images = [p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS)]
+    videos = [p for p in paths if p.lower().endswith(VIDEO_EXTENSIONS)]
+
+    frames = [letterbox(cv2.imread(p), imgsz) for p in images[:limit]]
+    per_video = (limit - len(frames)) // max(1, len(videos))
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+        stride = max(1, total // max(1, per_video))
+        frame_nmr = 0
+        taken = 0
+        while taken < per_video:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_nmr % stride == 0:
+                frames.append(letterbox(frame, imgsz))
+                taken += 1
+            frame_nmr += 1
+        cap.release()
+
+    if not frames:
+        raise ValueError(f"No calibration frames found in {source!r}")
+    return frames
+
+
+def _quantize_onnx(fp32_path, int8_path, frames):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: frame}
+
+    quantize_static(fp32_path, int8_path, FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+
+    # ultralytics reads stride/names from the metadata, which quantization drops
+    fp32, int8 = onnx.load(fp32_path), onnx.load(int8_path)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, int8_path)
+
+
+def _quantize_openvino(fp32_dir, int8_dir, frames):
+    import nncf
+    import openvino as ov
+
+    xml_name = os.path.basename(glob.glob(os.path.join(fp32_dir, '*.xml'))[0])
+    model = ov.Core().read_model(os.path.join(fp32_dir, xml_name))
+    quantized = nncf.quantize(model, nncf.Dataset(frames), preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(frames))
+
+    os.makedirs(int8_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(int8_dir, xml_name))
+    shutil.copy(os.path.join(fp32_dir, 'metadata.yaml'), os.path.join(int8_dir, 'metadata.yaml'))
+
+
+def export_model(model_path, backend, int8=False, calibration=None, imgsz=640, calibration_limit=300):
+    """
+    Export YOLO weights to an ONNX or OpenVINO graph, optionally int8-quantized.
+
+    Args:
+        model_path (str): ultralytics .pt weights.
+        backend (str): 'onnx' or 'openvino'.
+        int8 (bool): Apply post-training static quantization.
+        calibration (str | list): Frames (images, videos or directories) used to calibrate int8.
+        imgsz (int): Input size of the exported graph. The batch axis is dynamic, so the graph
+            takes the frame batches of detect_batches and the plate crops of the cascade in one call.
+        calibration_limit (int): Maximum number of calibration frames.
+
+    Returns:
+        str: Path of the exported model, loadable with ultralytics.YOLO.
+    """
+    from ultralytics import YOLO
+
+    target = exported_path(model_path, backend, int8, imgsz)
+    fp32_target = exported_path(model_path, backend, imgsz=imgsz)
+    if not os.path.exists(fp32_target):
+        exported = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True)
+        if os.path.abspath(exported) != os.path.abspath(fp32_target):
+            shutil.move(exported, fp32_target)
+    if not int8:
+        return fp32_target
+
+    if calibration is None:
+        raise ValueError("int8 quantization needs a calibration set of frames")
+    frames = calibration_frames(calibration, limit=calibration_limit, imgsz=imgsz)
+    if backend == 'onnx':
+        _quantize_onnx(fp32_target, target, frames)
+    else:
+        _quantize_openvino(fp32_target, target, frames)
+    return target
+
+
+def load_yolo(model_path, backend='torch', int8=False, calibration=None, imgsz=640, calibration_limit=300):
+    """
+    Load a YOLO detector through the chosen inference backend.
+
+    Non-torch backends are exported (and quantized) on first use and cached next to the weights.
+    The returned model is an ultralytics.YOLO either way, so results keep the boxes.data layout
+    (x1, y1, x2, y2, score, class_id) the rest of the pipeline expects.
+    """
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        return YOLO(model_path)
+
+    path = exported_path(model_path, backend, int8, imgsz)
+    if not os.path.exists(path):
+        path = export_model(model_path, backend, int8, calibration, imgsz, calibration_limit)
+    return YOLO(path, task='detect')
@@ -0,0 +1,127 @@
+"""
+Checkpoints of long running jobs, so a job that dies is resumed instead of restarted.
+
+Checkpointer saves the progress of process_video: the next frame to read, the tracking state of
+the stream and how much of the results file is written. StageMarkers records which stages of a
+pipeline (detection, interpolation, rendering) have finished. Both are written atomically, so a
+crash mid-write leaves the previous checkpoint in place.
+"""
+import json
+import logging
+import os
+import pickle
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, data):
+    """ Replace path with data (bytes) in one step: readers see the old or the new file, never a mix """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def file_fingerprint(path):
+    """ Identifies the contents of a file cheaply: absolute path, size and modification time """
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a process_video run.
+
+    Every `every` frames, at a point where the tracker, OCR readings, motion gate and OCR cache of
+    the stream match exactly the frames written so far, the next frame to read, a snapshot of that
+    state and the results writer's position are pickled to path. process_video(checkpoint=...)
+    resumes from it. Camera scans save one per camera after each scan, with no writer, to carry
+    the tracks over to the next scan.
+
+    Args:
+        path (str): Checkpoint file.
+        key (object): Anything that must be unchanged to resume (input fingerprint, detector
+            options, ...); a checkpoint saved under another key is ignored.
+        every (int): Frames between checkpoints.
+    """
+
+    def __init__(self, path, key=None, every=500):
+        self.path = path
+        self.key = key
+        self.every = max(1, int(every))
+        self.saved_at = 0
+
+    def load(self):
+        """
+        Returns:
+            dict: The last checkpoint (next_frame, writer, stream), or None when there is none
+            for this key.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            logger.warning("Ignoring unreadable checkpoint %s: %s", self.path, e)
+            return None
+        if checkpoint.get('key') != self.key:
+            return None
+        self.saved_at = checkpoint['next_frame']
+        return checkpoint
+
+    def save(self, next_frame, stream, writer):
+        checkpoint = {
+            'key': self.key,
+            'next_frame': next_frame,
+            'writer': writer.checkpoint() if writer is not None else None,
+            'stream': stream.snapshot(),
+        }
+        write_atomic(self.path, pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL))
+        self.saved_at = next_frame
+
+    def maybe_save(self, next_frame, stream, writer):
+        """ save() if every frames have passed since the last checkpoint """
+        if next_frame - self.saved_at >= self.every:
+            self.save(next_frame, stream, writer)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StageMarkers:
+    """
+    Finished stages of a multi-stage job, kept in a small JSON file.
+
+    A stage counts as done only while its outputs still exist, and markers saved under another
+    key (e.g. for a replaced input file) are ignored.
+    """
+
+    def __init__(self, path, key=None):
+        self.path = path
+        self.key = key
+        self.stages = {}
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('key') == key:
+                self.stages = saved['stages']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def done(self, stage):
+        outputs = self.stages.get(stage)
+        return outputs is not None and all(os.path.exists(path) for path in outputs)
+
+    def mark(self, stage, *outputs):
+        """ Record stage as finished, with the files it produced """
+        self.stages[stage] = list(outputs)
+        write_atomic(self.path, json.dumps({'key': self.key, 'stages': self.stages}).encode())
+
+    def clear(self):
+        self.stages = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,215 @@
+"""
+Chunked processing of a single long video.
+
+The video is split into frame ranges that are tracked independently and in parallel. Every chunk
+but the first starts `overlap` frames before the range it keeps, so its tracks are established by
+the time that range begins, and those shared frames are where stitch_chunks joins the tracks of
+neighbouring chunks (by the IoU of their car boxes) before renumbering the car ids over the whole
+video.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from alpr.sort.sort import iou_batch
+from .results_io import CAR_BBOX, COLUMNS, load_results, write_results
+
+# detector of this worker process, created once by _init_worker
+_detector = None
+
+
+def _init_worker(detector_options, threads):
+    global _detector
+    from .algorithm import LicensePlateDetector
+
+    # the chunks already use every core, don't let each of them spawn a full thread pool
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _detector = LicensePlateDetector(**detector_options)
+
+
+def _process_chunk(video_path, output_path, start_frame, end_frame):
+    _detector.process_video(video_path, output_path, start_frame=start_frame, end_frame=end_frame)
+    return output_path
+
+
+def plan_chunks(frame_count, chunk_frames, overlap=0):
+    """
+    Split frames [0, frame_count) into chunks.
+
+    Args:
+        frame_count (int): Frames in the video (CAP_PROP_FRAME_COUNT; 0 if unknown).
+        chunk_frames (int): Frames kept per chunk.
+        overlap (int): Frames each chunk also processes before its own range, shared with the
+            previous chunk.
+
+    Returns:
+        list: (start, owned_start, end) per chunk: frames [start, end) are processed and the results
+        of [owned_start, end) kept. The last end is None, since the frame count of some containers
+        is only an estimate.
+    """
+    chunk_frames = max(int(chunk_frames), overlap + 1)
+    if frame_count <= chunk_frames:
+        return [(0, 0, None)]
+
+    owned_starts = list(range(0, frame_count, chunk_frames))
+    ends = owned_starts[1:] + [None]
+    return [(max(0, owned - overlap), owned, end) for owned, end in zip(owned_starts, ends)]
+
+
+def plan_video(video_path, parts, overlap=30, chunk_frames=None):
+    """ plan_chunks for a video file, in `parts` chunks unless chunk_frames is given """
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    chunk_frames = chunk_frames or math.ceil(frame_count / max(1, parts))
+    return plan_chunks(frame_count, chunk_frames, overlap)
+
+
+def chunk_paths(output_path, n):
+    """ Results file of each chunk, next to output_path and in the same format """
+    root, ext = os.path.splitext(output_path)
+    return [f"{root}.chunk{k}{ext}" for k in range(n)]
+
+
+def match_tracks(previous, current, start, end, iou_threshold=0.3):
+    """
+    Pair the tracks of two neighbouring chunks over their shared frames [start, end).
+
+    Every frame both chunks have results for adds the IoU of each pair of car boxes (when at least
+    iou_threshold) to the score of that pair of tracks; the pairs are then assigned one to one,
+    maximizing the total score.
+
+    Args:
+        previous (dict): Columns of the previous chunk, car ids already global.
+        current (dict): Columns of the chunk being stitched.
+
+    Returns:
+        dict: car_id of current -> car_id of previous, for the tracks that continue.
+    """
+    in_previous = (previous['frame_nmr'] >= start) & (previous['frame_nmr'] < end)
+    in_current = (current['frame_nmr'] >= start) & (current['frame_nmr'] < end)
+    if not in_previous.any() or not in_current.any():
+        return {}
+
+    prev_frames, prev_ids = previous['frame_nmr'][in_previous], previous['car_id'][in_previous]
+    cur_frames, cur_ids = current['frame_nmr'][in_current], current['car_id'][in_current]
+    prev_boxes = np.column_stack([previous[name][in_previous] for name in CAR_BBOX])
+    cur_boxes = np.column_stack([current[name][in_current] for name in CAR_BBOX])
+
+    prev_tracks, prev_index = np.unique(prev_ids, return_inverse=True)
+    cur_tracks, cur_index = np.unique(cur_ids, return_inverse=True)
+    score = np.zeros((len(prev_tracks), len(cur_tracks)))
+    for frame_nmr in np.intersect1d(prev_frames, cur_frames):
+        a = prev_frames == frame_nmr
+        b = cur_frames == frame_nmr
+        iou = iou_batch(prev_boxes[a], cur_boxes[b])
+        # a track has one row per frame, so the (a, b) cells are distinct
+        score[np.ix_(prev_index[a], cur_index[b])] += np.where(iou >= iou_threshold, iou, 0.)
+
+    rows, cols = linear_sum_assignment(-score)
+    return {int(cur_tracks[c]): int(prev_tracks[r]) for r, c in zip(rows, cols) if score[r, c] > 0}
+
+
+def stitch_chunks(paths, chunks, output_path, iou_threshold=0.3):
+    """
+    Join the results of the chunks of a video into one results file with global car ids.
+
+    Tracks that continue from the previous chunk (see match_tracks) keep its id, every other track
+    gets the next free one. The frames a chunk shares with the previous one are dropped from it,
+    since the previous chunk has tracked them with more history.
+
+    Args:
+        paths (list): Results file of each chunk, in order.
+        chunks (list): (start, owned_start, end) of each chunk, as planned by plan_chunks.
+        output_path (str): Where to write the stitched results (.npz or CSV).
+    """
+    next_id = 1
+    previous = None
+    parts = []
+    for path, (start, owned_start, _) in zip(paths, chunks):
+        columns = {name: np.asarray(column) for name, column in load_results(path, mmap=False).items()}
+        continued = match_tracks(previous, columns, start, owned_start, iou_threshold) if previous is not None else {}
+
+        keep = columns['frame_nmr'] >= owned_start
+        columns = {name: column[keep] for name, column in columns.items()}
+        tracks, index = np.unique(columns['car_id'], return_inverse=True)
+        global_ids = np.empty(len(tracks), dtype=np.int32)
+        for i, car_id in enumerate(tracks):
+            if int(car_id) in continued:
+                global_ids[i] = continued[int(car_id)]
+            else:
+                global_ids[i] = next_id
+                next_id += 1
+        columns['car_id'] = global_ids[index]
+
+        parts.append(columns)
+        previous = columns
+
+    write_results({name: np.concatenate([part[name] for part in parts]).astype(dtype) for name, dtype in COLUMNS},
+                  output_path)
+
+
+def run_chunks_locally(tasks, detector_options, processes):
+    """
+    Default chunk runner: a pool of worker processes on this machine.
+
+    Args:
+        tasks (list): (video_path, output_path, start_frame, end_frame) per chunk.
+        detector_options (dict): LicensePlateDetector arguments.
+        processes (int): Chunks processed at the same time.
+    """
+    processes = min(processes, len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    # spawn, not fork: forking a process that already runs torch threads can deadlock
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(detector_options, threads)) as pool:
+        futures = [pool.submit(_process_chunk, *task) for task in tasks]
+        for future in futures:
+            future.result()
+
+
+def process_video_chunked(detector_options, video_path, output_path, workers=None, chunk_frames=None, overlap=30,
+                          iou_threshold=0.3, run_chunks=None):
+    """
+    process_video for one long video, split into chunks that are processed in parallel.
+
+    Args:
+        detector_options (dict): LicensePlateDetector arguments; every worker builds its own detector.
+        video_path (str): Input video.
+        output_path (str): Stitched results file (.npz or CSV), as process_video writes it.
+        workers (int): Parallel chunks (default: one per core). Without chunk_frames the video is cut
+            into this many chunks.
+        chunk_frames (int): Frames per chunk.
+        overlap (int): Frames shared by neighbouring chunks. Tracks are joined on the frames where
+            both chunks read the plate, so it should span a few OCR readings.
+        iou_threshold (float): Minimum IoU of two car boxes to count as the same car.
+        run_chunks (callable): Called as run_chunks(tasks) with one (video_path, output_path,
+            start_frame, end_frame) task per chunk; returns once every chunk file is written. The
+            default runs them in a local process pool; the job queue passes one that spreads them
+            over the workers sharing the media directory.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = plan_video(video_path, workers, overlap, chunk_frames)
+    paths = chunk_paths(output_path, len(chunks))
+    tasks = [(video_path, path, start, end) for path, (start, _, end) in zip(paths, chunks)]
+
+    try:
+        if run_chunks is not None:
+            run_chunks(tasks)
+        else:
+            run_chunks_locally(tasks, detector_options, workers)
+        stitch_chunks(paths, chunks, output_path, iou_threshold)
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,129 @@
+from collections import Counter, OrderedDict, defaultdict
+
+
+class PlateReadingAccumulator:
+    """
+    Fuses the OCR readings of each SORT track and decides when a track needs another read.
+
+    Readings are voted per character position, weighted by their OCR score. Once a track's
+    consensus has enough reads, agreement and confidence it is considered converged and
+    should_read returns False until the cooldown has passed or the car box has changed size
+    by more than resize_ratio (e.g. the car came much closer to the camera).
+
+    Only the max_tracks most recently read tracks are kept, so memory (and the checkpoints that
+    carry the accumulator) stays flat on long videos and live cameras, where SORT never reuses
+    the id of a track it dropped.
+
+    In pipeline mode (see pipeline.run_pipelined) readings are added when the OCR results are
+    collected, in frame order, while tracking has already run ahead: should_read then decides on
+    readings up to queue_size * ocr_workers crops old, so a track may get a few extra reads after
+    converging.
+    """
+
+    def __init__(self, min_confidence=0.6, min_agreement=0.8, min_reads=3, cooldown=30, resize_ratio=1.5,
+                 max_tracks=256):
+        self.min_confidence = min_confidence
+        self.min_agreement = min_agreement
+        self.min_reads = min_reads
+        self.cooldown = cooldown
+        self.resize_ratio = resize_ratio
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()  # car_id -> reading state, least recently read first
+
+    def _track(self, car_id):
+        if car_id not in self.tracks:
+            self.tracks[car_id] = {
+                'votes': defaultdict(list),  # text length -> one Counter of char weights per position
+                'length_reads': Counter(),  # text length -> reads of that length
+                'reads': 0,
+                'last_read_frame': None,
+                'last_read_area': None,
+            }
+            while len(self.tracks) > self.max_tracks:
+                self.tracks.popitem(last=False)
+        else:
+            self.tracks.move_to_end(car_id)
+        return self.tracks[car_id]
+
+    @staticmethod
+    def _area(bbox):
+        x1, y1, x2, y2 = bbox[:4]
+        return max(0., x2 - x1) * max(0., y2 - y1)
+
+    def should_read(self, car_id, frame_nmr, bbox):
+        """
+        Check whether the plate of a track should be OCRed in this frame.
+
+        Args:
+            car_id (int): SORT track id.
+            frame_nmr (int): Current frame number.
+            bbox (list): Car bounding box (x1, y1, x2, y2).
+
+        Returns:
+            bool: True unless the track has converged and is still in its cooldown.
+        """
+        track = self.tracks.get(car_id)
+        if track is None or not self.is_converged(car_id):
+            return True
+
+        if frame_nmr - track['last_read_frame'] >= self.cooldown:
+            return True
+
+        area, last_area = self._area(bbox), track['last_read_area']
+        if last_area > 0 and area > 0 and max(area / last_area, last_area / area) >= self.resize_ratio:
+            return True
+
+        return False
+
+    def add(self, car_id, frame_nmr, bbox, text, score):
+        """
+        Record an OCR attempt for a track. Failed reads (text None) only restart the cooldown.
+        """
+        track = self._track(car_id)
+        track['last_read_frame'] = frame_nmr
+        track['last_read_area'] = self._area(bbox)
+        if text is None:
+            return
+
+        track['reads'] += 1
+        track['length_reads'][len(text)] += 1
+        positions = track['votes'][len(text)]
+        if not positions:
+            positions.extend(Counter() for _ in text)
+        for position, char in zip(positions, text):
+            position[char] += float(score)
+
+    def consensus(self, car_id):
+        """
+        Fused reading of a track.
+
+        Returns:
+            tuple: (text, score, agreement), or (None, None, 0.) if the track has no reads.
+        """
+        track = self.tracks.get(car_id)
+        if track is None or not track['votes']:
+            return None, None, 0.
+
+        # the plate length with the most support wins
+        length, positions = max(track['votes'].items(), key=lambda item: sum(item[1][0].values()))
+
+        text = ''
+        support = []
+        agreement = 1.
+        for position in positions:
+            char, weight = position.most_common(1)[0]
+            total = sum(position.values())
+            text += char
+            support.append(weight)
+            agreement = min(agreement, weight / total if total > 0 else 0.)
+
+        # misreads of another length do not lower the confidence in this one
+        score = sum(support) / len(support) / track['length_reads'][length]
+        return text, score, agreement
+
+    def is_converged(self, car_id):
+        track = self.tracks.get(car_id)
+        if track is None or track['reads'] < self.min_reads:
+            return False
+        _, score, agreement = self.consensus(car_id)
+        return score >= self.min_confidence and agreement >= self.min_agreement
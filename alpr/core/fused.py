@@ -0,0 +1,82 @@
+from collections import deque
+
+import numpy as np
+
+from .results_io import CAR_BBOX, PLATE_BBOX
+
+
+class LookbackRenderer:
+    """
+    Interpolates, draws and encodes frames while process_and_render is still detecting.
+
+    Every frame is held back for lookback frames. When a track is seen again after a gap of up
+    to lookback frames, the missing boxes are interpolated into the frames still in the buffer,
+    with the same formula interpolate_bounding_boxes uses. Frames leaving the buffer are drawn,
+    written to the video and their rows streamed to the results writer. Longer gaps stay empty.
+    """
+
+    def __init__(self, detector, out, writer, lookback=30):
+        self.detector = detector
+        self.out = out
+        self.writer = writer
+        self.lookback = max(0, int(lookback))
+        self.buffer = deque()  # (frame_nmr, frame, rows), oldest first
+        self.buffered = {}  # frame_nmr -> rows of a buffered frame
+        self.tracks = {}  # car_id -> (last frame_nmr, car + plate boxes)
+
+    @staticmethod
+    def _row(frame_nmr, car_id, boxes, bbox_score=0, text='0', text_score=0):
+        row = {
+            'frame_nmr': frame_nmr,
+            'car_id': car_id,
+            'license_plate_bbox_score': bbox_score,
+            'license_number': text,
+            'license_number_score': text_score,
+        }
+        row.update(zip(CAR_BBOX + PLATE_BBOX, boxes.tolist()))
+        return row
+
+    def push(self, frame_nmr, frame, frame_results):
+        """ on_frame callback of detect_video """
+        rows = []
+        for car_id, result in frame_results.items():
+            if 'car' not in result or 'license_plate' not in result or 'text' not in result['license_plate']:
+                continue
+            boxes = np.array(list(result['car']['bbox']) + list(result['license_plate']['bbox']), dtype=np.float64)
+
+            last = self.tracks.get(car_id)
+            if last is not None and 1 < frame_nmr - last[0] <= self.lookback + 1:
+                prev_nmr, prev_boxes = last
+                gap = frame_nmr - prev_nmr
+                slope = (boxes - prev_boxes) / float(gap)
+                for step in range(1, gap):
+                    if prev_nmr + step in self.buffered:
+                        # Imputed row, scores and license number are '0'
+                        self.buffered[prev_nmr + step].append(
+                            self._row(prev_nmr + step, car_id, slope * float(step) + prev_boxes))
+            self.tracks[car_id] = (frame_nmr, boxes)
+
+            plate = result['license_plate']
+            rows.append(self._row(frame_nmr, car_id, boxes, plate['bbox_score'], plate['text'], plate['text_score']))
+
+        self.buffer.append((frame_nmr, frame, rows))
+        self.buffered[frame_nmr] = rows
+        while len(self.buffer) > self.lookback:
+            self._emit()
+
+        # tracks that can no longer be interpolated
+        for car_id in [car_id for car_id, (last_nmr, _) in self.tracks.items() if frame_nmr - last_nmr > self.lookback + 1]:
+            del self.tracks[car_id]
+
+    def _emit(self):
+        frame_nmr, frame, rows = self.buffer.popleft()
+        del self.buffered[frame_nmr]
+        for row in rows:
+            self.detector.draw_detection(frame, [row[name] for name in CAR_BBOX], [row[name] for name in PLATE_BBOX])
+            self.writer.write_row(row)
+        self.out.write(frame)
+
+    def close(self):
+        """ Flush the frames still held back """
+        while self.buffer:
+            self._emit()
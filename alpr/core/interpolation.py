@@ -0,0 +1,112 @@
+import numpy as np
+
+from .results_io import CAR_BBOX, PLATE_BBOX
+
+
+def interpolate_tracks(frame_numbers, car_ids, boxes):
+    """
+    Fill the frame gaps of every track with linearly interpolated boxes, using array operations only.
+
+    Rows are sorted once by (car_id, frame). Every row that follows a gap of g frames in its track
+    is expanded into g - 1 imputed rows plus itself; the values match what interp1d gives for the
+    same gap.
+
+    Args:
+        frame_numbers (numpy.ndarray): Frame number of each row, shape (n,).
+        car_ids (numpy.ndarray): Track id of each row, shape (n,).
+        boxes (numpy.ndarray): Boxes to interpolate, shape (n, k) (e.g. car and plate bbox side by side).
+
+    Returns:
+        tuple: (frame_numbers, car_ids, boxes, source) for the output rows, ordered by car id then
+        frame. source holds the input row index of original rows and -1 for imputed ones.
+    """
+    frame_numbers = np.asarray(frame_numbers, dtype=np.int64)
+    car_ids = np.asarray(car_ids, dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if len(frame_numbers) == 0:
+        width = boxes.shape[1] if boxes.ndim == 2 else 0
+        return frame_numbers, car_ids, boxes.reshape(0, width), np.empty(0, dtype=np.int64)
+    boxes = boxes.reshape(len(frame_numbers), -1)
+
+    order = np.lexsort((frame_numbers, car_ids))
+    frames, cars, boxes = frame_numbers[order], car_ids[order], boxes[order]
+
+    # every row stands for itself plus the imputed rows of the gap before it
+    gaps = np.ones(len(frames), dtype=np.int64)
+    same_car = cars[1:] == cars[:-1]
+    gaps[1:] = np.where(same_car, np.maximum(frames[1:] - frames[:-1], 1), 1)
+
+    row = np.repeat(np.arange(len(frames)), gaps)
+    step = np.arange(len(row)) - np.repeat(np.cumsum(gaps) - gaps, gaps) + 1  # 1..gap within each run
+    gap = gaps[row]
+    original = step == gap
+
+    out_frames = frames[row] - (gap - step)
+    out_boxes = boxes[row].copy()
+
+    imputed = ~original
+    if imputed.any():
+        prev = boxes[row[imputed] - 1]
+        slope = (boxes[row[imputed]] - prev) / gap[imputed].astype(np.float64)[:, None]
+        out_boxes[imputed] = slope * step[imputed].astype(np.float64)[:, None] + prev
+
+    source = np.where(original, order[row], -1)
+    return out_frames, cars[row], out_boxes, source
+
+
+def interpolate_rows(data):
+    """
+    interpolate_bounding_boxes for a list of CSV rows: same rows, same string formatting.
+    """
+    if not data:
+        return []
+
+    frame_numbers = np.array([int(row['frame_nmr']) for row in data])
+    car_ids = np.array([int(float(row['car_id'])) for row in data])
+    car_bboxes = np.array([list(map(float, row['car_bbox'][1:-1].split())) for row in data])
+    license_plate_bboxes = np.array([list(map(float, row['license_plate_bbox'][1:-1].split())) for row in data])
+
+    frames, cars, boxes, source = interpolate_tracks(frame_numbers, car_ids,
+                                                     np.hstack((car_bboxes, license_plate_bboxes)))
+
+    interpolated_data = []
+    for frame_number, car_id, bbox, src in zip(frames, cars, boxes, source):
+        row = {}
+        row['frame_nmr'] = str(frame_number)
+        row['car_id'] = str(car_id)
+        row['car_bbox'] = ' '.join(map(str, bbox[:4]))
+        row['license_plate_bbox'] = ' '.join(map(str, bbox[4:]))
+
+        if src < 0:
+            # Imputed row, set the following fields to '0'
+            row['license_plate_bbox_score'] = '0'
+            row['license_number'] = '0'
+            row['license_number_score'] = '0'
+        else:
+            # Original row, retrieve values from the input data if available
+            original_row = data[src]
+            row['license_plate_bbox_score'] = original_row.get('license_plate_bbox_score', '0')
+            row['license_number'] = original_row.get('license_number', '0')
+            row['license_number_score'] = original_row.get('license_number_score', '0')
+
+        interpolated_data.append(row)
+
+    return interpolated_data
+
+
+def interpolate_columns(columns):
+    """
+    interpolate_bounding_boxes for typed columns (results_io.load_results), returning typed columns.
+    """
+    boxes = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in CAR_BBOX + PLATE_BBOX])
+    frames, cars, boxes, source = interpolate_tracks(columns['frame_nmr'], columns['car_id'], boxes)
+
+    original = source >= 0
+    src = np.where(original, source, 0)
+    out = {'frame_nmr': frames, 'car_id': cars}
+    for i, name in enumerate(CAR_BBOX + PLATE_BBOX):
+        out[name] = boxes[:, i]
+    for name, imputed_value in (('license_plate_bbox_score', 0.), ('license_number', '0'), ('license_number_score', 0.)):
+        values = np.asarray(columns[name])
+        out[name] = np.where(original, values[src], imputed_value) if len(values) else values
+    return out
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap frame-difference gate that lets process_video skip detection on quiet scenes.
+
+    Each sampled frame is shrunk to a small grayscale thumbnail and compared with the previous
+    sampled one. While nothing moves and no track is alive the stride doubles up to max_stride;
+    any motion or live track drops it straight back to 1 so busy scenes see every frame.
+    """
+
+    def __init__(self, max_stride=8, pixel_threshold=25, min_changed_ratio=0.002, width=160):
+        self.max_stride = max(1, int(max_stride))
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.width = width
+        self.stride = 1
+        self.previous = None
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def has_motion(self, frame):
+        """
+        Compare the frame with the previously sampled one and remember it.
+
+        Returns:
+            bool: True if enough pixels changed (always True for the first frame).
+        """
+        thumbnail = self._thumbnail(frame)
+        previous, self.previous = self.previous, thumbnail
+        if previous is None or previous.shape != thumbnail.shape:
+            return True
+
+        changed = cv2.absdiff(thumbnail, previous) > self.pixel_threshold
+        return np.count_nonzero(changed) >= self.min_changed_ratio * changed.size
+
+    def should_detect(self, frame, active_tracks):
+        """
+        Decide whether the models should run on this frame and update the stride.
+
+        Args:
+            frame (numpy.ndarray): Decoded BGR frame.
+            active_tracks (bool): True if the tracker still holds live tracks.
+
+        Returns:
+            bool: True to run detection; False to skip it and the next stride - 1 frames.
+        """
+        moving = self.has_motion(frame)
+        if moving or active_tracks:
+            self.stride = 1
+            return True
+
+        self.stride = min(self.stride * 2, self.max_stride)
+        return False
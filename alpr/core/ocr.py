@@ -0,0 +1,126 @@
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import cv2
+
+# EasyOCR reader of this worker process, created once by _init_worker
+_reader = None
+
+# every plate crop is OCRed at this height, its width padded to a multiple of CROP_WIDTH_STEP
+CROP_HEIGHT = 64
+CROP_WIDTH_STEP = 32
+
+
+def _init_worker(languages, gpu, threads):
+    global _reader
+    import torch
+    import easyocr
+
+    # one process per core already, don't let every worker spawn a full thread pool
+    torch.set_num_threads(threads)
+    _reader = easyocr.Reader(languages, gpu=gpu)
+
+
+def _recognize(crops, detail):
+    if len(crops) == 1:
+        return [_reader.readtext(crops[0], detail=detail)]
+    return _reader.readtext_batched(crops, detail=detail)
+
+
+def normalize_crop(crop, height=CROP_HEIGHT, width_step=CROP_WIDTH_STEP):
+    """
+    The geometry a plate crop is OCRed at, in this process or in the pool alike.
+
+    The crop is resized to height (keeping its aspect ratio) and padded on the right, by
+    replicating the border, to a multiple of width_step. The result depends on the crop alone,
+    never on the other crops of a batch, and crops of similar width share a shape so that
+    readtext_batched can stack them.
+
+    Args:
+        crop (numpy.ndarray): Plate crop (grayscale or BGR).
+
+    Returns:
+        numpy.ndarray: The normalized crop.
+    """
+    h, w = crop.shape[:2]
+    width = max(1, int(round(w * height / float(h))))
+    resized = cv2.resize(crop, (width, height), interpolation=cv2.INTER_CUBIC)
+    padded_width = -(-width // width_step) * width_step
+    return cv2.copyMakeBorder(resized, 0, 0, 0, padded_width - width, cv2.BORDER_REPLICATE)
+
+
+class OCRExecutor:
+    """
+    Pool of worker processes that each load an EasyOCR reader once and recognize plate crops in batches.
+
+    submit() returns one Future per crop. Crops are normalized (normalize_crop), grouped by shape
+    and sent to the workers in batches of up to batch_size, recognized with readtext_batched; the
+    optional parse callable turns the raw EasyOCR detections of a crop into the value of its future
+    (e.g. parse_license_plate -> (text, score)). read_license_plate normalizes its crop the same
+    way, so the pool changes throughput, not results.
+    """
+
+    def __init__(self, workers=2, languages=('en',), gpu=False, batch_size=16, threads_per_worker=1):
+        self.batch_size = max(1, int(batch_size))
+        # spawn, not fork: forking a process that already runs torch threads can deadlock
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(list(languages), gpu, threads_per_worker)
+        )
+
+    def submit(self, crops, parse=None, detail=1):
+        """
+        Queue plate crops for recognition.
+
+        Args:
+            crops (list): Plate crops (numpy arrays).
+            parse (callable): Optional function applied to the detections of each crop.
+            detail (int): EasyOCR detail level (0 returns only the texts).
+
+        Returns:
+            list: One concurrent.futures.Future per crop, in the same order.
+        """
+        futures = [Future() for _ in crops]
+        groups = {}
+        for crop, future in zip(crops, futures):
+            crop = normalize_crop(crop)
+            groups.setdefault(crop.shape, []).append((crop, future))
+
+        for group in groups.values():
+            for start in range(0, len(group), self.batch_size):
+                chunk = group[start:start + self.batch_size]
+                crop_futures = [future for _, future in chunk]
+                batch_future = self.pool.submit(_recognize, [crop for crop, _ in chunk], detail)
+                batch_future.add_done_callback(
+                    lambda f, crop_futures=crop_futures: self._resolve(f, crop_futures, parse))
+        return futures
+
+    @staticmethod
+    def _resolve(batch_future, crop_futures, parse):
+        try:
+            detections = batch_future.result()
+        except Exception as e:
+            for future in crop_futures:
+                future.set_exception(e)
+            return
+
+        for future, crop_detections in zip(crop_futures, detections):
+            try:
+                future.set_result(parse(crop_detections) if parse is not None else crop_detections)
+            except Exception as e:
+                future.set_exception(e)
+
+    def read(self, crops, parse=None, detail=1):
+        """ Blocking version of submit, returns the results in order """
+        return [future.result() for future in self.submit(crops, parse, detail)]
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
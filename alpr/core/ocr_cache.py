@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class PlateOCRCache:
+    """
+    Memoizes OCR results per SORT track, keyed by a perceptual hash of the thresholded plate crop.
+
+    A stopped or slow car yields almost the same crop frame after frame. The crop is reduced to a
+    difference hash (dHash); a crop of the same track within max_distance bits of an earlier one
+    reuses that crop's (text, score) instead of going through OCR again. Each track keeps its
+    per_track most recent hashes and only the max_tracks most recently seen tracks are kept.
+    """
+
+    def __init__(self, hash_size=16, max_distance=12, per_track=8, max_tracks=128):
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.per_track = per_track
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()  # car_id -> OrderedDict(hash -> (text, score)), least recent first
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, crop):
+        """
+        Difference hash of a plate crop: compares horizontally adjacent cells of a
+        (hash_size + 1) x hash_size thumbnail.
+
+        Returns:
+            int: hash_size ** 2 bit fingerprint.
+        """
+        small = cv2.resize(crop, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).ravel()
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+    def get(self, car_id, crop_hash):
+        """
+        Look up a near-duplicate crop of the track.
+
+        Returns:
+            tuple: The cached (text, score), or None on a miss.
+        """
+        entries = self.tracks.get(car_id)
+        if entries is not None:
+            self.tracks.move_to_end(car_id)
+            for cached_hash, reading in entries.items():
+                if bin(cached_hash ^ crop_hash).count('1') <= self.max_distance:
+                    entries.move_to_end(cached_hash)
+                    self.hits += 1
+                    return reading
+        self.misses += 1
+        return None
+
+    def put(self, car_id, crop_hash, text, score):
+        """ Remember the OCR result of a crop """
+        entries = self.tracks.get(car_id)
+        if entries is None:
+            entries = self.tracks[car_id] = OrderedDict()
+            while len(self.tracks) > self.max_tracks:
+                self.tracks.popitem(last=False)
+        self.tracks.move_to_end(car_id)
+        entries[crop_hash] = (text, score)
+        entries.move_to_end(crop_hash)
+        while len(entries) > self.per_track:
+            entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def metrics(self):
+        """ Cache counters, e.g. to log after a video """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'tracks': len(self.tracks)}
+
+    def clear(self):
+        self.tracks.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,101 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# marks the end of the decoded stream on the frame queue
+_END = object()
+
+
+def _put(frames, item, stop):
+    """ Blocking put that gives up once the consumer has stopped """
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode(detector, cap, stream, keep_skipped, start_frame, end_frame, frames, stop, errors):
+    try:
+        for batch in detector.read_batches(cap, stream, keep_skipped, start_frame, end_frame):
+            if not _put(frames, batch, stop):
+                return
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(frames, _END, stop)
+
+
+def run_pipelined(detector, cap, on_frame, stream, keep_skipped=False, start_frame=0, end_frame=None):
+    """
+    Runs the process_video stages concurrently.
+
+    A decoder thread prefetches frame batches into a bounded queue, the calling thread runs
+    detection and tracking, and plate crops are OCRed by a pool of detector.ocr_workers threads
+    (or by the detector's OCR process pool when it has one).
+    At most queue_size batches wait for detection and queue_size * ocr_workers crops wait for
+    OCR, so a slow stage blocks the one before it instead of buffering the whole video.
+
+    Args:
+        detector (LicensePlateDetector): Detector holding the models, tracker and pipeline options.
+        cap (cv2.VideoCapture): Opened video; only the decoder thread reads from it.
+        on_frame (callable): Called as on_frame(frame_nmr, frame, frame_results) for each frame, in frame order.
+        stream (StreamState): Tracker, OCR budget, motion gate and OCR cache of the video's stream.
+        keep_skipped (bool): Also pass on the frames the motion gate skipped (see read_batches).
+        start_frame (int): First frame to process.
+        end_frame (int): Stop before this frame (None: end of the video).
+    """
+    frames = queue.Queue(maxsize=detector.queue_size)
+    stop = threading.Event()
+    errors = []
+    decoder = threading.Thread(target=_decode, args=(detector, cap, stream, keep_skipped, start_frame, end_frame,
+                                                     frames, stop, errors), daemon=True)
+    decoder.start()
+
+    # frames whose OCR is still running, oldest first: (frame_nmr, frame, frame_results, [(job, future)])
+    pending = deque()
+    max_in_flight = detector.queue_size * detector.ocr_workers
+    in_flight = threading.Semaphore(max_in_flight)
+
+    def decoded_batches():
+        while True:
+            batch = frames.get()
+            if batch is _END:
+                return
+            yield batch
+
+    def collect(block):
+        # reassemble in frame order; the stream's readings and cache are only touched from this thread
+        while pending and (block or all(future.done() for _, future in pending[0][3])):
+            frame_nmr, frame, frame_results, reads = pending.popleft()
+            for job, future in reads:
+                license_plate_text, license_plate_text_score = future.result()
+                detector.add_reading(stream, frame_results, job, license_plate_text, license_plate_text_score,
+                                     frame_nmr)
+            on_frame(frame_nmr, frame, frame_results)
+
+    try:
+        with ThreadPoolExecutor(max_workers=detector.ocr_workers) as pool:
+            for frame_nmr, frame, vehicle_detections, license_plates in detector.detect_batches(decoded_batches()):
+                frame_results, ocr_jobs = detector.track_frame(stream, frame, vehicle_detections, license_plates,
+                                                               frame_nmr)
+                # a frame with more plates than the limit takes all permits rather than deadlocking
+                permits = min(len(ocr_jobs), max_in_flight)
+                for _ in range(permits):
+                    in_flight.acquire()
+                futures = detector.submit_jobs(ocr_jobs, pool)
+                for future in futures[:permits]:
+                    future.add_done_callback(lambda _: in_flight.release())
+                reads = list(zip(ocr_jobs, futures))
+                pending.append((frame_nmr, frame, frame_results, reads))
+                collect(block=False)
+            collect(block=True)
+    finally:
+        stop.set()
+        decoder.join()
+
+    if errors:
+        raise errors[0]
@@ -0,0 +1,159 @@
+"""
+Process-wide model registry.
+
+Every model is loaded lazily the first time it is asked for and then shared by all jobs of the
+process, so a worker pays the load time and memory of yolov8n, the plate detector and EasyOCR once
+instead of once per job. preload() loads them up front so that forked workers share the weights
+copy-on-write.
+"""
+import gc
+import os
+import threading
+import time
+
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _parameter_bytes(model):
+    """ Size of the torch weights of a model (YOLO, or EasyOCR's detector + recognizer), if any """
+    if isinstance(model, SharedModel):
+        model = model.model
+    modules = [m for m in (model, getattr(model, 'detector', None), getattr(model, 'recognizer', None))
+               if hasattr(m, 'parameters')]
+    if not modules:
+        return None
+    return sum(p.numel() * p.element_size() for m in modules for p in m.parameters())
+
+
+class SharedModel:
+    """
+    Thread-safe handle on a shared ultralytics model.
+
+    The predictor of an ultralytics model keeps per-call state, so concurrent jobs of the same
+    process take turns on it; everything else is forwarded to the model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **kwargs)
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def get_model(key, loader):
+    """
+    Return the model registered under key, calling loader() the first time it is requested.
+
+    Args:
+        key (hashable): Identity of the model (path, backend options, ...).
+        loader (callable): Builds the model; called at most once per process.
+
+    Returns:
+        object: The shared model.
+    """
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            _models[key] = loader()
+            _stats[key] = {
+                'load_seconds': time.perf_counter() - start,
+                'rss_bytes': _rss_bytes() - rss_before,
+                'parameter_bytes': _parameter_bytes(_models[key]),
+            }
+    return _models[key]
+
+
+def get_yolo(model_path, **backend):
+    """ Shared YOLO detector, loaded through load_yolo with the given backend options """
+    from .backends import load_yolo
+
+    key = ('yolo', os.path.abspath(model_path), repr(sorted(backend.items())))
+    return get_model(key, lambda: SharedModel(load_yolo(model_path, **backend)))
+
+
+def get_ocr_reader(languages=('en',), gpu=False):
+    """ Shared EasyOCR reader """
+    def load():
+        import easyocr
+        return easyocr.Reader(list(languages), gpu=gpu)
+    return get_model(('easyocr', tuple(languages), gpu), load)
+
+
+def get_ocr_executor(workers=2, **options):
+    """ Shared OCRExecutor process pool """
+    def load():
+        from .ocr import OCRExecutor
+        return OCRExecutor(workers=workers, **options)
+    return get_model(('ocr_executor', workers, repr(sorted(options.items()))), load)
+
+
+def memory_report():
+    """
+    Load time and memory of every model loaded in this process.
+
+    Returns:
+        list: One dict per model with its key, load_seconds, rss_mb (growth of the process RSS
+        while loading) and parameter_mb (torch weights, None for non-torch models).
+    """
+    report = []
+    for key, stats in _stats.items():
+        report.append({
+            'model': key,
+            'load_seconds': round(stats['load_seconds'], 2),
+            'rss_mb': round(stats['rss_bytes'] / 2 ** 20, 1),
+            'parameter_mb': None if stats['parameter_bytes'] is None else round(stats['parameter_bytes'] / 2 ** 20, 1),
+        })
+    return report
+
+
+def preload(loaders):
+    """
+    Preload-then-fork: load models in the parent before worker processes are forked.
+
+    Args:
+        loaders (list): Callables that load models through this registry (e.g. lambda: get_yolo(path)).
+
+    After loading, the surviving objects are moved to the permanent GC generation so that the
+    collector in forked children does not touch (and copy) the pages holding the weights.
+
+    Each preloaded YOLO model is a single SharedModel with one lock, so the threads of a process
+    run inference on it one at a time. Parallel inference comes from forking more worker
+    processes after preload(), not from more threads per process.
+    """
+    for loader in loaders:
+        loader()
+    gc.collect()
+    gc.freeze()
+    return memory_report()
+
+
+def clear():
+    """ Drop every registered model (mainly for tests and memory experiments) """
+    with _lock:
+        _models.clear()
+        _stats.clear()
@@ -0,0 +1,335 @@
+import os
+import shutil
+import struct
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .utils_alpr import CSV_HEADER, CSVResultWriter
+
+# Columnar layout of a results file: numeric boxes instead of '[x1 y1 x2 y2]' strings
+COLUMNS = [
+    ('frame_nmr', np.int32),
+    ('car_id', np.int32),
+    ('car_x1', np.float64), ('car_y1', np.float64), ('car_x2', np.float64), ('car_y2', np.float64),
+    ('plate_x1', np.float64), ('plate_y1', np.float64), ('plate_x2', np.float64), ('plate_y2', np.float64),
+    ('license_plate_bbox_score', np.float64),
+    ('license_number', '<U20'),
+    ('license_number_score', np.float64),
+]
+CAR_BBOX = ['car_x1', 'car_y1', 'car_x2', 'car_y2']
+PLATE_BBOX = ['plate_x1', 'plate_y1', 'plate_x2', 'plate_y2']
+
+
+def is_npz(path):
+    return str(path).lower().endswith('.npz')
+
+
+def _empty_columns():
+    return {name: [] for name, _ in COLUMNS}
+
+
+class NpzResultWriter:
+    """
+    Streaming writer for the columnar .npz format, with the same interface as CSVResultWriter.
+
+    Rows are buffered per column and spilled to raw files every chunk_rows rows, so memory
+    stays flat. close() assembles the columns into an uncompressed .npz whose members can be
+    memory-mapped by load_results. resume_from (a value returned by checkpoint()) reopens the
+    column files of an unfinished writer, dropping the rows written after that checkpoint.
+    """
+
+    def __init__(self, output_path, chunk_rows=4096, resume_from=None):
+        self.output_path = output_path
+        self.chunk_rows = chunk_rows
+        self.parts_dir = output_path + '.parts'
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self.rows = resume_from or 0
+        self.parts = {}
+        for name, dtype in COLUMNS:
+            part = open(os.path.join(self.parts_dir, name), 'r+b' if resume_from is not None else 'wb')
+            part.truncate(self.rows * np.dtype(dtype).itemsize)
+            part.seek(0, os.SEEK_END)
+            self.parts[name] = part
+        self.buffer = _empty_columns()
+        self.buffered = 0
+
+    def write_row(self, row):
+        """ Append one row given as a dict keyed by the COLUMNS names """
+        for name, _ in COLUMNS:
+            self.buffer[name].append(row[name])
+        self.buffered += 1
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def write_frame(self, frame_nmr, frame_results):
+        for car_id, result in frame_results.items():
+            if 'car' not in result or 'license_plate' not in result or 'text' not in result['license_plate']:
+                continue
+            car_bbox = result['car']['bbox']
+            plate_bbox = result['license_plate']['bbox']
+            row = {
+                'frame_nmr': frame_nmr,
+                'car_id': car_id,
+                'license_plate_bbox_score': result['license_plate']['bbox_score'],
+                'license_number': result['license_plate']['text'],
+                'license_number_score': result['license_plate']['text_score'],
+            }
+            row.update(zip(CAR_BBOX, car_bbox))
+            row.update(zip(PLATE_BBOX, plate_bbox))
+            self.write_row(row)
+
+    def write_columns(self, columns):
+        """ Append whole typed columns at once (see COLUMNS) """
+        self.flush()
+        for name, dtype in COLUMNS:
+            np.asarray(columns[name], dtype=dtype).tofile(self.parts[name])
+        self.rows += len(columns['frame_nmr'])
+
+    def flush(self):
+        if not self.buffered:
+            return
+        for name, dtype in COLUMNS:
+            np.asarray(self.buffer[name], dtype=dtype).tofile(self.parts[name])
+            self.parts[name].flush()
+        self.rows += self.buffered
+        self.buffer = _empty_columns()
+        self.buffered = 0
+
+    def checkpoint(self):
+        """ Flush to disk and return the number of rows written, to pass as resume_from """
+        self.flush()
+        for part in self.parts.values():
+            part.flush()
+            os.fsync(part.fileno())
+        return self.rows
+
+    def close(self):
+        self.flush()
+        for part in self.parts.values():
+            part.close()
+
+        tmp_path = self.output_path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name, dtype in COLUMNS:
+                header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                          'fortran_order': False,
+                          'shape': (self.rows,)}
+                with zf.open(name + '.npy', 'w', force_zip64=True) as out, \
+                     open(os.path.join(self.parts_dir, name), 'rb') as part:
+                    np.lib.format.write_array_header_2_0(out, header)
+                    shutil.copyfileobj(part, out)
+        os.replace(tmp_path, self.output_path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def abort(self):
+        """ Close the column files without assembling the .npz, so a checkpoint can resume them """
+        self.flush()
+        for part in self.parts.values():
+            part.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class CSVRowWriter:
+    """
+    Streams typed rows (dicts keyed by the COLUMNS names) to CSV, in the layout of the
+    interpolated results (space separated boxes without brackets).
+    """
+
+    def __init__(self, output_path, flush_every=1000):
+        self.flush_every = flush_every
+        self.rows = 0
+        self.f = open(output_path, 'w')
+        self.f.write(','.join(CSV_HEADER) + '\n')
+
+    def write_row(self, row):
+        self.f.write(','.join([
+            str(row['frame_nmr']),
+            str(row['car_id']),
+            ' '.join(str(row[name]) for name in CAR_BBOX),
+            ' '.join(str(row[name]) for name in PLATE_BBOX),
+            str(row['license_plate_bbox_score']),
+            str(row['license_number']),
+            str(row['license_number_score']),
+        ]) + '\n')
+        self.rows += 1
+        if self.flush_every and self.rows % self.flush_every == 0:
+            self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_row_writer(output_path):
+    """ Streaming writer of typed rows (write_row), columnar for .npz and CSV otherwise """
+    if is_npz(output_path):
+        return NpzResultWriter(output_path)
+    return CSVRowWriter(output_path)
+
+
+def open_result_writer(output_path, resume_from=None):
+    """
+    Streaming writer for output_path, columnar for .npz and CSV otherwise; resume_from continues
+    a file from the writer's checkpoint() value.
+    """
+    if is_npz(output_path):
+        return NpzResultWriter(output_path, resume_from=resume_from)
+    return CSVResultWriter(output_path, resume_from=resume_from)
+
+
+def _load_npz(path, mmap=True, boxes=True):
+    columns = {}
+    with zipfile.ZipFile(path) as zf:
+        infos = [info for info in zf.infolist() if boxes or info.filename[:-4] not in CAR_BBOX + PLATE_BBOX]
+        if not mmap or any(info.compress_type != zipfile.ZIP_STORED for info in infos):
+            return {info.filename[:-4]: np.lib.format.read_array(zf.open(info)) for info in infos}
+
+    with open(path, 'rb') as f:
+        for info in infos:
+            # skip the local file header to reach the raw .npy bytes of the member
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-4]
+            if int(np.prod(shape)) == 0:
+                columns[name] = np.empty(shape, dtype=dtype)
+            else:
+                columns[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                          order='F' if fortran_order else 'C')
+    return columns
+
+
+def _split_bboxes(series):
+    """ '[x1 y1 x2 y2]' (or the bracketless interpolated form) -> (n, 4) float array """
+    return series.astype(str).str.strip('[] ').str.split(expand=True).astype(float).to_numpy()
+
+
+def _load_csv(path, boxes=True):
+    df = pd.read_csv(path, dtype={'license_number': str}, float_precision='round_trip',
+                     usecols=None if boxes else lambda name: name not in ('car_bbox', 'license_plate_bbox'))
+    columns = {
+        'frame_nmr': df['frame_nmr'].to_numpy(dtype=np.int32),
+        'car_id': df['car_id'].astype(float).to_numpy(dtype=np.int32),
+        'license_plate_bbox_score': pd.to_numeric(df['license_plate_bbox_score'], errors='coerce').fillna(0).to_numpy(),
+        'license_number': df['license_number'].fillna('0').to_numpy(dtype='<U20'),
+        'license_number_score': pd.to_numeric(df['license_number_score'], errors='coerce').fillna(0).to_numpy(),
+    }
+    if not boxes:
+        return columns
+    for names, column in ((CAR_BBOX, 'car_bbox'), (PLATE_BBOX, 'license_plate_bbox')):
+        values = _split_bboxes(df[column]) if len(df) else np.empty((0, 4))
+        for i, name in enumerate(names):
+            columns[name] = values[:, i]
+    return columns
+
+
+def load_results(path, mmap=True, boxes=True):
+    """
+    Load a results file into typed numpy columns.
+
+    Args:
+        path (str): .npz written by NpzResultWriter/write_results, or a CSV in the write_csv layout.
+        mmap (bool): Memory-map the .npz columns instead of reading them.
+        boxes (bool): Load the car and plate box columns. Callers that only need the reads pass
+            False, which skips parsing the '[x1 y1 x2 y2]' strings of a CSV.
+
+    Returns:
+        dict: Column name -> numpy array, using the names in COLUMNS.
+    """
+    if is_npz(path):
+        return _load_npz(path, mmap=mmap, boxes=boxes)
+    return _load_csv(path, boxes=boxes)
+
+
+def load_results_dataframe(path, boxes=True):
+    """ Results file as a pandas DataFrame with numeric box columns (see COLUMNS), or without them if not boxes """
+    return pd.DataFrame({name: np.asarray(column) for name, column in load_results(path, boxes=boxes).items()})
+
+
+def _format_bbox(values):
+    return '[{} {} {} {}]'.format(*values)
+
+
+def columns_to_rows(columns):
+    """ Typed columns -> list of row dicts in the CSV string layout used by interpolate_bounding_boxes """
+    car_bboxes = np.column_stack([columns[name] for name in CAR_BBOX]).tolist()
+    plate_bboxes = np.column_stack([columns[name] for name in PLATE_BBOX]).tolist()
+    rows = []
+    for i in range(len(columns['frame_nmr'])):
+        rows.append({
+            'frame_nmr': str(int(columns['frame_nmr'][i])),
+            'car_id': str(int(columns['car_id'][i])),
+            'car_bbox': _format_bbox(car_bboxes[i]),
+            'license_plate_bbox': _format_bbox(plate_bboxes[i]),
+            'license_plate_bbox_score': str(columns['license_plate_bbox_score'][i]),
+            'license_number': str(columns['license_number'][i]),
+            'license_number_score': str(columns['license_number_score'][i]),
+        })
+    return rows
+
+
+def rows_to_columns(rows):
+    """ Row dicts in the CSV string layout -> typed columns """
+    def bboxes(key):
+        if not rows:
+            return np.empty((0, 4))
+        return np.array([list(map(float, row[key].strip('[] ').split())) for row in rows])
+
+    car_bboxes, plate_bboxes = bboxes('car_bbox'), bboxes('license_plate_bbox')
+    columns = {
+        'frame_nmr': np.array([int(row['frame_nmr']) for row in rows], dtype=np.int32),
+        'car_id': np.array([int(float(row['car_id'])) for row in rows], dtype=np.int32),
+        'license_plate_bbox_score': np.array([float(row.get('license_plate_bbox_score', 0)) for row in rows]),
+        'license_number': np.array([row.get('license_number', '0') for row in rows], dtype='<U20'),
+        'license_number_score': np.array([float(row.get('license_number_score', 0)) for row in rows]),
+    }
+    for i, name in enumerate(CAR_BBOX):
+        columns[name] = car_bboxes[:, i]
+    for i, name in enumerate(PLATE_BBOX):
+        columns[name] = plate_bboxes[:, i]
+    return columns
+
+
+def write_results(data, output_path):
+    """
+    Write rows (list of CSV-layout dicts) or typed columns to output_path, as .npz or CSV.
+    """
+    if is_npz(output_path):
+        columns = rows_to_columns(data) if isinstance(data, list) else data
+        with NpzResultWriter(output_path) as writer:
+            writer.write_columns(columns)
+        return
+
+    rows = data if isinstance(data, list) else columns_to_rows(data)
+    with open(output_path, 'w') as f:
+        f.write(','.join(CSV_HEADER) + '\n')
+        for row in rows:
+            f.write(','.join(str(row.get(name, '0')) for name in CSV_HEADER) + '\n')
+
+
+def export_csv(path, csv_path):
+    """ Export any results file to the classic CSV layout """
+    write_results(load_results(path, mmap=False), csv_path)
@@ -0,0 +1,148 @@
+import queue
+import threading
+from contextlib import ExitStack
+
+import cv2
+
+from .pipeline import _END, _put
+from .results_io import open_result_writer
+
+
+class Feed:
+    """ One camera of a multi-stream run: its stream state, decoder queue and result writer """
+
+    def __init__(self, stream_id, video_path, output_path, start_frame=0, resume=None, prefetch=4):
+        self.stream_id = stream_id
+        self.video_path = video_path
+        self.output_path = output_path
+        self.start_frame = start_frame
+        self.resume = resume
+        # frame to read next time the camera is scanned
+        self.next_frame = start_frame
+        self.frames = queue.Queue(maxsize=prefetch)
+        self.stream = None
+        self.writer = None
+        self.done = False
+
+
+def _decode(detector, feed, stop, ready, errors):
+    cap = cv2.VideoCapture(feed.video_path)
+    try:
+        for item in detector.read_frames(cap, feed.stream, start_frame=feed.start_frame):
+            if not _put(feed.frames, item, stop):
+                return
+            ready.set()
+    except Exception as e:
+        errors.append(e)
+    finally:
+        cap.release()
+        _put(feed.frames, _END, stop)
+        ready.set()
+
+
+def _next_batch(feeds, start, batch_size):
+    """
+    Round-robin over the feeds, one decoded frame per feed per turn, until batch_size frames are
+    taken or no feed has a frame ready. A long video therefore gets the same share of every batch
+    as a short one and cannot starve it.
+    """
+    batch = []
+    order = feeds[start:] + feeds[:start]
+    while len(batch) < batch_size:
+        taken = False
+        for feed in order:
+            if feed.done or len(batch) >= batch_size:
+                continue
+            try:
+                item = feed.frames.get_nowait()
+            except queue.Empty:
+                continue
+            if item is _END:
+                feed.done = True
+                continue
+            batch.append((feed, item))
+            taken = True
+        if not taken:
+            break
+    return batch
+
+
+def process_streams(detector, jobs, batch_size=None, prefetch=4):
+    """
+    process_video for several cameras at once, with their frames sharing the model calls.
+
+    Every feed is decoded by its own thread into a small queue. The calling thread fills each
+    inference batch round-robin from the feeds that have frames ready, runs the vehicle and plate
+    models once for the whole batch and routes each frame's detections back to its feed, where
+    tracking and OCR run in frame order against that feed's own stream (see TrackerManager).
+
+    Args:
+        detector (LicensePlateDetector): Detector holding the models and tracking options.
+        jobs (list): (stream_id, video_path, output_path) per camera, optionally followed by the
+            frame to start at and a StreamState.snapshot() to continue from (incremental scans of
+            a growing recording). The results of each camera go to its own output_path, as
+            process_video writes them.
+        batch_size (int): Frames per model call; defaults to one per camera, at least the
+            detector's batch_size.
+        prefetch (int): Decoded frames buffered per camera.
+
+    Returns:
+        dict: stream_id -> the frame after the last one processed.
+
+    Raises:
+        ValueError: If two jobs share a stream_id.
+    """
+    feeds = [Feed(*job, prefetch=prefetch) for job in jobs]
+    stream_ids = [feed.stream_id for feed in feeds]
+    duplicates = sorted({stream_id for stream_id in stream_ids if stream_ids.count(stream_id) > 1}, key=str)
+    if duplicates:
+        # each feed holds the lock of its stream for the whole run, a second one would wait for it forever
+        raise ValueError(f"Duplicate stream ids: {duplicates}")
+    if not feeds:
+        return {}
+    batch_size = batch_size or max(detector.batch_size, len(feeds))
+
+    stop = threading.Event()
+    ready = threading.Event()
+    errors = []
+    decoders = []
+
+    with ExitStack() as stack:
+        for feed in feeds:
+            feed.stream = stack.enter_context(detector.streams.open(feed.stream_id))
+            if feed.resume is not None:
+                feed.stream.restore(feed.resume)
+            feed.writer = stack.enter_context(open_result_writer(feed.output_path))
+
+        try:
+            for feed in feeds:
+                decoder = threading.Thread(target=_decode, args=(detector, feed, stop, ready, errors), daemon=True)
+                decoder.start()
+                decoders.append(decoder)
+
+            start = 0
+            while not all(feed.done for feed in feeds) and not errors:
+                ready.clear()
+                batch = _next_batch(feeds, start, batch_size)
+                start = (start + 1) % len(feeds)
+                if not batch:
+                    ready.wait(0.1)
+                    continue
+
+                frames = [(frame_nmr, frame, detect) for _, (frame_nmr, frame, detect) in batch]
+                detections = detector.detect_batches([frames])
+                for (feed, _), (frame_nmr, frame, vehicle_detections, license_plates) in zip(batch, detections):
+                    frame_results = detector.process_frame(feed.stream, frame, vehicle_detections, license_plates,
+                                                           frame_nmr=frame_nmr)
+                    feed.writer.write_frame(frame_nmr, frame_results)
+                    feed.next_frame = frame_nmr + 1
+        finally:
+            stop.set()
+            for decoder in decoders:
+                decoder.join()
+
+    if errors:
+        raise errors[0]
+    for feed in feeds:
+        feed.stream.log_metrics()
+    return {feed.stream_id: feed.next_frame for feed in feeds}
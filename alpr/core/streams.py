@@ -0,0 +1,117 @@
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StreamState:
+    """
+    What process_video carries from one frame of a stream to the next: the SORT tracker with its
+    own track ids, and the optional OCR budget, motion gate and OCR cache.
+    """
+
+    def __init__(self, stream_id, tracker, readings=None, gate=None, ocr_cache=None):
+        self.stream_id = stream_id
+        self.tracker = tracker
+        self.readings = readings
+        self.gate = gate
+        self.ocr_cache = ocr_cache
+        # one job at a time advances a stream
+        self.lock = threading.Lock()
+
+    def track_count(self):
+        """ Number of live tracks """
+        return len(self.tracker.trackers)
+
+    def snapshot(self):
+        """ The picklable part of the state, for checkpoints """
+        return {'tracker': self.tracker, 'readings': self.readings, 'gate': self.gate, 'ocr_cache': self.ocr_cache}
+
+    def restore(self, snapshot):
+        """ Continue from a snapshot() """
+        self.tracker = snapshot['tracker']
+        self.readings = snapshot['readings']
+        self.gate = snapshot['gate']
+        self.ocr_cache = snapshot['ocr_cache']
+
+    def log_metrics(self):
+        """ Log the OCR cache counters of the stream, if it has a cache, at the end of a run """
+        if self.ocr_cache is not None:
+            logger.info("OCR cache of stream %s: %s", self.stream_id, self.ocr_cache.metrics())
+
+
+class TrackerManager:
+    """
+    Isolated tracking state per camera / video stream.
+
+    Each stream gets its own StreamState (built by new_state(stream_id)), so tracks and ids of one
+    camera never leak into another and several streams can be advanced concurrently from one
+    process. Named streams keep their state between jobs; open(None) gives a job a fresh stream
+    that is dropped when it ends.
+    """
+
+    def __init__(self, new_state):
+        self.new_state = new_state
+        self.streams = {}
+        self.lock = threading.Lock()
+        self._anonymous = itertools.count()
+
+    def get(self, stream_id):
+        """ The state of stream_id, created on first use """
+        with self.lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                stream = self.streams[stream_id] = self.new_state(stream_id)
+            return stream
+
+    @contextmanager
+    def open(self, stream_id=None):
+        """
+        Hold a stream for the duration of a job.
+
+        Args:
+            stream_id (hashable): Camera or feed name; None for a one-off job.
+
+        Yields:
+            StreamState: The stream, locked against other jobs using the same stream_id.
+        """
+        temporary = stream_id is None
+        if temporary:
+            stream_id = ('job', next(self._anonymous))
+        stream = self.get(stream_id)
+        try:
+            with stream.lock:
+                yield stream
+        finally:
+            if temporary:
+                self.remove(stream_id)
+
+    def remove(self, stream_id):
+        """ Forget a stream (e.g. a camera taken offline) """
+        with self.lock:
+            self.streams.pop(stream_id, None)
+
+    def track_counts(self):
+        """
+        Live tracks per stream, for monitoring.
+
+        Returns:
+            dict: stream_id -> number of live tracks.
+        """
+        with self.lock:
+            streams = list(self.streams.values())
+        return {stream.stream_id: stream.track_count() for stream in streams}
+
+    def metrics(self):
+        """ Per-stream monitoring counters: live tracks, and the OCR cache counters when enabled """
+        with self.lock:
+            streams = list(self.streams.values())
+        return {
+            stream.stream_id: {
+                'tracks': stream.track_count(),
+                'ocr_cache': stream.ocr_cache.metrics() if stream.ocr_cache is not None else None,
+            }
+            for stream in streams
+        }
@@ -1,8 +1,10 @@
+import os
 import string
-import easyocr
 
-# Initialize the OCR reader
-reader = easyocr.Reader(['en'], gpu=False)
+import numpy as np
+
+from .ocr import normalize_crop
+from .registry import get_ocr_reader
 
 # Mapping dictionaries for character conversion
 dict_char_to_int = {'O': '0',
@@ -20,6 +22,83 @@ dict_int_to_char = {'0': 'O',
                     '5': 'S'}
 
 
+CSV_HEADER = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score',
+              'license_number', 'license_number_score']
+
+
+class CSVResultWriter:
+    """
+    Streaming CSV sink for process_video results.
+
+    Rows are appended as soon as a frame is finished and the file is flushed every
+    flush_every frames, so memory stays flat on long videos and a crash only loses the
+    last few frames. The columns are the same as write_csv has always produced.
+    resume_from (a value returned by checkpoint()) reopens a partly written file, dropping
+    whatever was written after that checkpoint.
+    """
+
+    def __init__(self, output_path, flush_every=100, resume_from=None):
+        self.output_path = output_path
+        self.flush_every = flush_every
+        self.frames_written = 0
+        if resume_from is not None:
+            self.f = open(output_path, 'r+')
+            self.f.truncate(resume_from)
+            self.f.seek(resume_from)
+        else:
+            self.f = open(output_path, 'w')
+            self.f.write(','.join(CSV_HEADER) + '\n')
+
+    def write_frame(self, frame_nmr, frame_results):
+        """
+        Append the rows of one frame.
+
+        Args:
+            frame_nmr (int): Frame number.
+            frame_results (dict): Results of the frame keyed by car id, as built by process_video.
+        """
+        for car_id in frame_results.keys():
+            if 'car' in frame_results[car_id].keys() and \
+               'license_plate' in frame_results[car_id].keys() and \
+               'text' in frame_results[car_id]['license_plate'].keys():
+                self.f.write('{},{},{},{},{},{},{}\n'.format(frame_nmr,
+                                                          car_id,
+                                                          '[{} {} {} {}]'.format(
+                                                              frame_results[car_id]['car']['bbox'][0],
+                                                              frame_results[car_id]['car']['bbox'][1],
+                                                              frame_results[car_id]['car']['bbox'][2],
+                                                              frame_results[car_id]['car']['bbox'][3]),
+                                                          '[{} {} {} {}]'.format(
+                                                              frame_results[car_id]['license_plate']['bbox'][0],
+                                                              frame_results[car_id]['license_plate']['bbox'][1],
+                                                              frame_results[car_id]['license_plate']['bbox'][2],
+                                                              frame_results[car_id]['license_plate']['bbox'][3]),
+                                                          frame_results[car_id]['license_plate']['bbox_score'],
+                                                          frame_results[car_id]['license_plate']['text'],
+                                                          frame_results[car_id]['license_plate']['text_score'])
+                             )
+
+        self.frames_written += 1
+        if self.flush_every and self.frames_written % self.flush_every == 0:
+            self.f.flush()
+
+    def checkpoint(self):
+        """ Flush to disk and return the position to pass as resume_from """
+        self.f.flush()
+        # the checkpoint that records this position is fsynced, the rows before it must be too
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def write_csv(results, output_path):
     """
     Write the results to a CSV file.
@@ -28,34 +107,9 @@ def write_csv(results, output_path):
         results (dict): Dictionary containing the results.
         output_path (str): Path to the output CSV file.
     """
-    with open(output_path, 'w') as f:
-        f.write('{},{},{},{},{},{},{}\n'.format('frame_nmr', 'car_id', 'car_bbox',
-                                                'license_plate_bbox', 'license_plate_bbox_score', 'license_number',
-                                                'license_number_score'))
-
+    with CSVResultWriter(output_path) as writer:
         for frame_nmr in results.keys():
-            for car_id in results[frame_nmr].keys():
-                print(results[frame_nmr][car_id])
-                if 'car' in results[frame_nmr][car_id].keys() and \
-                   'license_plate' in results[frame_nmr][car_id].keys() and \
-                   'text' in results[frame_nmr][car_id]['license_plate'].keys():
-                    f.write('{},{},{},{},{},{},{}\n'.format(frame_nmr,
-                                                            car_id,
-                                                            '[{} {} {} {}]'.format(
-                                                                results[frame_nmr][car_id]['car']['bbox'][0],
-                                                                results[frame_nmr][car_id]['car']['bbox'][1],
-                                                                results[frame_nmr][car_id]['car']['bbox'][2],
-                                                                results[frame_nmr][car_id]['car']['bbox'][3]),
-                                                            '[{} {} {} {}]'.format(
-                                                                results[frame_nmr][car_id]['license_plate']['bbox'][0],
-                                                                results[frame_nmr][car_id]['license_plate']['bbox'][1],
-                                                                results[frame_nmr][car_id]['license_plate']['bbox'][2],
-                                                                results[frame_nmr][car_id]['license_plate']['bbox'][3]),
-                                                            results[frame_nmr][car_id]['license_plate']['bbox_score'],
-                                                            results[frame_nmr][car_id]['license_plate']['text'],
-                                                            results[frame_nmr][car_id]['license_plate']['text_score'])
-                            )
-        f.close()
+            writer.write_frame(frame_nmr, results[frame_nmr])
 
 
 def license_complies_format(text):
@@ -105,19 +159,16 @@ def format_license(text):
     return license_plate_
 
 
-def read_license_plate(license_plate_crop):
+def parse_license_plate(detections):
     """
-    Read the license plate text from the given cropped image.
+    Pick the first EasyOCR detection that complies with the license plate format.
 
     Args:
-        license_plate_crop (PIL.Image.Image): Cropped image containing the license plate.
+        detections (list): Output of reader.readtext, a list of (bbox, text, score).
 
     Returns:
         tuple: Tuple containing the formatted license plate text and its confidence score.
     """
-
-    detections = reader.readtext(license_plate_crop)
-
     for detection in detections:
         bbox, text, score = detection
 
@@ -129,6 +180,27 @@ def read_license_plate(license_plate_crop):
     return None, None
 
 
+def read_license_plate(license_plate_crop, ocr_executor=None):
+    """
+    Read the license plate text from the given cropped image.
+
+    Args:
+        license_plate_crop (PIL.Image.Image): Cropped image containing the license plate.
+        ocr_executor (OCRExecutor): Optional process pool to run the recognition in.
+
+    Returns:
+        tuple: Tuple containing the formatted license plate text and its confidence score.
+    """
+    if ocr_executor is not None:
+        return ocr_executor.read([license_plate_crop], parse=parse_license_plate)[0]
+
+    # the OCR reader is loaded on first use and shared by every job of the process;
+    # the crop is OCRed at the same geometry as in the OCR process pool
+    detections = get_ocr_reader().readtext(normalize_crop(license_plate_crop))
+
+    return parse_license_plate(detections)
+
+
 def get_car(license_plate, vehicle_track_ids):
     """
     Retrieve the vehicle coordinates and ID based on the license plate coordinates.
@@ -154,4 +226,47 @@ def get_car(license_plate, vehicle_track_ids):
     if foundIt:
         return vehicle_track_ids[car_indx]
 
-    return -1, -1, -1, -1, -1
\ No newline at end of file
+    return -1, -1, -1, -1, -1
+
+
+def assign_plates_to_cars(license_plates, vehicle_track_ids, min_containment=1.0):
+    """
+    Assign every license plate of a frame to a vehicle at once.
+
+    Args:
+        license_plates (list): Plate detections (x1, y1, x2, y2, score, class_id).
+        vehicle_track_ids (list): Vehicle tracks (x1, y1, x2, y2, car_id).
+        min_containment (float): Share of the plate area that must lie inside the car box. 1.0
+            keeps the strict rule of get_car (plate strictly inside the car).
+
+    Returns:
+        numpy.ndarray: One (x1, y1, x2, y2, car_id) row per plate, (-1, -1, -1, -1, -1) when no car
+        holds it. A plate inside several cars goes to the one containing most of it, then to the
+        smallest of those cars (the nearer one when cars overlap).
+    """
+    plates = np.asarray(license_plates, dtype=float).reshape(-1, 6)
+    cars = np.asarray(vehicle_track_ids, dtype=float).reshape(-1, 5)
+    assigned = np.full((len(plates), 5), -1.)
+    if len(plates) == 0 or len(cars) == 0:
+        return assigned
+
+    p = plates[:, None, :4]
+    c = cars[None, :, :4]
+    if min_containment >= 1.0:
+        candidates = np.all(p[..., :2] > c[..., :2], axis=2) & np.all(p[..., 2:] < c[..., 2:], axis=2)
+        containment = candidates.astype(float)
+    else:
+        w = np.maximum(0., np.minimum(p[..., 2], c[..., 2]) - np.maximum(p[..., 0], c[..., 0]))
+        h = np.maximum(0., np.minimum(p[..., 3], c[..., 3]) - np.maximum(p[..., 1], c[..., 1]))
+        plate_area = (p[..., 2] - p[..., 0]) * (p[..., 3] - p[..., 1])
+        containment = np.divide(w * h, plate_area, out=np.zeros_like(w), where=plate_area > 0)
+        candidates = (containment >= min_containment) & (containment > 0)
+
+    containment = np.where(candidates, containment, -1.)
+    best = candidates & (containment == containment.max(axis=1, keepdims=True))
+    car_area = (cars[:, 2] - cars[:, 0]) * (cars[:, 3] - cars[:, 1])
+    choice = np.argmin(np.where(best, car_area[None, :], np.inf), axis=1)
+
+    found = candidates.any(axis=1)
+    assigned[found] = cars[choice[found]]
+    return assigned
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+Database-backed job queue.
+
+Views only enqueue ProcessingJob rows; `manage.py run_jobs` workers claim them by priority and run
+them with a bounded number of threads, so an upload burst queues up instead of starting one model
+run per request inside the web process. A running job holds a lease that its worker's heartbeat
+keeps extending; when a worker dies the lease runs out and another worker retries the job, up to
+max_attempts times with exponential backoff.
+
+A worker that stalls past its lease (e.g. a long GC pause or a frozen network mount) can find its
+job taken over. Handlers call check_lease() before side effects that must happen once, such as
+writing reads to the database, and stop with LeaseLost when the job is no longer theirs.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ProcessingJob
+
+# kind -> handler, called with the job's payload as keyword arguments
+HANDLERS = {
+    'process_video': 'alpr.services.run_alpr_pipeline',
+    'camera_scan': 'CAM.services.process_random_camera_feeds',
+    # one frame range of a chunked upload, see run_group
+    'video_chunk': 'alpr.services.run_video_chunk',
+}
+
+# uploads have a user waiting on them, camera scans do not
+PRIORITY_UPLOAD = 10
+PRIORITY_CAMERA_SCAN = 0
+
+LEASE_SECONDS = 60
+RETRY_BACKOFF_SECONDS = 30
+
+# Heartbeat of the job run by the current thread (see check_lease)
+_running = threading.local()
+
+
+class LeaseLost(Exception):
+    """ The job's lease ran out and another worker may be running it """
+
+
+def enqueue(kind, payload=None, priority=0, max_attempts=3):
+    """
+    Queue a job for the workers.
+
+    Args:
+        kind (str): Key of HANDLERS.
+        payload (dict): Keyword arguments of the handler (JSON serializable).
+        priority (int): Higher runs first.
+        max_attempts (int): Runs before the job is marked failed.
+
+    Returns:
+        ProcessingJob: The queued job.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}, expected one of {tuple(HANDLERS)}")
+    return ProcessingJob.objects.create(kind=kind, payload=payload or {}, priority=priority,
+                                        max_attempts=max_attempts)
+
+
+def kind_limits():
+    """ Per-kind cap on running jobs across all workers, e.g. {'camera_scan': 1} """
+    return getattr(settings, 'ALPR_JOB_LIMITS', {'camera_scan': 1})
+
+
+def claimable(now=None):
+    """ Jobs that are due, plus running jobs whose worker stopped sending heartbeats """
+    now = now or timezone.now()
+    return ProcessingJob.objects.filter(
+        Q(status=ProcessingJob.QUEUED, run_after__lte=now) |
+        Q(status=ProcessingJob.RUNNING, lease_expires_at__lt=now)
+    )
+
+
+def claim(worker, kinds=None, lease_seconds=LEASE_SECONDS, where=None):
+    """
+    Take the next job, highest priority first, then oldest.
+
+    The claim is a conditional UPDATE on the row, so two workers racing for the same job cannot
+    both get it, on any database backend. For a kind with a limit (kind_limits) the same UPDATE
+    also requires fewer than limit jobs of the kind to be running, and on databases where
+    concurrent UPDATEs do not see each other's rows (select_for_update support) the claims of
+    that kind first lock its queued and running jobs, so racing workers cannot exceed it either.
+
+    Args:
+        worker (str): Name of the claiming worker.
+        kinds (list): Only claim these kinds (default: all).
+        lease_seconds (int): How long the job is ours without a heartbeat.
+        where (Q): Extra condition on the jobs, e.g. Q(pk__in=...).
+
+    Returns:
+        ProcessingJob: The claimed job, or None if nothing is due.
+    """
+    now = timezone.now()
+    candidates = claimable(now).order_by('-priority', 'created_at')
+    if kinds:
+        candidates = candidates.filter(kind__in=kinds)
+    if where is not None:
+        candidates = candidates.filter(where)
+
+    limits = kind_limits()
+    running = ProcessingJob.objects.filter(status=ProcessingJob.RUNNING, lease_expires_at__gte=now)
+    for kind, limit in limits.items():
+        if running.filter(kind=kind).count() >= limit:
+            candidates = candidates.exclude(kind=kind)
+
+    for job in candidates[:10]:
+        if job.status == ProcessingJob.RUNNING and job.attempts >= job.max_attempts:
+            # its worker died on the last attempt
+            claimable(now).filter(pk=job.pk).update(
+                status=ProcessingJob.FAILED, finished_at=now,
+                last_error=job.last_error or f"Worker {job.worker} stopped responding")
+            continue
+
+        rows = claimable(now).filter(pk=job.pk, status=job.status, attempts=job.attempts)
+        limit = limits.get(job.kind)
+        with transaction.atomic():
+            if limit is not None:
+                if connection.features.has_select_for_update:
+                    list(ProcessingJob.objects.select_for_update().filter(
+                        kind=job.kind, status__in=[ProcessingJob.QUEUED, ProcessingJob.RUNNING]).order_by('pk').values_list('pk'))
+                # checked by the UPDATE itself, against the jobs running when it executes
+                running_count = running.filter(kind=job.kind).order_by().values('kind').annotate(n=Count('pk')).values('n')
+                rows = rows.filter(LessThan(Coalesce(Subquery(running_count), 0), limit))
+            claimed = rows.update(
+                status=ProcessingJob.RUNNING, worker=worker, attempts=job.attempts + 1, started_at=now,
+                lease_expires_at=now + timedelta(seconds=lease_seconds))
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def heartbeat(job, lease_seconds=LEASE_SECONDS):
+    """
+    Extend the lease of a running job.
+
+    Returns:
+        bool: False if the job is no longer ours (the lease ran out and another worker took it).
+    """
+    return ProcessingJob.objects.filter(
+        pk=job.pk, status=ProcessingJob.RUNNING, worker=job.worker, attempts=job.attempts
+    ).update(lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds)) == 1
+
+
+def complete(job):
+    ProcessingJob.objects.filter(pk=job.pk, worker=job.worker, attempts=job.attempts).update(
+        status=ProcessingJob.DONE, finished_at=timezone.now(), lease_expires_at=None)
+
+
+def fail(job, error):
+    """ Requeue the job with backoff, or mark it failed after max_attempts """
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        changes = dict(status=ProcessingJob.QUEUED, lease_expires_at=None,
+                       run_after=now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)))
+    else:
+        changes = dict(status=ProcessingJob.FAILED, finished_at=now, lease_expires_at=None)
+    ProcessingJob.objects.filter(pk=job.pk, worker=job.worker, attempts=job.attempts).update(
+        last_error=error, **changes)
+
+
+class Heartbeat(threading.Thread):
+    """ Keeps extending a job's lease while its handler runs; sets lost when the lease is gone """
+
+    def __init__(self, job, lease_seconds=LEASE_SECONDS):
+        super().__init__(daemon=True)
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3.):
+                if not heartbeat(self.job, self.lease_seconds):
+                    self.lost.set()
+                    break
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def check_lease():
+    """
+    Raise LeaseLost if the job run by this thread has lost its lease.
+
+    Handlers call it before side effects that another worker retrying the job would repeat.
+    Outside of run_job (e.g. a handler called directly) it does nothing.
+    """
+    beat = getattr(_running, 'heartbeat', None)
+    if beat is not None and beat.lost.is_set():
+        raise LeaseLost(f"Lease of job {beat.job.pk} lost by {beat.job.worker}")
+
+
+def run_job(job, lease_seconds=LEASE_SECONDS):
+    """
+    Run a claimed job's handler, heartbeating its lease, and record the outcome.
+
+    A job whose lease was lost is not recorded as done or failed: it belongs to whichever
+    worker claims it next.
+    """
+    beat = Heartbeat(job, lease_seconds)
+    outer, _running.heartbeat = getattr(_running, 'heartbeat', None), beat
+    beat.start()
+    try:
+        import_string(HANDLERS[job.kind])(**job.payload)
+    except Exception:
+        beat.stop()
+        if not beat.lost.is_set():
+            fail(job, traceback.format_exc())
+        return False
+    else:
+        beat.stop()
+        if beat.lost.is_set():
+            return False
+        complete(job)
+        return True
+    finally:
+        _running.heartbeat = outer
+
+
+def run_group(group, poll_seconds=2., lease_seconds=LEASE_SECONDS):
+    """
+    Wait for a group of jobs queued by a running job (e.g. the chunks of one upload).
+
+    Other workers take jobs of the group as they get free, and the waiting thread runs the ones
+    still queued itself, so a single worker can never deadlock on its own sub-jobs.
+
+    The job that called run_group keeps its lease the whole time, whether this thread is polling
+    or running a sub-job inline: run_job started that job's Heartbeat thread around the handler,
+    and it renews the lease independently of what the handler is doing.
+
+    Args:
+        group (list): The ProcessingJobs to wait for.
+
+    Raises:
+        RuntimeError: When a job of the group has failed for good.
+    """
+    pks = [job.pk for job in group]
+    name = f"{default_worker_name()}/{threading.current_thread().name}"
+    while True:
+        job = claim(name, lease_seconds=lease_seconds, where=Q(pk__in=pks))
+        if job is not None:
+            run_job(job, lease_seconds)
+            continue
+
+        statuses = dict(ProcessingJob.objects.filter(pk__in=pks).values_list('pk', 'status'))
+        failed = [pk for pk, status in statuses.items() if status == ProcessingJob.FAILED]
+        if failed:
+            raise RuntimeError(f"Jobs {failed} of the group failed")
+        if all(status == ProcessingJob.DONE for status in statuses.values()):
+            return
+        time.sleep(poll_seconds)
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def work(worker, concurrency=1, kinds=None, poll_seconds=2., lease_seconds=LEASE_SECONDS, burst=False, stop=None):
+    """
+    Worker loop: concurrency threads each claim and run jobs until stop is set.
+
+    Args:
+        worker (str): Worker name recorded on the jobs it claims.
+        concurrency (int): Jobs run at the same time by this process. They share the models
+            of the process-wide registry.
+        kinds (list): Only run these job kinds.
+        poll_seconds (float): Wait between polls of an empty queue.
+        lease_seconds (int): Lease length; the heartbeat renews it every third of it.
+        burst (bool): Exit once the queue is empty instead of polling forever.
+        stop (threading.Event): Set to make the threads exit after their current job.
+    """
+    stop = stop or threading.Event()
+
+    def loop(n):
+        name = f"{worker}/{n}"
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim(name, kinds, lease_seconds)
+                if job is None:
+                    if burst:
+                        return
+                    stop.wait(poll_seconds)
+                    continue
+                run_job(job, lease_seconds)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=loop, args=(n,), daemon=True) for n in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
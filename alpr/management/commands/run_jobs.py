@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from alpr import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs queued ALPR jobs (video uploads, camera scans) with bounded concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'ALPR_WORKER_CONCURRENCY', 1),
+                            help='jobs run at the same time by this worker (they share one copy of the models)')
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(jobs.HANDLERS),
+                            help='only run jobs of this kind (repeatable)')
+        parser.add_argument('--poll', type=float, default=2., help='seconds between polls of an empty queue')
+        parser.add_argument('--lease', type=int, default=jobs.LEASE_SECONDS,
+                            help='seconds a job stays ours without a heartbeat')
+        parser.add_argument('--burst', action='store_true', help='exit once the queue is empty')
+        parser.add_argument('--name', default=jobs.default_worker_name(), help='worker name stored on claimed jobs')
+        parser.add_argument('--preload', action='store_true', help='load the models before taking jobs')
+
+    def handle(self, *args, **options):
+        if options['preload']:
+            from alpr.services import preload_models
+            for model in preload_models():
+                self.stdout.write(f"Preloaded {model['model']}: {model['rss_mb']} MB in {model['load_seconds']} s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker {options['name']} running {options['concurrency']} job(s) at a time"))
+        jobs.work(options['name'], concurrency=options['concurrency'], kinds=options['kinds'],
+                  poll_seconds=options['poll'], lease_seconds=options['lease'], burst=options['burst'])
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class VideoUpload(models.Model):
     video_file = models.FileField(upload_to='videos/')
@@ -14,5 +15,39 @@ class VideoUpload(models.Model):
 
     def __str__(self):
         return f"Video {self.id}"
+
+
+class ProcessingJob(models.Model):
+    # Background work run by `manage.py run_jobs` workers instead of threads in the web process
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)  # e.g. "process_video", "camera_scan"
+    payload = models.JSONField(default=dict, blank=True)  # keyword arguments of the job's handler
+    priority = models.IntegerField(default=0)  # higher runs first
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # retries back off
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)  # pushed forward by the worker's heartbeat
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', '-priority', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
     
 
@@ -1,11 +1,62 @@
-import threading
 import os
 import csv
 from django.conf import settings
 from .models import VideoUpload
-from .core.algorithm import LicensePlateDetector
+from .core import registry
+from .core.checkpoint import Checkpointer, StageMarkers, file_fingerprint
+from .jobs import LeaseLost, check_lease
+
+# The detector modules pull in cv2, torch and pandas: they are imported on first use so that
+# manage.py commands and web workers that never process a video start fast.
+
+def detector_options():
+    # Ensure these .pt files are in your project root folder.
+    # Extra LicensePlateDetector options (e.g. {'batch_size': 8}) come from settings.
+    options = dict(
+        model_path_yolo='yolov8n.pt', 
+        model_path_plate='license_plate_detector.pt',
+    )
+    options.update(getattr(settings, 'ALPR_DETECTOR_OPTIONS', {}))
+    return options
+
+def build_detector():
+    from .core.algorithm import LicensePlateDetector
+
+    return LicensePlateDetector(**detector_options())
+
+def run_chunks_as_jobs(tasks):
+    # Spread the chunks of an upload over every `run_jobs` worker sharing MEDIA_ROOT
+    from .jobs import PRIORITY_UPLOAD, enqueue, run_group
+
+    group = [enqueue('video_chunk', {'video_path': video_path, 'output_path': output_path,
+                                     'start_frame': start_frame, 'end_frame': end_frame},
+                     priority=PRIORITY_UPLOAD)
+             for video_path, output_path, start_frame, end_frame in tasks]
+    run_group(group)
+
+def run_video_chunk(video_path, output_path, start_frame, end_frame):
+    build_detector().process_video(video_path, output_path, start_frame=start_frame, end_frame=end_frame)
+
+def preload_models():
+    """
+    Load the detector weights and the OCR reader into the model registry before workers fork,
+    so they share them copy-on-write. Returns the per-model memory report.
+
+    Only the weights are loaded: a whole detector would also start its OCR process pool
+    (ocr_processes) in the master, and forked workers must not inherit that.
+    """
+    from .core.backends import backend_options
+
+    options = detector_options()
+    return registry.preload([
+        lambda: registry.get_yolo(options['model_path_yolo'], **backend_options(options.get('vehicle_backend'))),
+        lambda: registry.get_yolo(options['model_path_plate'], **backend_options(options.get('plate_backend'))),
+        registry.get_ocr_reader,
+    ])
 
 def run_alpr_pipeline(video_instance_id):
+    from .core.results_io import export_csv, load_results, write_results
+
     # Retrieve the DB object
     video_instance = VideoUpload.objects.get(id=video_instance_id)
     
@@ -18,10 +69,12 @@ def run_alpr_pipeline(video_instance_id):
         input_video_path = video_instance.video_file.path
         
         # Create unique filenames based on video ID
-        csv_name = f"results_{video_instance.id}.csv"
+        # 'npz' stores typed columns (numeric boxes) instead of CSV text
+        results_format = getattr(settings, 'ALPR_RESULTS_FORMAT', 'csv')
+        csv_name = f"results_{video_instance.id}.{results_format}"
         csv_path = os.path.join(settings.MEDIA_ROOT, 'csvs', csv_name)
         
-        interpolated_csv_name = f"interpolated_{video_instance.id}.csv"
+        interpolated_csv_name = f"interpolated_{video_instance.id}.{results_format}"
         interpolated_csv_path = os.path.join(settings.MEDIA_ROOT, 'csvs', interpolated_csv_name)
         
         output_video_name = f"processed_{video_instance.id}.webm" 
@@ -30,57 +83,106 @@ def run_alpr_pipeline(video_instance_id):
         # Ensure output directories exist
         os.makedirs(os.path.join(settings.MEDIA_ROOT, 'csvs'), exist_ok=True)
         os.makedirs(os.path.join(settings.MEDIA_ROOT, 'processed'), exist_ok=True)
+        checkpoint_dir = os.path.join(settings.MEDIA_ROOT, 'checkpoints')
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+        # A retried or re-run upload skips the stages that already finished and resumes
+        # detection from its last checkpoint, as long as the video and options are unchanged.
+        options = detector_options()
+        run_key = [file_fingerprint(input_video_path), repr(sorted(options.items())), results_format,
+                   repr(getattr(settings, 'ALPR_CHUNKED', None))]
+        stages = StageMarkers(os.path.join(checkpoint_dir, f"video_{video_instance.id}.stages.json"), run_key)
+        checkpoint = Checkpointer(os.path.join(checkpoint_dir, f"video_{video_instance.id}.ckpt"), run_key,
+                                  every=getattr(settings, 'ALPR_CHECKPOINT_EVERY', 500))
 
         # 2. Initialize the AI Model
-        # Ensure these .pt files are in your project root folder
-        detector = LicensePlateDetector(
-            model_path_yolo='yolov8n.pt', 
-            model_path_plate='license_plate_detector.pt'
-        )
-
-        # 3. STEP 1: Process Video (YOLO + Sort + OCR)
-        # This saves the raw data to csv_path
-        detector.process_video(input_video_path, csv_path)
-
-        # 4. STEP 2: Interpolate Missing Data
-        video_instance.status = "Processing: Refining Data..."
-        video_instance.save()
+        detector = build_detector()
+
+        if getattr(settings, 'ALPR_FUSED_PIPELINE', False):
+            # Detect, interpolate and render in a single pass over the video.
+            # Gaps longer than ALPR_FUSED_LOOKBACK frames are not interpolated.
+            # A rendered video cannot be appended to, so this mode has no checkpoints.
+            if not stages.done('render'):
+                detector.process_and_render(input_video_path, interpolated_csv_path, output_video_path,
+                                            lookback=getattr(settings, 'ALPR_FUSED_LOOKBACK', 30))
+                stages.mark('render', interpolated_csv_path, output_video_path)
+        else:
+            # 3. STEP 1: Process Video (YOLO + Sort + OCR)
+            # This saves the raw data to csv_path
+            chunked = getattr(settings, 'ALPR_CHUNKED', None)
+            if not stages.done('detect'):
+                if chunked is not None:
+                    # Long uploads: overlapping frame ranges in parallel, tracks stitched afterwards.
+                    # e.g. {'workers': 8, 'overlap': 30}; 'queue': True runs the chunks as jobs
+                    # on all workers instead of in local processes.
+                    from .core.chunking import process_video_chunked
+
+                    chunked = dict(chunked)
+                    run_chunks = run_chunks_as_jobs if chunked.pop('queue', False) else None
+                    process_video_chunked(options, input_video_path, csv_path,
+                                          run_chunks=run_chunks, **chunked)
+                else:
+                    # Saves a checkpoint every ALPR_CHECKPOINT_EVERY frames, except in pipeline mode
+                    # (ALPR_DETECTOR_OPTIONS 'pipeline'), where tracking runs ahead of the written frames
+                    detector.process_video(input_video_path, csv_path, checkpoint=checkpoint)
+                stages.mark('detect', csv_path)
+                checkpoint.clear()
+
+            # 4. STEP 2: Interpolate Missing Data
+            check_lease()
+            if not stages.done('refine'):
+                video_instance.status = "Processing: Refining Data..."
+                video_instance.save()
         
-        # Read the raw CSV we just created
-        with open(csv_path, 'r') as file:
-            reader = csv.DictReader(file)
-            data = list(reader)
+                # Read the raw results we just created
+                if results_format == 'npz':
+                    data = load_results(csv_path)
+                else:
+                    with open(csv_path, 'r') as file:
+                        reader = csv.DictReader(file)
+                        data = list(reader)
         
-        # Run interpolation
-        interpolated_data = detector.interpolate_bounding_boxes(data)
-
-        # Write the interpolated data to a NEW CSV file
-        header = ['frame_nmr', 'car_id', 'car_bbox', 'license_plate_bbox', 'license_plate_bbox_score', 'license_number', 'license_number_score']
-        with open(interpolated_csv_path, 'w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=header)
-            writer.writeheader()
-            writer.writerows(interpolated_data)
-
-        # 5. STEP 3: Visualize (Draw on Video)
-        video_instance.status = "Processing: Rendering Video..."
-        video_instance.save()
+                # Run interpolation
+                interpolated_data = detector.interpolate_bounding_boxes(data)
+
+                # Write the interpolated data to a NEW results file
+                write_results(interpolated_data, interpolated_csv_path)
+                stages.mark('refine', interpolated_csv_path)
+
+            # 5. STEP 3: Visualize (Draw on Video)
+            check_lease()
+            if not stages.done('render'):
+                video_instance.status = "Processing: Rendering Video..."
+                video_instance.save()
         
-        # Pass the INTERPOLATED csv path here
-        detector.visualize(input_video_path, interpolated_csv_path, output_video_path)
+                # Pass the INTERPOLATED csv path here
+                detector.visualize(input_video_path, interpolated_csv_path, output_video_path)
+                stages.mark('render', output_video_path)
+
+        if results_format == 'npz' and getattr(settings, 'ALPR_EXPORT_CSV', False):
+            export_csv(interpolated_csv_path, interpolated_csv_path[:-len('.npz')] + '.csv')
 
         # 6. Finalize Database Entry
+        # (only by the worker that still holds the job, another one may be running it again)
+        check_lease()
         # Note: We save the path relative to MEDIA_ROOT for Django to serve it correctly
         video_instance.processed_video.name = f"processed/{output_video_name}"
         video_instance.csv_file.name = f"csvs/{interpolated_csv_name}"
         video_instance.is_processed = True
         video_instance.status = "Completed"
         video_instance.save()
+        stages.clear()
 
+    except LeaseLost:
+        raise
     except Exception as e:
         print(f"Error processing video: {e}")
         video_instance.status = f"Error: {str(e)}"
         video_instance.save()
+        # let the job queue retry it
+        raise
 
 def start_processing(video_instance_id):
-    thread = threading.Thread(target=run_alpr_pipeline, args=(video_instance_id,))
-    thread.start()
\ No newline at end of file
+    # Runs in a `manage.py run_jobs` worker, not in the web process
+    from .jobs import PRIORITY_UPLOAD, enqueue
+    return enqueue('process_video', {'video_instance_id': video_instance_id}, priority=PRIORITY_UPLOAD)
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Sparse detection-to-track association for crowded scenes.
+
+associate_detections_to_trackers scores every detection against every track and solves one dense
+assignment, which grows as O(n * m) memory and O(n^3) time. Here candidate pairs are gated with a
+uniform spatial grid (only boxes sharing a cell are scored), the pairs with a positive IoU form a
+sparse bipartite graph, and the assignment is solved separately on each connected component of it.
+Pairs that do not overlap never help the assignment, so every component gets the same optimum the
+dense solver finds for it.
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Grid cells allowed per box on average before candidate_pairs gives up on the grid
+MAX_CELLS_PER_BOX = 64
+# Cell coordinates must fit the 32 bit halves of a cell key
+MAX_CELL_INDEX = 2 ** 31 - 1
+
+
+def _cells(boxes, cell_size):
+    """ (cell key, box index) of every grid cell each box touches """
+    lo = np.floor(boxes[:, :2] / cell_size).astype(np.int64)
+    # an inverted box still touches the cell of its first corner
+    hi = np.maximum(np.floor(boxes[:, 2:4] / cell_size).astype(np.int64), lo)
+    nx = hi[:, 0] - lo[:, 0] + 1
+    ny = hi[:, 1] - lo[:, 1] + 1
+    counts = nx * ny
+
+    index = np.repeat(np.arange(len(boxes)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = lo[index, 0] + offset % nx[index]
+    cy = lo[index, 1] + offset // nx[index]
+    # one int64 key per cell: row in the high bits, column in the low ones
+    return (cy << 32) + cx, index
+
+
+def candidate_pairs(detections, trackers, cell_size=None):
+    """
+    Detection/track pairs whose boxes share at least one grid cell.
+
+    Boxes that would need too many cells (far larger than the grid pitch or too far from the
+    origin) or that are not finite make the grid pointless: every pair is returned instead, as
+    the dense association scores them.
+
+    Args:
+        detections (numpy.ndarray): (N, 4+) [x1, y1, x2, y2, ...] rows.
+        trackers (numpy.ndarray): (M, 4+) rows.
+        cell_size (float): Grid pitch in pixels; defaults to twice the median box side.
+
+    Returns:
+        tuple: (det_index, trk_index) arrays, without duplicates.
+    """
+    if cell_size is None:
+        sides = np.concatenate([detections[:, 2:4] - detections[:, :2], trackers[:, 2:4] - trackers[:, :2]])
+        cell_size = max(1., 2. * float(np.median(sides)))
+
+    boxes = np.concatenate([detections[:, :4], trackers[:, :4]]) / cell_size
+    with np.errstate(invalid='ignore', over='ignore'):
+        spans = np.maximum(np.floor(boxes[:, 2:4]) - np.floor(boxes[:, :2]) + 1, 1)
+        n_cells = np.prod(spans, axis=1).sum()
+    if (not np.isfinite(boxes).all() or np.abs(boxes).max() >= MAX_CELL_INDEX
+            or n_cells > MAX_CELLS_PER_BOX * len(boxes)):
+        return np.divmod(np.arange(len(detections) * len(trackers)), len(trackers))
+
+    det_keys, det_index = _cells(detections, cell_size)
+    trk_keys, trk_index = _cells(trackers, cell_size)
+
+    order = np.argsort(trk_keys, kind='stable')
+    trk_keys, trk_index = trk_keys[order], trk_index[order]
+    start = np.searchsorted(trk_keys, det_keys, side='left')
+    counts = np.searchsorted(trk_keys, det_keys, side='right') - start
+
+    det = np.repeat(det_index, counts)
+    trk = trk_index[np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+    pairs = np.unique(det * len(trackers) + trk)
+    return pairs // len(trackers), pairs % len(trackers)
+
+
+def pair_iou(detections, trackers, det, trk):
+    """ iou_batch restricted to the given pairs """
+    a, b = detections[det], trackers[trk]
+    w = np.maximum(0., np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]))
+    h = np.maximum(0., np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]))
+    wh = w * h
+    return wh / ((a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - wh)
+
+
+def associate_gated(detections, trackers, iou_threshold=0.3, cell_size=None):
+    """
+    Sparse counterpart of associate_detections_to_trackers.
+
+    Returns:
+        tuple: (matches, unmatched_detections, unmatched_trackers) like the dense version, except
+        that the unmatched detections come back sorted by index.
+    """
+    n, m = len(detections), len(trackers)
+    if n == 0 or m == 0:
+        return np.empty((0, 2), dtype=int), np.arange(n), np.arange(m)
+
+    det, trk = candidate_pairs(detections, trackers, cell_size)
+    iou = pair_iou(detections, trackers, det, trk)
+    overlap = iou > 0
+    det, trk, iou = det[overlap], trk[overlap], iou[overlap]
+
+    above = iou > iou_threshold
+    if np.bincount(det[above], minlength=n).max(initial=0) <= 1 and np.bincount(trk[above], minlength=m).max(initial=0) <= 1:
+        # no conflicts: each confident pair is its own match
+        match_det, match_trk = det[above], trk[above]
+    else:
+        graph = coo_matrix((np.ones(len(det)), (det, n + trk)), shape=(n + m, n + m))
+        _, labels = connected_components(graph, directed=False)
+        component = labels[det]
+
+        # components made of one pair need no solver
+        edges_per_component = np.bincount(component)
+        single = edges_per_component[component] == 1
+        confident = single & (iou >= iou_threshold)
+        match_det, match_trk = [det[confident]], [trk[confident]]
+
+        order = np.argsort(component[~single], kind='stable')
+        c_det, c_trk, c_iou = det[~single][order], trk[~single][order], iou[~single][order]
+        bounds = np.flatnonzero(np.diff(component[~single][order])) + 1
+        for d, t, v in zip(np.split(c_det, bounds), np.split(c_trk, bounds), np.split(c_iou, bounds)):
+            if len(d) == 0:
+                continue
+            rows, d_local = np.unique(d, return_inverse=True)
+            cols, t_local = np.unique(t, return_inverse=True)
+            block = np.zeros((len(rows), len(cols)))
+            block[d_local, t_local] = v
+            r, c = linear_sum_assignment(-block)
+            keep = block[r, c] >= iou_threshold
+            match_det.append(rows[r[keep]])
+            match_trk.append(cols[c[keep]])
+        match_det, match_trk = np.concatenate(match_det), np.concatenate(match_trk)
+
+    order = np.argsort(match_det, kind='stable')
+    matches = np.stack([match_det[order], match_trk[order]], axis=1).astype(int)
+
+    det_matched = np.zeros(n, dtype=bool)
+    det_matched[matches[:, 0]] = True
+    trk_matched = np.zeros(m, dtype=bool)
+    trk_matched[matches[:, 1]] = True
+    return matches, np.flatnonzero(~det_matched), np.flatnonzero(~trk_matched)
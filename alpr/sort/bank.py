@@ -0,0 +1,184 @@
+"""
+Vectorized SORT.
+
+BankSort keeps the Kalman state of every track in stacked arrays (KalmanFilterBank) and runs
+predict and update for all tracks with batched NumPy operations, instead of one filterpy
+KalmanFilter and a few small array allocations per track per frame. The filter matrices, the
+update equations (filterpy's Joseph form) and the bookkeeping are those of KalmanBoxTracker and
+Sort, so update() returns the same rows in the same order.
+"""
+import numpy as np
+
+from .sort import ASSOCIATIONS
+
+# constant velocity model of KalmanBoxTracker: state [x, y, s, r, vx, vy, vs], measurement [x, y, s, r]
+F = np.eye(7)
+F[0, 4] = F[1, 5] = F[2, 6] = 1.
+R = np.eye(4)
+R[2:, 2:] *= 10.
+P0 = np.eye(7)
+P0[4:, 4:] *= 1000.
+P0 *= 10.
+Q = np.eye(7)
+Q[-1, -1] *= 0.01
+Q[4:, 4:] *= 0.01
+
+
+def bboxes_to_z(bboxes):
+    """ convert_bbox_to_z for an (N, 4+) array of [x1, y1, x2, y2, ...] rows; returns (N, 4) """
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2., bboxes[:, 1] + h / 2., w * h, w / h], axis=1)
+
+
+def x_to_bboxes(x):
+    """ convert_x_to_bbox for an (N, 7+) array of states; returns (N, 4) """
+    w = np.sqrt(x[:, 2] * x[:, 3])
+    h = x[:, 2] / w
+    return np.stack([x[:, 0] - w / 2., x[:, 1] - h / 2., x[:, 0] + w / 2., x[:, 1] + h / 2.], axis=1)
+
+
+class KalmanFilterBank:
+    """
+    The Kalman filters of all live tracks, stacked: x is (N, 7), P is (N, 7, 7).
+    Per-track counters mirror the attributes of KalmanBoxTracker.
+    """
+
+    def __init__(self):
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.time_since_update = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.hit_streak = np.zeros(0, dtype=np.int64)
+        self.age = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, bboxes, ids):
+        """ Start one track per bbox, with the given ids """
+        n = len(bboxes)
+        if n == 0:
+            return
+        x = np.zeros((n, 7))
+        x[:, :4] = bboxes_to_z(bboxes)
+
+        zeros = np.zeros(n, dtype=np.int64)
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(P0, (n, 7, 7))])
+        self.ids = np.concatenate([self.ids, ids])
+        self.time_since_update = np.concatenate([self.time_since_update, zeros])
+        self.hits = np.concatenate([self.hits, zeros])
+        self.hit_streak = np.concatenate([self.hit_streak, zeros])
+        self.age = np.concatenate([self.age, zeros])
+
+    def keep(self, mask):
+        """ Drop the tracks where mask is False, keeping the order of the others """
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+        self.ids = self.ids[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.hits = self.hits[mask]
+        self.hit_streak = self.hit_streak[mask]
+        self.age = self.age[mask]
+
+    def predict(self):
+        """
+        KalmanBoxTracker.predict for every track.
+
+        Returns:
+            numpy.ndarray: (N, 4) predicted boxes.
+        """
+        # a box whose area would turn negative stops growing/shrinking
+        self.x[self.x[:, 6] + self.x[:, 2] <= 0, 6] = 0.
+        self.x = self.x @ F.T
+        self.P = F @ self.P @ F.T + Q
+
+        self.age += 1
+        self.hit_streak[self.time_since_update > 0] = 0
+        self.time_since_update += 1
+        return x_to_bboxes(self.x)
+
+    def update(self, index, bboxes):
+        """
+        KalmanBoxTracker.update of the tracks at index with the matched detections.
+
+        Args:
+            index (numpy.ndarray): Track positions.
+            bboxes (numpy.ndarray): (len(index), 4+) detections.
+        """
+        if len(index) == 0:
+            return
+        x, P = self.x[index], self.P[index]
+
+        y = bboxes_to_z(bboxes) - x[:, :4]
+        PHT = P[:, :, :4]
+        S = PHT[:, :4, :] + R
+        K = PHT @ np.linalg.inv(S)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+
+        I_KH = np.broadcast_to(np.eye(7), P.shape).copy()
+        I_KH[:, :, :4] -= K
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ R @ K.transpose(0, 2, 1)
+
+        self.x[index], self.P[index] = x, P
+        self.time_since_update[index] = 0
+        self.hits[index] += 1
+        self.hit_streak[index] += 1
+
+    def get_state(self):
+        return x_to_bboxes(self.x)
+
+
+class BankSort:
+    """
+    Drop-in replacement of Sort backed by a KalmanFilterBank.
+
+    update() takes and returns the same arrays as Sort.update: rows of
+    [x1, y1, x2, y2, track_id], in the same order.
+    """
+
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, association='dense'):
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.associate = ASSOCIATIONS[association]
+        self.bank = KalmanFilterBank()
+        self.frame_count = 0
+        self.next_id = 0
+
+    @property
+    def trackers(self):
+        """ Ids of the live tracks (Sort keeps its KalmanBoxTracker objects here) """
+        return list(self.bank.ids)
+
+    def update(self, dets=np.empty((0, 5))):
+        self.frame_count += 1
+        dets = np.asarray(dets, dtype=float).reshape(-1, 5)
+
+        trks = self.bank.predict()
+        valid = np.all(np.isfinite(trks), axis=1)
+        if not valid.all():
+            self.bank.keep(valid)
+            trks = trks[valid]
+        trks = np.concatenate([trks, np.zeros((len(trks), 1))], axis=1)
+
+        matched, unmatched_dets, unmatched_trks = self.associate(dets, trks, self.iou_threshold)
+
+        matched = np.asarray(matched, dtype=int).reshape(-1, 2)
+        self.bank.update(matched[:, 1], dets[matched[:, 0]])
+        births = dets[np.asarray(unmatched_dets, dtype=int)]
+        self.bank.add(births, np.arange(self.next_id, self.next_id + len(births)))
+        self.next_id += len(births)
+
+        bank = self.bank
+        state = bank.get_state()
+        returned = (bank.time_since_update < 1) & ((bank.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+        # Sort walks its trackers backwards
+        ret = np.concatenate([state, bank.ids[:, None] + 1.], axis=1)[returned][::-1]
+        bank.keep(bank.time_since_update <= self.max_age)
+
+        if len(ret) > 0:
+            return ret
+        return np.empty((0, 5))
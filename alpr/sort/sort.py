@@ -1,6 +1,7 @@
 import numpy as np
 from filterpy.kalman import KalmanFilter
 from scipy.optimize import linear_sum_assignment
+from .association import associate_gated
 
 def iou_batch(bb_test, bb_gt):
     """
@@ -49,7 +50,7 @@ def convert_x_to_bbox(x, score=None):
 
 class KalmanBoxTracker(object):
     count = 0
-    def __init__(self, bbox):
+    def __init__(self, bbox, track_id=None):
         self.kf = KalmanFilter(dim_x=7, dim_z=4)
         self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],
                               [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
@@ -61,8 +62,11 @@ class KalmanBoxTracker(object):
         self.kf.Q[4:, 4:] *= 0.01
         self.kf.x[:4] = convert_bbox_to_z(bbox)
         self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
+        if track_id is None:
+            # standalone trackers share the class-wide counter
+            track_id = KalmanBoxTracker.count
+            KalmanBoxTracker.count += 1
+        self.id = track_id
         self.history = []
         self.hits = 0
         self.hit_streak = 0
@@ -90,12 +94,16 @@ class KalmanBoxTracker(object):
         return convert_x_to_bbox(self.kf.x)
 
 class Sort(object):
-    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, association='dense'):
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
+        # 'gated' scores only nearby pairs and solves each overlapping group on its own (crowded scenes)
+        self.associate = ASSOCIATIONS[association]
         self.trackers = []
         self.frame_count = 0
+        # ids are numbered per Sort instance, so separate streams never share them
+        self.next_id = 0
 
     def update(self, dets=np.empty((0, 5))):
         self.frame_count += 1
@@ -111,13 +119,14 @@ class Sort(object):
         for t in reversed(to_del):
             self.trackers.pop(t)
         
-        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+        matched, unmatched_dets, unmatched_trks = self.associate(dets, trks, self.iou_threshold)
 
         for m in matched:
             self.trackers[m[1]].update(dets[m[0], :])
 
         for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i, :])
+            trk = KalmanBoxTracker(dets[i, :], track_id=self.next_id)
+            self.next_id += 1
             self.trackers.append(trk)
         
         i = len(self.trackers)
@@ -149,28 +158,18 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
     else:
         matched_indices = np.empty(shape=(0, 2))
 
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-    
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
+    matched_indices = matched_indices.astype(int)
+    det_matched = np.zeros(len(detections), dtype=bool)
+    det_matched[matched_indices[:, 0]] = True
+    trk_matched = np.zeros(len(trackers), dtype=bool)
+    trk_matched[matched_indices[:, 1]] = True
 
     # Filter out matches with low IOU
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+    low = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+    unmatched_detections = np.concatenate([np.flatnonzero(~det_matched), matched_indices[low, 0]])
+    unmatched_trackers = np.concatenate([np.flatnonzero(~trk_matched), matched_indices[low, 1]])
+    matches = matched_indices[~low].reshape(-1, 2)
+
+    return matches, unmatched_detections, unmatched_trackers
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
\ No newline at end of file
+ASSOCIATIONS = {'dense': associate_detections_to_trackers, 'gated': associate_gated}
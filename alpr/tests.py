@@ -1,3 +1,1309 @@
-from django.test import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from scipy.interpolate import interp1d
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import jobs
+from .core.algorithm import TRACKERS, LicensePlateDetector
+from .core.backends import backend_options, calibration_frames, exported_path, letterbox
+from .core.checkpoint import Checkpointer
+from .core.chunking import plan_chunks, process_video_chunked, stitch_chunks
+from .core.consensus import PlateReadingAccumulator
+from .core.interpolation import interpolate_columns, interpolate_rows, interpolate_tracks
+from .core.motion import MotionGate
+from .core.ocr import OCRExecutor, normalize_crop
+from .core.scheduler import process_streams
+from .core.ocr_cache import PlateOCRCache
+from .sort.association import associate_gated, candidate_pairs
+from .sort.bank import BankSort
+from .sort.sort import Sort, associate_detections_to_trackers
+from .core.utils_alpr import assign_plates_to_cars, get_car, parse_license_plate, read_license_plate
+from .models import ProcessingJob
+from .core.results_io import (CAR_BBOX, PLATE_BBOX, NpzResultWriter, export_csv, load_results, load_results_dataframe,
+                              open_result_writer, write_results)
+
+# (first frame, last frame, y) of the cars in the synthetic video
+CARS = [(0, 40, 0), (15, 60, 150), (45, 60, 300)]
+
+
+class FakeBoxes:
+    def __init__(self, rows):
+        self.data = np.array(rows, dtype=float).reshape(-1, 6)
+        self.xyxy = self.data[:, :4]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.boxes = FakeBoxes(rows)
+
+
+def crop_offset(image):
+    """ (x, y) of an image's first pixel in the frame it is a view of, (0, 0) for a whole frame """
+    if image.base is None:
+        return 0, 0
+    offset = image.ctypes.data - image.base.ctypes.data
+    return (offset % image.strides[0]) // image.strides[1], offset // image.strides[0]
+
+
+class FakeYOLO:
+    """
+    Stands in for the vehicle / plate models: boxes depend on the frame number encoded in the pixels.
+    Crops of a frame (cascade mode) get the boxes that lie inside them, in crop coordinates.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = []
+
+    def __call__(self, frames):
+        self.calls.append(len(frames))
+        results = []
+        for frame in frames:
+            frame_nmr = encoded_frame_nmr(frame)
+            off_x, off_y = crop_offset(frame)
+            rows = []
+            for first, last, y in CARS:
+                if first <= frame_nmr < last:
+                    x = 2 * (frame_nmr - first)
+                    if 'plate' in self.path:
+                        row = [x + 40 - off_x, y + 60 - off_y, x + 100 - off_x, y + 90 - off_y, 0.9, 0]
+                    else:
+                        row = [x - off_x, y - off_y, x + 150 - off_x, y + 120 - off_y, 0.8, 2]
+                    if row[0] >= 0 and row[1] >= 0 and row[2] <= frame.shape[1] and row[3] <= frame.shape[0]:
+                        rows.append(row)
+            results.append(FakeResult(rows))
+        return results
+
+
+def write_video(path, n_frames):
+    """ Lossless video whose frame number is readable from its first pixel """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'FFV1'), 10, (640, 480))
+    for frame_nmr in range(n_frames):
+        frame = np.zeros((480, 640, 3), np.uint8)
+        frame[:, :, 0] = frame_nmr % 256
+        frame[:, :, 1] = frame_nmr // 256
+        writer.write(frame)
+    writer.release()
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    n_frames = 0
+    while cap.read()[0]:
+        n_frames += 1
+    cap.release()
+    return n_frames
+
+
+def encoded_frame_nmr(frame):
+    """ Frame number written into the first pixel by write_video """
+    return int(frame[0, 0, 1]) * 256 + int(frame[0, 0, 0])
+
+
+class DetectorTestCase(SimpleTestCase):
+    """ Runs LicensePlateDetector on a synthetic video with fake models and OCR """
+
+    n_frames = 60
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.video = os.path.join(cls.tmp, 'video.avi')
+        write_video(cls.video, cls.n_frames)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        patches = [
+            mock.patch('alpr.core.algorithm.get_yolo', side_effect=lambda path, **backend: FakeYOLO(path)),
+            mock.patch('alpr.core.algorithm.read_license_plate', return_value=('AB12CDE', 0.9)),
+        ]
+        self.get_yolo, self.read_license_plate = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def detector(self, **options):
+        return LicensePlateDetector('yolov8n.pt', 'license_plate_detector.pt', **options)
+
+    def run_video(self, detector, name='results.csv'):
+        return detector.process_video(self.video, os.path.join(self.tmp, name), keep_results=True)
+
+
+class BatchedDetectionTests(DetectorTestCase):
+
+    def test_batched_results_match_per_frame_results(self):
+        expected = self.run_video(self.detector())
+        self.assertTrue(any(expected.values()))
+        for batch_size in (2, 4, 7):
+            detector = self.detector(batch_size=batch_size)
+            self.assertEqual(self.run_video(detector), expected)
+            self.assertEqual(max(detector.coco_model.calls), batch_size)
+
+    def test_batched_pipelined_results_match_per_frame_results(self):
+        expected = self.run_video(self.detector())
+        self.assertEqual(self.run_video(self.detector(batch_size=4, pipeline=True)), expected)
+
+
+class PlateReadingAccumulatorTests(SimpleTestCase):
+    car = [0, 0, 100, 80]
+
+    def test_converges_after_min_reads_that_agree(self):
+        readings = PlateReadingAccumulator(min_reads=3)
+        for frame_nmr in range(2):
+            readings.add(1, frame_nmr, self.car, 'AB12CDE', 0.9)
+            self.assertTrue(readings.should_read(1, frame_nmr + 1, self.car))
+        readings.add(1, 2, self.car, 'AB12CDE', 0.9)
+        self.assertTrue(readings.is_converged(1))
+        self.assertEqual(readings.consensus(1)[0], 'AB12CDE')
+        self.assertFalse(readings.should_read(1, 3, self.car))
+
+    def test_disagreeing_reads_do_not_converge(self):
+        readings = PlateReadingAccumulator(min_reads=3, min_agreement=0.8)
+        for frame_nmr, text in enumerate(['AB12CDE', 'AB12CDF', 'AB12CDG', 'AB12CDH']):
+            readings.add(1, frame_nmr, self.car, text, 0.9)
+        self.assertFalse(readings.is_converged(1))
+        self.assertTrue(readings.should_read(1, 4, self.car))
+
+    def test_cooldown_and_resize_trigger_a_new_read(self):
+        readings = PlateReadingAccumulator(min_reads=1, cooldown=30, resize_ratio=1.5)
+        readings.add(1, 10, self.car, 'AB12CDE', 0.9)
+        self.assertFalse(readings.should_read(1, 39, self.car))
+        self.assertTrue(readings.should_read(1, 40, self.car))
+        self.assertTrue(readings.should_read(1, 11, [0, 0, 200, 160]))
+
+    def test_failed_read_restarts_the_cooldown(self):
+        readings = PlateReadingAccumulator(min_reads=1, cooldown=30)
+        readings.add(1, 0, self.car, 'AB12CDE', 0.9)
+        readings.add(1, 30, self.car, None, None)
+        self.assertFalse(readings.should_read(1, 31, self.car))
+
+    def test_keeps_only_the_most_recently_read_tracks(self):
+        readings = PlateReadingAccumulator(min_reads=1, max_tracks=2)
+        for car_id in (1, 2, 3):
+            readings.add(car_id, car_id, self.car, 'AB12CDE', 0.9)
+        readings.add(2, 4, self.car, 'AB12CDE', 0.9)
+        readings.add(4, 5, self.car, 'AB12CDE', 0.9)
+        self.assertEqual(list(readings.tracks), [2, 4])
+        self.assertTrue(readings.should_read(1, 6, self.car))
+
+    def test_misread_of_another_length_does_not_lower_the_score(self):
+        readings = PlateReadingAccumulator(min_reads=3, min_confidence=0.8)
+        for frame_nmr in range(3):
+            readings.add(1, frame_nmr, self.car, 'AB12CDE', 0.9)
+        readings.add(1, 3, self.car, 'AB12CD', 0.9)
+        text, score, agreement = readings.consensus(1)
+        self.assertEqual((text, agreement), ('AB12CDE', 1.))
+        self.assertAlmostEqual(score, 0.9)
+        self.assertTrue(readings.is_converged(1))
+
+
+class MotionGateTests(SimpleTestCase):
+
+    def setUp(self):
+        self.still = np.full((240, 320, 3), 100, np.uint8)
+        self.moved = self.still.copy()
+        self.moved[60:180, 80:240] = 255
+
+    def test_stride_doubles_on_a_still_scene_up_to_max_stride(self):
+        gate = MotionGate(max_stride=8)
+        self.assertTrue(gate.should_detect(self.still, active_tracks=False))  # first frame
+        strides = []
+        for _ in range(5):
+            self.assertFalse(gate.should_detect(self.still, active_tracks=False))
+            strides.append(gate.stride)
+        self.assertEqual(strides, [2, 4, 8, 8, 8])
+
+    def test_motion_resets_the_stride(self):
+        gate = MotionGate(max_stride=8)
+        for _ in range(4):
+            gate.should_detect(self.still, active_tracks=False)
+        self.assertTrue(gate.should_detect(self.moved, active_tracks=False))
+        self.assertEqual(gate.stride, 1)
+
+    def test_live_tracks_keep_every_frame(self):
+        gate = MotionGate(max_stride=8)
+        for _ in range(4):
+            self.assertTrue(gate.should_detect(self.still, active_tracks=True))
+            self.assertEqual(gate.stride, 1)
+
+
+def frame_result(car_bbox, plate_bbox, text, bbox_score=0.8, text_score=0.9):
+    return {'car': {'bbox': car_bbox},
+            'license_plate': {'bbox': plate_bbox, 'text': text, 'bbox_score': bbox_score, 'text_score': text_score}}
+
+
+FRAMES = [
+    (0, {1: frame_result([0., 0., 100., 80.], [20., 50., 60., 70.], 'AB12CDE'),
+         2: {'car': {'bbox': [200., 0., 300., 80.]}}}),  # no plate read: not written
+    (1, {1: frame_result([2., 0., 102., 80.], [22., 50., 62., 70.], 'AB12CDE', 0.7, 0.95)}),
+    (3, {2: frame_result([205.5, 1., 305., 81.], [220., 50., 260., 70.], 'XY34ZZZ')}),
+]
+
+
+class ResultWriterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def write(self, name, frames=FRAMES):
+        path = os.path.join(self.tmp, name)
+        with open_result_writer(path) as writer:
+            for frame_nmr, frame_results in frames:
+                writer.write_frame(frame_nmr, frame_results)
+        return path
+
+    def assertRoundTrip(self, columns, frames=FRAMES):
+        rows = [(frame_nmr, car_id, result) for frame_nmr, frame_results in frames
+                for car_id, result in frame_results.items() if 'license_plate' in result]
+        self.assertEqual(np.asarray(columns['frame_nmr']).tolist(), [frame_nmr for frame_nmr, _, _ in rows])
+        self.assertEqual(np.asarray(columns['car_id']).tolist(), [car_id for _, car_id, _ in rows])
+        self.assertEqual(np.asarray(columns['license_number']).tolist(),
+                         [result['license_plate']['text'] for _, _, result in rows])
+        self.assertEqual(np.asarray(columns['license_number_score']).tolist(),
+                         [result['license_plate']['text_score'] for _, _, result in rows])
+        self.assertEqual(np.column_stack([columns[name] for name in ('car_x1', 'car_y1', 'car_x2', 'car_y2')]).tolist(),
+                         [result['car']['bbox'] for _, _, result in rows])
+        self.assertEqual(np.column_stack([columns[name] for name in ('plate_x1', 'plate_y1', 'plate_x2', 'plate_y2')]).tolist(),
+                         [result['license_plate']['bbox'] for _, _, result in rows])
+
+    def assertResumes(self, name):
+        """ A writer that died after a checkpoint resumes from it, dropping the rows written since """
+        path = os.path.join(self.tmp, name)
+        with self.assertRaises(RuntimeError), open_result_writer(path) as writer:
+            for frame_nmr, frame_results in FRAMES[:2]:
+                writer.write_frame(frame_nmr, frame_results)
+            with mock.patch('os.fsync') as fsync:
+                position = writer.checkpoint()
+            self.assertTrue(fsync.called)
+            writer.write_frame(*FRAMES[2])
+            writer.write_frame(4, FRAMES[2][1])
+            raise RuntimeError
+
+        with open_result_writer(path, resume_from=position) as writer:
+            writer.write_frame(*FRAMES[2])
+        self.assertRoundTrip(load_results(path))
+
+    def assertLoadsWithoutBoxes(self, name):
+        path = self.write(name)
+        with mock.patch('alpr.core.results_io._split_bboxes') as split_bboxes:
+            df = load_results_dataframe(path, boxes=False)
+        split_bboxes.assert_not_called()
+        expected = load_results_dataframe(path)
+        self.assertEqual(sorted(df.columns), sorted(set(expected.columns) - set(CAR_BBOX + PLATE_BBOX)))
+        self.assertTrue(df.equals(expected[df.columns]))
+
+
+class CSVResultWriterTests(ResultWriterTestCase):
+
+    def test_loads_without_boxes(self):
+        self.assertLoadsWithoutBoxes('results.csv')
+
+    def test_round_trip(self):
+        self.assertRoundTrip(load_results(self.write('results.csv')))
+
+    def test_resume_from_checkpoint(self):
+        self.assertResumes('results.csv')
+
+    def test_header_only_without_reads(self):
+        path = self.write('results.csv', frames=[(0, {1: {'car': {'bbox': [0., 0., 1., 1.]}}})])
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines(), ['frame_nmr,car_id,car_bbox,license_plate_bbox,'
+                                                     'license_plate_bbox_score,license_number,license_number_score'])
+
+
+class StreamedResultsTests(DetectorTestCase):
+
+    def test_process_video_streams_rows_without_keeping_results(self):
+        path = os.path.join(self.tmp, 'streamed.csv')
+        self.assertIsNone(self.detector().process_video(self.video, path))
+        expected = self.run_video(self.detector())
+        rows = [(frame_nmr, car_id) for frame_nmr, frame_results in expected.items() for car_id in frame_results]
+        columns = load_results(path)
+        self.assertEqual(list(zip(columns['frame_nmr'].tolist(), columns['car_id'].tolist())), rows)
+
+
+class NpzResultWriterTests(ResultWriterTestCase):
+
+    def test_round_trip(self):
+        path = self.write('results.npz')
+        self.assertRoundTrip(load_results(path))
+        self.assertRoundTrip(load_results(path, mmap=False))
+        self.assertIsInstance(load_results(path)['car_x1'], np.memmap)
+        self.assertFalse(os.path.exists(path + '.parts'))
+
+    def test_loads_without_boxes(self):
+        self.assertLoadsWithoutBoxes('results.npz')
+
+    def test_spills_in_chunks(self):
+        path = os.path.join(self.tmp, 'results.npz')
+        with NpzResultWriter(path, chunk_rows=1) as writer:
+            for frame_nmr, frame_results in FRAMES:
+                writer.write_frame(frame_nmr, frame_results)
+        self.assertRoundTrip(load_results(path))
+
+    def test_resume_from_checkpoint(self):
+        self.assertResumes('results.npz')
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'results.npz.parts')))
+
+    def test_empty(self):
+        columns = load_results(self.write('results.npz', frames=[]))
+        self.assertEqual(len(columns['frame_nmr']), 0)
+
+    def test_matches_csv_and_exports_to_it(self):
+        npz_path, csv_path = self.write('results.npz'), self.write('results.csv')
+        exported = os.path.join(self.tmp, 'exported.csv')
+        export_csv(npz_path, exported)
+        self.assertRoundTrip(load_results(exported))
+
+        copy = os.path.join(self.tmp, 'copy.npz')
+        write_results(load_results(csv_path), copy)
+        self.assertRoundTrip(load_results(copy))
+
+
+def interpolate_per_car(frame_numbers, car_ids, boxes):
+    """ The original interpolation, one car and one gap at a time with interp1d """
+    out = []
+    for car_id in np.unique(car_ids):
+        mask = car_ids == car_id
+        frames, car_boxes = frame_numbers[mask], boxes[mask]
+        order = np.argsort(frames)
+        frames, car_boxes = frames[order], car_boxes[order]
+        for i, (frame_nmr, box) in enumerate(zip(frames, car_boxes)):
+            if i > 0 and frame_nmr - frames[i - 1] > 1:
+                x_new = np.linspace(frames[i - 1], frame_nmr, num=frame_nmr - frames[i - 1], endpoint=False)
+                imputed = interp1d([frames[i - 1], frame_nmr], np.vstack((car_boxes[i - 1], box)), axis=0)(x_new)
+                out.extend((int(x), int(car_id), tuple(b)) for x, b in zip(x_new[1:], imputed[1:]))
+            out.append((int(frame_nmr), int(car_id), tuple(box)))
+    return out
+
+
+class InterpolationTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        rows = []
+        for car_id in (3, 1, 7):
+            frames = np.sort(rng.choice(200, size=25, replace=False))
+            rows.extend((frame_nmr, car_id) for frame_nmr in frames)
+        rng.shuffle(rows)
+        self.frame_numbers = np.array([frame_nmr for frame_nmr, _ in rows])
+        self.car_ids = np.array([car_id for _, car_id in rows])
+        self.boxes = rng.uniform(0, 1000, size=(len(rows), 8))
+
+    def test_matches_per_car_interpolation(self):
+        frames, cars, boxes, source = interpolate_tracks(self.frame_numbers, self.car_ids, self.boxes)
+        expected = interpolate_per_car(self.frame_numbers, self.car_ids, self.boxes)
+
+        self.assertEqual(list(zip(frames.tolist(), cars.tolist())), [(f, c) for f, c, _ in expected])
+        np.testing.assert_allclose(boxes, np.array([b for _, _, b in expected]))
+        original = source >= 0
+        self.assertEqual(original.sum(), len(self.frame_numbers))
+        np.testing.assert_array_equal(self.frame_numbers[source[original]], frames[original])
+        np.testing.assert_array_equal(self.boxes[source[original]], boxes[original])
+
+    def test_empty(self):
+        frames, cars, boxes, source = interpolate_tracks(np.empty(0), np.empty(0), np.empty((0, 8)))
+        self.assertEqual((len(frames), len(cars), len(boxes), len(source)), (0, 0, 0, 0))
+        self.assertEqual(interpolate_rows([]), [])
+
+    def test_rows_and_columns_agree(self):
+        n = len(self.frame_numbers)
+        columns = {'frame_nmr': self.frame_numbers, 'car_id': self.car_ids,
+                   'license_plate_bbox_score': np.full(n, 0.5), 'license_number': np.array(['AB12CDE'] * n),
+                   'license_number_score': np.full(n, 0.9)}
+        for i, name in enumerate(CAR_BBOX + PLATE_BBOX):
+            columns[name] = self.boxes[:, i]
+        rows = [{'frame_nmr': str(f), 'car_id': str(c),
+                 'car_bbox': '[' + ' '.join(map(str, b[:4])) + ']',
+                 'license_plate_bbox': '[' + ' '.join(map(str, b[4:])) + ']',
+                 'license_plate_bbox_score': '0.5', 'license_number': 'AB12CDE', 'license_number_score': '0.9'}
+                for f, c, b in zip(self.frame_numbers, self.car_ids, self.boxes)]
+
+        typed, text = interpolate_columns(columns), interpolate_rows(rows)
+        self.assertEqual(typed['frame_nmr'].tolist(), [int(row['frame_nmr']) for row in text])
+        self.assertEqual(typed['car_id'].tolist(), [int(row['car_id']) for row in text])
+        np.testing.assert_allclose(np.column_stack([typed[name] for name in CAR_BBOX]),
+                                   [list(map(float, row['car_bbox'].split())) for row in text])
+        self.assertEqual(typed['license_number'].tolist(), [row['license_number'] for row in text])
+        self.assertEqual((typed['license_number'] == 'AB12CDE').sum(), n)
+
+
+class VisualizeTests(DetectorTestCase):
+
+    def test_single_pass_render(self):
+        detector = self.detector()
+        csv_path = os.path.join(self.tmp, 'visualize.csv')
+        detector.process_video(self.video, csv_path)
+        results = load_results_dataframe(csv_path)
+
+        crops = {}
+        crop_license_plate = detector.crop_license_plate
+        def record_crop(frame, license_plate_bbox):
+            crops.setdefault(encoded_frame_nmr(frame), []).append(list(license_plate_bbox))
+            return crop_license_plate(frame, license_plate_bbox)
+
+        with mock.patch.object(detector, 'crop_license_plate', side_effect=record_crop), \
+                mock.patch.object(detector, 'draw_detection') as draw_detection, \
+                mock.patch('cv2.VideoCapture.set') as seek:
+            output = detector.visualize(self.video, csv_path, os.path.join(self.tmp, 'visualize.mp4'))
+
+        seek.assert_not_called()
+        self.assertEqual(count_frames(output), self.n_frames)
+        self.assertEqual(draw_detection.call_count, len(results))
+        # one crop per car, from the frame of its first best read
+        best = results.loc[results.groupby('car_id')['license_number_score'].idxmax()]
+        expected = {}
+        for _, row in best.iterrows():
+            expected.setdefault(row['frame_nmr'], []).append(row[PLATE_BBOX].tolist())
+        self.assertEqual(crops, expected)
+
+
+def sorted_rows(columns):
+    """ Result columns as rows sorted by (frame, car), boxes rounded past the CSV float formatting """
+    rows = []
+    for i in range(len(columns['frame_nmr'])):
+        rows.append((int(columns['frame_nmr'][i]), int(columns['car_id'][i]),
+                     tuple(round(float(columns[name][i]), 6) for name in CAR_BBOX + PLATE_BBOX),
+                     float(columns['license_plate_bbox_score'][i]), str(columns['license_number'][i]),
+                     float(columns['license_number_score'][i])))
+    return sorted(rows)
+
+
+class FusedModeTests(DetectorTestCase):
+
+    # frames whose reads are dropped: a short and a long gap in every track seen there
+    SHORT_GAP = range(10, 12)
+    LONG_GAP = range(20, 26)
+
+    def detector(self, **options):
+        """ Detector that still tracks but reports nothing for the gap frames """
+        detector = super().detector(**options)
+        process_frame = detector.process_frame
+        def with_gaps(stream, frame, *args, frame_nmr=None, **kwargs):
+            frame_results = process_frame(stream, frame, *args, frame_nmr=frame_nmr, **kwargs)
+            return {} if frame_nmr in self.SHORT_GAP or frame_nmr in self.LONG_GAP else frame_results
+        detector.process_frame = with_gaps
+        return detector
+
+    def interpolated(self):
+        path = os.path.join(self.tmp, 'fused_expected.csv')
+        self.detector().process_video(self.video, path)
+        return sorted_rows(self.detector().interpolate_bounding_boxes(load_results(path)))
+
+    def render(self, lookback):
+        csv_path = os.path.join(self.tmp, 'fused.csv')
+        output = self.detector().process_and_render(self.video, csv_path, os.path.join(self.tmp, 'fused.mp4'),
+                                                     lookback=lookback)
+        return sorted_rows(load_results(csv_path)), output
+
+    def test_matches_interpolated_results(self):
+        expected = self.interpolated()
+        self.assertTrue(any(row[0] in self.LONG_GAP for row in expected))
+        rows, output = self.render(lookback=len(self.LONG_GAP))
+        self.assertEqual(rows, expected)
+        self.assertEqual(count_frames(output), self.n_frames)
+
+    def test_longer_gaps_stay_empty(self):
+        expected = [row for row in self.interpolated() if row[0] not in self.LONG_GAP]
+        self.assertTrue(any(row[0] in self.SHORT_GAP for row in expected))
+        rows, output = self.render(lookback=len(self.LONG_GAP) - 1)
+        self.assertEqual(rows, expected)
+        self.assertEqual(count_frames(output), self.n_frames)
+
+
+class BackendsTests(SimpleTestCase):
+    """ Backend helpers that run without ultralytics """
+
+    def test_backend_options(self):
+        self.assertEqual(backend_options(None), {})
+        self.assertEqual(backend_options('onnx'), {'backend': 'onnx'})
+        config = {'backend': 'openvino', 'int8': True, 'calibration': 'media/calibration'}
+        options = backend_options(config)
+        self.assertEqual(options, config)
+        self.assertIsNot(options, config)
+        self.assertEqual(backend_options({'int8': True}), {'int8': True})
+        with self.assertRaises(ValueError):
+            backend_options('tensorrt')
+        with self.assertRaises(ValueError):
+            backend_options({'backend': 'tflite'})
+
+    def test_exported_path(self):
+        self.assertEqual(exported_path('models/yolov8n.pt', 'onnx'), 'models/yolov8n_640.onnx')
+        self.assertEqual(exported_path('models/yolov8n.pt', 'onnx', int8=True, imgsz=320), 'models/yolov8n_320_int8.onnx')
+        self.assertEqual(exported_path('models/yolov8n.pt', 'openvino'), 'models/yolov8n_640_openvino_model')
+        self.assertEqual(exported_path('models/yolov8n.pt', 'openvino', int8=True),
+                         'models/yolov8n_640_int8_openvino_model')
+
+    def test_letterbox(self):
+        frame = np.zeros((480, 640, 3), np.uint8)
+        frame[:, :, 0] = 255  # blue
+        image = letterbox(frame, imgsz=64)
+        self.assertEqual(image.shape, (1, 3, 64, 64))
+        self.assertEqual(image.dtype, np.float32)
+        # scaled to 64x48, centered with 8 grey rows above and below, channels in RGB order
+        np.testing.assert_allclose(image[0, :, 8:56], np.stack([np.zeros((48, 64)), np.zeros((48, 64)), np.ones((48, 64))]))
+        np.testing.assert_allclose(image[0, :, :8], 114 / 255., rtol=1e-6)
+        np.testing.assert_allclose(image[0, :, 56:], 114 / 255., rtol=1e-6)
+
+    def test_calibration_frames(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        for name in ('a.png', 'b.jpg'):
+            cv2.imwrite(os.path.join(tmp, name), np.full((480, 640, 3), 200, np.uint8))
+        write_video(os.path.join(tmp, 'c.avi'), 60)
+        with open(os.path.join(tmp, 'notes.txt'), 'w') as f:
+            f.write('not a frame')
+
+        frames = calibration_frames(tmp, limit=12, imgsz=64)
+        self.assertEqual(len(frames), 12)
+        self.assertTrue(all(frame.shape == (1, 3, 64, 64) for frame in frames))
+        # both images, then 10 frames spread evenly over the video
+        frame_numbers = [int(round(frame[0, 2, 32, 32] * 255)) for frame in frames]
+        self.assertEqual(frame_numbers, [200, 200] + list(range(0, 60, 6)))
+
+        self.assertEqual(len(calibration_frames([os.path.join(tmp, 'a.png')], imgsz=64)), 1)
+        with self.assertRaises(ValueError):
+            calibration_frames(os.path.join(tmp, 'notes.txt'))
+        self.assertNotIn('ultralytics', sys.modules)
+
+
+class PreloadTests(SimpleTestCase):
+
+    def test_preloads_weights_without_building_a_detector(self):
+        from . import services
+
+        with mock.patch.object(services.registry, 'get_yolo') as get_yolo, \
+                mock.patch.object(services.registry, 'get_ocr_reader') as get_ocr_reader, \
+                mock.patch.object(services.registry, 'memory_report', return_value=[]), \
+                mock.patch.object(services.registry, 'gc') as gc, \
+                mock.patch('alpr.core.algorithm.LicensePlateDetector') as detector, \
+                self.settings(ALPR_DETECTOR_OPTIONS={'ocr_processes': 2, 'plate_backend': 'onnx'}):
+            services.preload_models()
+
+        self.assertEqual(get_yolo.call_args_list, [mock.call('yolov8n.pt'),
+                                                   mock.call('license_plate_detector.pt', backend='onnx')])
+        get_ocr_reader.assert_called_once_with()
+        detector.assert_not_called()
+        gc.freeze.assert_called_once_with()
+
+
+class PlateOCRCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.crop = rng.integers(0, 256, size=(40, 120), dtype=np.uint8)
+        self.cache = PlateOCRCache()
+
+    def test_near_duplicate_crop_hits(self):
+        crop_hash = self.cache.fingerprint(self.crop)
+        self.assertIsNone(self.cache.get(1, crop_hash))
+        self.cache.put(1, crop_hash, 'AB12CDE', 0.9)
+
+        noisy = np.clip(self.crop.astype(int) + np.random.default_rng(1).integers(-2, 3, self.crop.shape), 0, 255)
+        noisy_hash = self.cache.fingerprint(noisy.astype(np.uint8))
+        self.assertLessEqual(bin(crop_hash ^ noisy_hash).count('1'), self.cache.max_distance)
+        self.assertEqual(self.cache.get(1, noisy_hash), ('AB12CDE', 0.9))
+        # readings are per track
+        self.assertIsNone(self.cache.get(2, crop_hash))
+        self.assertEqual(self.cache.metrics(), {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3, 'tracks': 1})
+
+    def test_different_crop_misses(self):
+        self.cache.put(1, self.cache.fingerprint(self.crop), 'AB12CDE', 0.9)
+        self.assertIsNone(self.cache.get(1, self.cache.fingerprint(self.crop[:, ::-1])))
+
+    def test_keeps_the_most_recent_hashes_of_a_track(self):
+        cache = PlateOCRCache(max_distance=0, per_track=2)
+        for crop_hash in (1, 2, 3):
+            cache.put(1, crop_hash, str(crop_hash), 0.5)
+        self.assertIsNone(cache.get(1, 1))
+        self.assertEqual(cache.get(1, 2), ('2', 0.5))
+        # 2 was just used, so 3 is evicted next
+        cache.put(1, 4, '4', 0.5)
+        self.assertEqual(list(cache.tracks[1]), [2, 4])
+
+    def test_evicts_the_least_recently_seen_track(self):
+        cache = PlateOCRCache(max_distance=0, max_tracks=2)
+        cache.put(1, 1, 'A', 0.5)
+        cache.put(2, 2, 'B', 0.5)
+        cache.get(1, 1)
+        cache.put(3, 3, 'C', 0.5)
+        self.assertEqual(list(cache.tracks), [1, 3])
+
+        cache.clear()
+        self.assertEqual(cache.metrics(), {'hits': 0, 'misses': 0, 'hit_rate': 0., 'tracks': 0})
+
+
+class OCRCacheDetectionTests(DetectorTestCase):
+
+    def test_cached_readings_skip_ocr(self):
+        expected = self.run_video(self.detector())
+        ocr_calls = self.read_license_plate.call_count
+        self.read_license_plate.reset_mock()
+
+        with self.assertLogs('alpr.core.streams', 'INFO') as logs:
+            self.assertEqual(self.run_video(self.detector(ocr_cache={})), expected)
+        self.assertLess(self.read_license_plate.call_count, ocr_calls)
+
+        # the counters logged at the end of the video account for every plate read
+        self.assertEqual(len(logs.records), 1)
+        metrics = logs.records[0].args[1]
+        self.assertEqual(metrics['misses'], self.read_license_plate.call_count)
+        self.assertEqual(metrics['hits'] + metrics['misses'], ocr_calls)
+
+    def test_metrics_logged_per_stream(self):
+        jobs = [(f'cam{k}', self.video, os.path.join(self.tmp, f'cache{k}.csv')) for k in range(2)]
+        with self.assertLogs('alpr.core.streams', 'INFO') as logs:
+            process_streams(self.detector(ocr_cache={}), jobs)
+        self.assertEqual(sorted(record.args[0] for record in logs.records), ['cam0', 'cam1'])
+        self.assertTrue(all(record.args[1]['hits'] > 0 for record in logs.records))
+
+    def test_nothing_logged_without_cache(self):
+        with mock.patch('alpr.core.streams.logger') as logger:
+            self.run_video(self.detector())
+        logger.info.assert_not_called()
+
+
+def traffic(n_frames=120, n_cars=40, seed=0):
+    """ Noisy detections of cars crossing the frame, some missed, as Sort.update takes them """
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, n_frames, n_cars)
+    positions = rng.uniform([0, 0], [1800, 1000], size=(n_cars, 2))
+    velocities = rng.uniform(-8, 8, size=(n_cars, 2))
+    sizes = rng.uniform([60, 40], [200, 150], size=(n_cars, 2))
+    frames = []
+    for frame_nmr in range(n_frames):
+        age = frame_nmr - starts
+        live = (age >= 0) & (age < 60) & (rng.random(n_cars) > 0.1)
+        corner = positions[live] + velocities[live] * age[live, None] + rng.normal(0, 1.5, size=(live.sum(), 2))
+        frames.append(np.column_stack([corner, corner + sizes[live], rng.uniform(0.5, 1, live.sum())]))
+    return frames
+
+
+class SortEquivalenceTests(SimpleTestCase):
+
+    def assertSameTracks(self, reference, candidate, frames):
+        for dets in frames:
+            np.testing.assert_allclose(candidate.update(dets), reference.update(dets), atol=1e-6)
+
+    def assertSameTracksUpToIds(self, reference, candidate, frames):
+        """ The same boxes every frame, under ids that map one to one for the whole run """
+        ids = {}
+        for dets in frames:
+            expected, tracks = reference.update(dets), candidate.update(dets)
+            expected, tracks = expected[np.lexsort(expected[:, :4].T)], tracks[np.lexsort(tracks[:, :4].T)]
+            np.testing.assert_allclose(tracks[:, :4], expected[:, :4], atol=1e-6)
+            for track_id, expected_id in zip(tracks[:, 4], expected[:, 4]):
+                self.assertEqual(ids.setdefault(track_id, expected_id), expected_id)
+        self.assertEqual(len(set(ids.values())), len(ids))
+
+    def test_bank_sort_matches_sort(self):
+        self.assertSameTracks(Sort(), BankSort(), traffic())
+        self.assertSameTracks(Sort(max_age=5, min_hits=2), BankSort(max_age=5, min_hits=2), traffic(seed=1))
+
+    def test_gated_association_gives_the_same_tracks(self):
+        # the gated association lists unmatched detections by index, so new tracks may be numbered
+        # in another order
+        self.assertSameTracksUpToIds(Sort(), Sort(association='gated'), traffic(seed=2))
+        self.assertSameTracksUpToIds(Sort(max_age=5), BankSort(max_age=5, association='gated'), traffic(seed=3))
+
+
+class AssociationTests(SimpleTestCase):
+
+    def assertSameAssociation(self, detections, trackers, **options):
+        matches, unmatched_dets, unmatched_trks = associate_gated(detections, trackers, **options)
+        expected = associate_detections_to_trackers(detections, trackers)
+        self.assertEqual(sorted(map(tuple, matches.tolist())), sorted(map(tuple, expected[0].tolist())))
+        self.assertEqual(unmatched_dets.tolist(), sorted(expected[1].tolist()))
+        self.assertEqual(sorted(unmatched_trks.tolist()), sorted(expected[2].tolist()))
+
+    def test_matches_dense_association(self):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            trackers = rng.uniform(0, 1000, size=(rng.integers(1, 60), 2))
+            trackers = np.column_stack([trackers, trackers + rng.uniform(20, 120, size=trackers.shape)])
+            # detections near some of the tracks, plus new ones
+            near = trackers[rng.random(len(trackers)) < 0.8] + rng.normal(0, 15, size=(1, 4))
+            new = rng.uniform(0, 1000, size=(rng.integers(0, 10), 2))
+            new = np.column_stack([new, new + rng.uniform(20, 120, size=new.shape)])
+            detections = np.concatenate([near + rng.normal(0, 10, size=near.shape), new])
+            detections = np.column_stack([detections, np.ones(len(detections))])
+
+            self.assertSameAssociation(detections, trackers)
+            self.assertSameAssociation(detections, trackers, cell_size=50.)
+
+    def test_crowded_overlapping_boxes(self):
+        # a queue of cars: every detection overlaps several tracks, so the solver has to run
+        trackers = np.array([[x, 100., x + 100., 200.] for x in range(0, 600, 40)])
+        detections = np.column_stack([trackers[::-1] + [[5, 3, 5, 3]], np.ones(len(trackers))])
+        self.assertSameAssociation(detections, trackers)
+
+    def test_unbounded_boxes_fall_back_to_all_pairs(self):
+        trackers = np.array([[x, 100., x + 100., 200.] for x in range(0, 600, 150)])
+        detections = np.column_stack([trackers + 5, np.ones(len(trackers))])
+        for box in ([0., 0., 1e7, 1e7],  # millions of grid cells
+                    [1e15, 1e15, 1e15 + 100, 1e15 + 100]):  # cell index past the key range
+            with mock.patch('alpr.sort.association._cells') as cells:
+                det, trk = candidate_pairs(np.vstack([detections, box + [1.]]), trackers)
+            cells.assert_not_called()
+            self.assertEqual(len(det), (len(detections) + 1) * len(trackers))
+            self.assertSameAssociation(np.vstack([detections, box + [1.]]), np.vstack([trackers, box]))
+
+    def test_non_finite_boxes_stay_unmatched(self):
+        trackers = np.array([[x, 100., x + 100., 200.] for x in range(0, 600, 150)])
+        detections = np.column_stack([trackers + 5, np.ones(len(trackers))])
+        expected = associate_detections_to_trackers(detections, trackers)
+        for box in ([np.nan, 100., 200., 200.], [0., 100., np.inf, 200.]):
+            matches, unmatched_dets, unmatched_trks = associate_gated(np.vstack([detections, box + [1.]]), trackers)
+            self.assertEqual(matches.tolist(), expected[0].tolist())
+            self.assertEqual(unmatched_dets.tolist(), [len(detections)])
+            self.assertEqual(unmatched_trks.tolist(), [])
+
+    def test_inverted_box(self):
+        trackers = np.array([[0., 0., 100., 100.], [200., 0., 300., 100.]])
+        detections = np.array([[100., 100., 0., 0., 1.], [205., 5., 305., 105., 1.]])
+        matches, unmatched_dets, _ = associate_gated(detections, trackers, cell_size=10.)
+        self.assertEqual((matches.tolist(), unmatched_dets.tolist()), ([[1, 1]], [0]))
+
+    def test_empty(self):
+        matches, unmatched_dets, unmatched_trks = associate_gated(np.empty((0, 5)), np.ones((3, 4)))
+        self.assertEqual((len(matches), unmatched_dets.tolist(), unmatched_trks.tolist()), (0, [], [0, 1, 2]))
+        matches, unmatched_dets, unmatched_trks = associate_gated(np.ones((2, 5)), np.empty((0, 4)))
+        self.assertEqual((len(matches), unmatched_dets.tolist(), unmatched_trks.tolist()), (0, [0, 1], []))
+
+
+class AssignPlatesTests(SimpleTestCase):
+    # a car, a larger car around it (e.g. a truck behind), and a car to the right
+    CARS = [[100, 100, 300, 250, 1], [50, 50, 400, 300, 2], [350, 100, 600, 250, 3]]
+
+    def assign(self, plates, **options):
+        return assign_plates_to_cars([plate + [0.9, 0] for plate in plates], self.CARS, **options)[:, 4].tolist()
+
+    def test_strict_rule_matches_get_car_for_single_candidates(self):
+        plates = [[360, 200, 420, 230], [700, 200, 760, 230], [400, 230, 460, 270]]
+        self.assertEqual(self.assign(plates), [3, -1, -1])
+        self.assertEqual(self.assign(plates), [get_car(plate + [0.9, 0], self.CARS)[4] for plate in plates])
+
+    def test_plate_inside_several_cars_goes_to_the_smallest(self):
+        self.assertEqual(self.assign([[150, 200, 210, 230]]), [1])
+        self.assertEqual(self.assign([[150, 200, 210, 230]], min_containment=0.5), [1])
+
+    def test_best_containment_wins_over_car_size(self):
+        # 2/3 of the plate lies in car 3, all of it in car 2, which is larger
+        self.assertEqual(self.assign([[330, 200, 390, 230]], min_containment=0.5), [2])
+        # half in car 1, all in car 2
+        self.assertEqual(self.assign([[270, 200, 330, 230]], min_containment=0.4), [2])
+
+    def test_partial_containment(self):
+        plate = [[560, 200, 620, 230]]  # a third of it sticks out of car 3
+        self.assertEqual(self.assign(plate), [-1])
+        self.assertEqual(self.assign(plate, min_containment=0.6), [3])
+        self.assertEqual(self.assign(plate, min_containment=0.7), [-1])
+
+    def test_empty(self):
+        self.assertEqual(assign_plates_to_cars([], self.CARS).shape, (0, 5))
+        self.assertEqual(assign_plates_to_cars([[1, 1, 2, 2, 0.9, 0]], []).tolist(), [[-1] * 5])
+
+
+class ProcessStreamsTests(DetectorTestCase):
+
+    def test_streams_match_separate_runs(self):
+        self.run_video(self.detector(), 'single.csv')
+        expected = load_results(os.path.join(self.tmp, 'single.csv'))
+        paths = [os.path.join(self.tmp, f'cam{k}.csv') for k in range(3)]
+        next_frames = process_streams(self.detector(), [(k, self.video, path) for k, path in enumerate(paths)],
+                                      batch_size=4)
+
+        self.assertEqual(next_frames, {0: self.n_frames, 1: self.n_frames, 2: self.n_frames})
+        for path in paths:
+            columns = load_results(path)
+            for name in ('frame_nmr', 'car_id', 'license_number'):
+                self.assertEqual(columns[name].tolist(), expected[name].tolist())
+
+    def test_rejects_duplicate_stream_ids(self):
+        jobs = [('cam1', self.video, os.path.join(self.tmp, 'a.csv')),
+                ('cam1', self.video, os.path.join(self.tmp, 'b.csv'))]
+        with self.assertRaisesMessage(ValueError, "['cam1']"):
+            process_streams(self.detector(), jobs)
+
+
+class StreamIsolationTests(DetectorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cap = cv2.VideoCapture(self.video)
+        frames = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append((len(frames), frame))
+        cap.release()
+        # the second camera sees the traffic backwards
+        self.feeds = {'cam1': frames, 'cam2': frames[::-1]}
+
+    def track(self, detector, stream, frame_nmr, frame):
+        (_, _, vehicle_detections, license_plates), = detector.detect_batches([[(frame_nmr, frame, True)]])
+        return detector.process_frame(stream, frame, vehicle_detections, license_plates, frame_nmr=frame_nmr)
+
+    def run_alone(self, tracker, frames):
+        detector = self.detector(tracker=tracker)
+        with detector.streams.open() as stream:
+            return [self.track(detector, stream, frame_nmr, frame) for frame_nmr, frame in frames]
+
+    def test_interleaved_streams_keep_their_own_tracks(self):
+        for tracker in TRACKERS:
+            with self.subTest(tracker=tracker):
+                expected = {stream_id: self.run_alone(tracker, frames) for stream_id, frames in self.feeds.items()}
+                self.assertTrue(all(any(frame_results) for frame_results in expected.values()))
+                detector = self.detector(tracker=tracker)
+                results = {stream_id: [] for stream_id in self.feeds}
+                with detector.streams.open('cam1') as cam1, detector.streams.open('cam2') as cam2:
+                    streams = {'cam1': cam1, 'cam2': cam2}
+                    for frame1, frame2 in zip(self.feeds['cam1'], self.feeds['cam2']):
+                        for stream_id, (frame_nmr, frame) in (('cam1', frame1), ('cam2', frame2)):
+                            results[stream_id].append(self.track(detector, streams[stream_id], frame_nmr, frame))
+                    self.assertIsNot(cam1.tracker, cam2.tracker)
+
+                # same results and the same car ids, counted from scratch on each camera
+                self.assertEqual(results, expected)
+                self.assertEqual(detector.track_counts(), {'cam1': cam1.track_count(), 'cam2': cam2.track_count()})
+
+    def test_concurrent_open_does_not_share_sort_state(self):
+        expected = {stream_id: self.run_alone('sort', frames) for stream_id, frames in self.feeds.items()}
+        detector = self.detector()
+        opened = threading.Barrier(len(self.feeds) + 1)
+        results, trackers, errors = {}, {}, []
+
+        def run(stream_id, named):
+            try:
+                with detector.streams.open(stream_id if named else None) as stream:
+                    # every stream is open at once before any frame is tracked
+                    opened.wait(timeout=10)
+                    trackers[stream_id] = stream.tracker
+                    results[stream_id] = [self.track(detector, stream, frame_nmr, frame)
+                                          for frame_nmr, frame in self.feeds[stream_id]]
+            except Exception as e:
+                errors.append(e)
+                opened.abort()
+
+        for named in (True, False):
+            results.clear()
+            threads = [threading.Thread(target=run, args=(stream_id, named)) for stream_id in self.feeds]
+            for thread in threads:
+                thread.start()
+            opened.wait(timeout=10)
+            for thread in threads:
+                thread.join()
+            opened.reset()
+
+            self.assertEqual(errors, [])
+            self.assertIsNot(trackers['cam1'], trackers['cam2'])
+            self.assertEqual(results, expected)
+        # the unnamed streams were dropped when their jobs ended
+        self.assertEqual(sorted(detector.track_counts()), ['cam1', 'cam2'])
+
+
+class JobQueueTests(TestCase):
+
+    def test_claims_by_priority_then_age(self):
+        scan = jobs.enqueue('camera_scan', priority=jobs.PRIORITY_CAMERA_SCAN)
+        first = jobs.enqueue('process_video', {'video_instance_id': 1}, priority=jobs.PRIORITY_UPLOAD)
+        second = jobs.enqueue('process_video', {'video_instance_id': 2}, priority=jobs.PRIORITY_UPLOAD)
+        self.assertEqual([jobs.claim('w').pk for _ in range(3)], [first.pk, second.pk, scan.pk])
+        self.assertIsNone(jobs.claim('w'))
+
+    def test_kind_limit(self):
+        jobs.enqueue('camera_scan')
+        jobs.enqueue('camera_scan')
+        self.assertIsNotNone(jobs.claim('w1'))
+        self.assertIsNone(jobs.claim('w2'))
+
+    def test_expired_lease_is_claimed_again(self):
+        job = jobs.enqueue('process_video')
+        claimed = jobs.claim('w1')
+        self.assertIsNone(jobs.claim('w2'))
+        self.assertTrue(jobs.heartbeat(claimed))
+
+        ProcessingJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        retried = jobs.claim('w2')
+        self.assertEqual((retried.pk, retried.worker, retried.attempts), (job.pk, 'w2', 2))
+        # the first worker has lost it
+        self.assertFalse(jobs.heartbeat(claimed))
+
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        job = jobs.enqueue('process_video', max_attempts=1)
+        jobs.claim('w1')
+        ProcessingJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(jobs.claim('w2'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.FAILED)
+        self.assertIn('w1 stopped responding', job.last_error)
+
+    def test_fail_backs_off_then_gives_up(self):
+        job = jobs.enqueue('process_video', max_attempts=3)
+        for attempt in (1, 2):
+            claimed = jobs.claim('w')
+            before = timezone.now()
+            jobs.fail(claimed, 'boom')
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), (ProcessingJob.QUEUED, attempt, 'boom'))
+            backoff = timedelta(seconds=jobs.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            self.assertGreaterEqual(job.run_after, before + backoff)
+            # not due before the backoff
+            self.assertIsNone(jobs.claim('w'))
+            ProcessingJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+        jobs.fail(jobs.claim('w'), 'boom')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ProcessingJob.FAILED, 3))
+        self.assertIsNone(jobs.claim('w'))
+
+
+LEASE = 0.5
+
+
+def run_children(children):
+    jobs.run_group(ProcessingJob.objects.filter(pk__in=children), poll_seconds=LEASE / 6, lease_seconds=LEASE)
+
+
+def steal_parent(parent):
+    """ A sub-job that outlives several leases, then checks that nobody could take its parent """
+    time.sleep(3 * LEASE)
+    if jobs.claim('thief', where=Q(pk=parent)) is not None:
+        raise AssertionError("the parent job lost its lease")
+
+
+class RunGroupLeaseTests(TransactionTestCase):
+    """ The job waiting in run_group keeps its lease while it polls and while it runs sub-jobs itself """
+
+    def setUp(self):
+        patch = mock.patch.dict(jobs.HANDLERS, {'process_video': 'alpr.tests.run_children',
+                                                'video_chunk': 'alpr.tests.steal_parent'})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def run_parent(self, children):
+        parent = jobs.enqueue('process_video', priority=jobs.PRIORITY_UPLOAD)
+        ProcessingJob.objects.filter(pk__in=[child.pk for child in children]).update(payload={'parent': parent.pk})
+        ProcessingJob.objects.filter(pk=parent.pk).update(payload={'children': [child.pk for child in children]})
+        return jobs.run_job(jobs.claim('parent', where=Q(pk=parent.pk), lease_seconds=LEASE), LEASE)
+
+    def test_lease_kept_while_running_sub_jobs_inline(self):
+        children = [jobs.enqueue('video_chunk', max_attempts=1) for _ in range(2)]
+        self.assertTrue(self.run_parent(children))
+        self.assertEqual(set(ProcessingJob.objects.values_list('status', flat=True)), {ProcessingJob.DONE})
+
+    def test_lease_kept_while_polling(self):
+        child = jobs.enqueue('video_chunk')
+        # another worker has the sub-job and finishes it after several of the parent's leases
+        other = jobs.claim('other', lease_seconds=60)
+        stolen = []
+
+        def finish():
+            time.sleep(3 * LEASE)
+            stolen.append(jobs.claim('thief', where=~Q(pk=child.pk)))
+            jobs.complete(other)
+            connection.close()
+
+        worker = threading.Thread(target=finish)
+        worker.start()
+        self.assertTrue(self.run_parent([child]))
+        worker.join()
+        self.assertEqual(stolen, [None])
+        child.refresh_from_db()
+        self.assertEqual((child.status, child.worker), (ProcessingJob.DONE, 'other'))
+
+
+class ClaimRaceTests(TransactionTestCase):
+
+    def test_racing_claimers_respect_the_kind_limit(self):
+        scans = [jobs.enqueue('camera_scan') for _ in range(2)]
+        # both claimers pass the early limit check before either of them updates its job
+        checked = threading.Barrier(2)
+        claimable = jobs.claimable
+        calls = threading.local()
+
+        def claimable_in_step(now=None):
+            calls.n = getattr(calls, 'n', 0) + 1
+            if calls.n == 2:
+                checked.wait(timeout=10)
+            return claimable(now)
+
+        claimed = {}
+
+        def race(scan):
+            try:
+                claimed[scan.pk] = jobs.claim(f'w{scan.pk}', where=Q(pk=scan.pk))
+            finally:
+                connection.close()
+
+        with mock.patch.object(jobs, 'claimable', side_effect=claimable_in_step), \
+                self.settings(ALPR_JOB_LIMITS={'camera_scan': 1}):
+            threads = [threading.Thread(target=race, args=(scan,)) for scan in scans]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(sum(job is not None for job in claimed.values()), 1)
+        self.assertEqual(ProcessingJob.objects.filter(status=ProcessingJob.RUNNING).count(), 1)
+
+
+SIDE_EFFECTS = []
+
+
+def lose_lease(job):
+    """ A handler whose job is taken over by another worker before its side effect """
+    ProcessingJob.objects.filter(pk=job).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    jobs.claim('thief', where=Q(pk=job))
+    # the heartbeat notices within a third of the lease
+    time.sleep(LEASE)
+    jobs.check_lease()
+    SIDE_EFFECTS.append(job)
+
+
+class LostLeaseTests(TransactionTestCase):
+
+    def setUp(self):
+        patch = mock.patch.dict(jobs.HANDLERS, {'process_video': 'alpr.tests.lose_lease'})
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(SIDE_EFFECTS.clear)
+
+    def test_handler_stops_and_outcome_is_not_recorded(self):
+        job = jobs.enqueue('process_video')
+        ProcessingJob.objects.filter(pk=job.pk).update(payload={'job': job.pk})
+        self.assertFalse(jobs.run_job(jobs.claim('w1', lease_seconds=LEASE), LEASE))
+
+        self.assertEqual(SIDE_EFFECTS, [])
+        job.refresh_from_db()
+        # neither failed nor requeued: the job is the thief's now
+        self.assertEqual((job.status, job.worker, job.attempts, job.last_error), (ProcessingJob.RUNNING, 'thief', 2, ''))
+
+    def test_check_lease_outside_a_job(self):
+        jobs.check_lease()
+
+
+class PlanChunksTests(SimpleTestCase):
+
+    def test_short_video_is_one_chunk(self):
+        self.assertEqual(plan_chunks(50, 60, overlap=10), [(0, 0, None)])
+        self.assertEqual(plan_chunks(0, 60), [(0, 0, None)])
+
+    def test_chunks_overlap_the_previous_one(self):
+        self.assertEqual(plan_chunks(100, 30, overlap=5), [(0, 0, 30), (25, 30, 60), (55, 60, 90), (85, 90, None)])
+        self.assertEqual(plan_chunks(90, 30), [(0, 0, 30), (30, 30, 60), (60, 60, None)])
+
+    def test_chunks_are_longer_than_the_overlap(self):
+        self.assertEqual(plan_chunks(30, 5, overlap=10), [(0, 0, 11), (1, 11, 22), (12, 22, None)])
+
+
+def car_rows(car_id, frames, y, text='AB12CDE'):
+    """ Results of a car moving right 2 px per frame """
+    return [(frame_nmr, {car_id: frame_result([2. * frame_nmr, y, 2. * frame_nmr + 150., y + 120.],
+                                              [2. * frame_nmr + 40., y + 60., 2. * frame_nmr + 100., y + 90.], text)})
+            for frame_nmr in frames]
+
+
+def merge_frames(*tracks):
+    frames = {}
+    for track in tracks:
+        for frame_nmr, frame_results in track:
+            frames.setdefault(frame_nmr, {}).update(frame_results)
+    return sorted(frames.items())
+
+
+class StitchChunksTests(ResultWriterTestCase):
+
+    def test_tracks_continue_across_chunks(self):
+        chunks = [(0, 0, 60), (50, 60, None)]
+        first = self.write('results.chunk0.npz', merge_frames(car_rows(7, range(0, 60), 0.),
+                                                              car_rows(8, range(20, 60, 2), 300.)))
+        # the second chunk numbers its tracks on its own and sees a new car
+        second = self.write('results.chunk1.npz', merge_frames(car_rows(1, range(50, 80), 300.),
+                                                               car_rows(2, range(50, 100), 0.),
+                                                               car_rows(3, range(70, 100), 150., 'XY34ZZZ')))
+        output = os.path.join(self.tmp, 'results.csv')
+        stitch_chunks([first, second], chunks, output)
+
+        columns = load_results(output)
+        tracks = {}
+        for frame_nmr, car_id, y in zip(columns['frame_nmr'].tolist(), columns['car_id'].tolist(),
+                                        columns['car_y1'].tolist()):
+            tracks.setdefault(car_id, set()).add((frame_nmr, y))
+        self.assertEqual(sorted(tracks), [1, 2, 3])
+        self.assertEqual(tracks[1], {(frame_nmr, 0.) for frame_nmr in range(100)})
+        self.assertEqual(tracks[2], {(frame_nmr, 300.) for frame_nmr in list(range(20, 60, 2)) + list(range(60, 80))})
+        self.assertEqual(tracks[3], {(frame_nmr, 150.) for frame_nmr in range(70, 100)})
+        # the shared frames come from the first chunk only
+        self.assertEqual(len(columns['frame_nmr']), 100 + 20 + 20 + 30)
+
+
+class ChunkedVideoTests(DetectorTestCase):
+
+    def test_matches_a_single_run(self):
+        self.run_video(self.detector(), 'single.csv')
+        expected = load_results(os.path.join(self.tmp, 'single.csv'))
+
+        def run_chunks(tasks):
+            for video_path, output_path, start_frame, end_frame in tasks:
+                self.detector().process_video(video_path, output_path, start_frame=start_frame, end_frame=end_frame)
+
+        output = os.path.join(self.tmp, 'chunked.csv')
+        process_video_chunked({}, self.video, output, chunk_frames=20, overlap=5, run_chunks=run_chunks)
+        columns = load_results(output)
+        for name in ('frame_nmr', 'car_id', 'license_number'):
+            self.assertEqual(columns[name].tolist(), expected[name].tolist())
+        self.assertEqual(sorted(os.listdir(self.tmp)), sorted(['chunked.csv', 'single.csv', 'video.avi']))
+
+
+class CheckpointTests(DetectorTestCase):
+
+    def test_interrupted_run_resumes(self):
+        expected = self.run_video(self.detector(), 'single.csv')
+        checkpoint = Checkpointer(os.path.join(self.tmp, 'run.ckpt'), key='run', every=10)
+        output = os.path.join(self.tmp, 'resumed.npz')
+        detector = self.detector()
+        process_frame = detector.process_frame
+
+        def crash_at_35(stream, frame, *args, frame_nmr=None):
+            if frame_nmr == 35:
+                raise RuntimeError
+            return process_frame(stream, frame, *args, frame_nmr=frame_nmr)
+
+        # the run dies at frame 35, after its checkpoint at frame 30
+        with self.assertRaises(RuntimeError), mock.patch.object(detector, 'process_frame', side_effect=crash_at_35):
+            detector.process_video(self.video, output, checkpoint=checkpoint)
+
+        resumed = self.detector().process_video(self.video, output, keep_results=True,
+                                                checkpoint=Checkpointer(checkpoint.path, key='run', every=10))
+        self.assertEqual(min(resumed), 30)
+        self.assertEqual(resumed, {frame_nmr: expected[frame_nmr] for frame_nmr in resumed})
+        columns, single = load_results(output), load_results(os.path.join(self.tmp, 'single.csv'))
+        for name in ('frame_nmr', 'car_id', 'license_number'):
+            self.assertEqual(columns[name].tolist(), single[name].tolist())
+
+    def test_ignores_checkpoints_of_another_run(self):
+        path = os.path.join(self.tmp, 'other.ckpt')
+        self.detector().process_video(self.video, os.path.join(self.tmp, 'other.csv'), end_frame=20,
+                                      checkpoint=Checkpointer(path, key='a', every=10))
+        self.assertIsNone(Checkpointer(path, key='b').load())
+        self.assertEqual(Checkpointer(path, key='a').load()['next_frame'], 20)
+
+    def test_unreadable_checkpoint_is_logged_and_ignored(self):
+        path = os.path.join(self.tmp, 'broken.ckpt')
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+        with self.assertLogs('alpr.core.checkpoint', 'WARNING'):
+            self.assertIsNone(Checkpointer(path).load())
+
+    def test_pipeline_mode_warns_that_it_saves_no_checkpoints(self):
+        checkpoint = Checkpointer(os.path.join(self.tmp, 'pipeline.ckpt'), every=10)
+        with self.assertLogs('alpr.core.algorithm', 'WARNING'):
+            self.detector(pipeline=True).process_video(self.video, os.path.join(self.tmp, 'pipeline.csv'),
+                                                       checkpoint=checkpoint)
+        self.assertIsNone(checkpoint.load())
+
+
+class CascadeTests(DetectorTestCase):
+
+    def test_matches_full_frame_detection(self):
+        expected = self.run_video(self.detector())
+        for batch_size in (1, 4):
+            detector = self.detector(cascade=True, batch_size=batch_size)
+            self.assertEqual(self.run_video(detector), expected)
+            # one plate model call per frame with tracks, on one crop per track
+            self.assertLessEqual(max(detector.license_plate_detector.calls), len(CARS))
+
+    def test_plate_in_overlapping_crops_is_read_once(self):
+        plates = [[150., 200., 210., 230., 0.9, 0.], [312., 150., 318., 160., 0.8, 0.]]
+
+        def plate_detector(crops):
+            results = []
+            for crop in crops:
+                off_x, off_y = crop_offset(crop)
+                rows = [[x1 - off_x, y1 - off_y, x2 - off_x, y2 - off_y, score, class_id]
+                        for x1, y1, x2, y2, score, class_id in plates
+                        if x1 >= off_x and y1 >= off_y and x2 <= off_x + crop.shape[1] and y2 <= off_y + crop.shape[0]]
+                results.append(FakeResult(rows))
+            return results
+
+        detector = self.detector(cascade=True, cascade_padding=0.1)
+        detector.license_plate_detector = plate_detector
+        # car 1 lies inside car 2, and the padding of car 1 reaches into car 3
+        tracks = np.array([[100., 100., 300., 250., 1.], [50., 50., 400., 300., 2.], [310., 100., 500., 250., 3.]])
+        assignments = detector.detect_plates_in_tracks(np.zeros((480, 640, 3), np.uint8), tracks)
+        self.assertEqual([(plate, car[4]) for plate, car in assignments], [(plates[0], 1.), (plates[1], 3.)])
+
+
+# Stand-ins for easyocr and torch, importable by the spawned OCR workers: the text read from a
+# crop encodes its pixel value, the score the size of the batch it was recognized in.
+FAKE_OCR_MODULES = {
+    'torch.py': 'def set_num_threads(n):\n    pass\n',
+    'easyocr.py': """
+class Reader:
+    def __init__(self, languages, gpu=False):
+        pass
+
+    def read(self, image, batch):
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], 'AB%02dCDE' % image[0, 0], 0.5 + 0.01 * batch)]
+
+    def readtext(self, image, detail=1):
+        return self.read(image, 1)
+
+    def readtext_batched(self, images, detail=1):
+        return [self.read(image, len(images)) for image in images]
+""",
+}
+
+
+class OCRExecutorTests(SimpleTestCase):
+
+    def setUp(self):
+        modules = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, modules, ignore_errors=True)
+        for name, source in FAKE_OCR_MODULES.items():
+            with open(os.path.join(modules, name), 'w') as f:
+                f.write(source)
+        # spawned workers start with the sys.path of this process
+        sys.path.insert(0, modules)
+        self.addCleanup(sys.path.remove, modules)
+        self.addCleanup(sys.modules.pop, 'easyocr', None)
+
+        # two widths, so the crops form two batches of different shapes
+        self.crops = [np.full((20, 60 if value % 2 else 90), value, np.uint8) for value in range(10, 22)]
+
+    def test_results_are_parsed_in_order(self):
+        with OCRExecutor(workers=2, batch_size=4) as executor:
+            results = executor.read(self.crops, parse=parse_license_plate)
+        self.assertEqual([text for text, _ in results], ['AB%02dCDE' % value for value in range(10, 22)])
+        # six crops of each width, in batches of up to four
+        self.assertEqual(sorted(round(score, 2) for _, score in results), [0.52] * 4 + [0.54] * 8)
+
+    def test_crops_are_read_at_the_same_geometry_in_process(self):
+        import easyocr
+
+        reader = mock.Mock(wraps=easyocr.Reader(['en']))
+        with mock.patch('alpr.core.utils_alpr.get_ocr_reader', return_value=reader):
+            self.assertEqual(read_license_plate(self.crops[0]), ('AB10CDE', 0.51))
+        image = reader.readtext.call_args[0][0]
+        self.assertEqual(image.shape, normalize_crop(self.crops[0]).shape)
+        self.assertEqual(image.shape, (64, 288))
@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.db.models import Sum
 from datetime import date
-import pandas as pd
 from collections import Counter
 from django.http import HttpResponse
 from .models import VideoUpload
@@ -29,7 +28,8 @@ def video_detail(request, video_id):
     license_plates = []
     if video.is_processed and video.csv_file:
         try:
-            df = pd.read_csv(video.csv_file.path)
+            from .core.results_io import load_results_dataframe
+            df = load_results_dataframe(video.csv_file.path, boxes=False)
             if 'license_number' in df.columns:
                 df = df[df['license_number'] != '0']
                 for car_id in df['car_id'].unique():
@@ -58,7 +58,8 @@ def verification_dashboard(request, video_id):
     
     if video.is_processed and video.csv_file:
         try:
-            df = pd.read_csv(video.csv_file.path)
+            from .core.results_io import load_results_dataframe
+            df = load_results_dataframe(video.csv_file.path, boxes=False)
             
             # Check if we have the necessary columns
             if 'car_id' in df.columns and 'license_number' in df.columns:
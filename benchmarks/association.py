@@ -0,0 +1,68 @@
+"""
+Scaling benchmark of detection-to-track association.
+
+Sweeps the number of tracks in a synthetic crowded frame (a toll plaza: a grid of lanes with cars
+queued close together), checks that the gated engine matches the same pairs as the dense
+associate_detections_to_trackers and times both.
+
+    python -m benchmarks.association [--tracks 50 100 200 400 800] [--repeat 20] [--jitter 4]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from alpr.sort.association import associate_gated
+from alpr.sort.sort import associate_detections_to_trackers
+
+
+def synthetic_frame(n_tracks, seed=0, jitter=4., keep=0.95, births=0.05):
+    """ Predicted track boxes and this frame's detections (moved, some missing, some new) """
+    rng = np.random.default_rng(seed)
+    lanes = max(1, int(np.sqrt(n_tracks / 4)))
+    per_lane = int(np.ceil(n_tracks / lanes))
+    lane = np.arange(n_tracks) % lanes
+    slot = np.arange(n_tracks) // lanes
+    size = rng.uniform([70, 50], [110, 80], size=(n_tracks, 2))
+    centre = np.stack([lane * 130. + 65, slot * 95. + 50], axis=1)
+    trackers = np.concatenate([centre - size / 2, centre + size / 2, np.zeros((n_tracks, 1))], axis=1)
+
+    seen = rng.random(n_tracks) < keep
+    moved = centre[seen] + rng.normal(0, jitter, size=(seen.sum(), 2))
+    detections = np.concatenate([moved - size[seen] / 2, moved + size[seen] / 2, rng.uniform(0.5, 1, (seen.sum(), 1))], axis=1)
+
+    n_new = int(births * n_tracks)
+    new_centre = np.stack([rng.uniform(0, lanes * 130., n_new), np.full(n_new, per_lane * 95. + 50)], axis=1)
+    new = np.concatenate([new_centre - 40, new_centre + 40, np.ones((n_new, 1))], axis=1)
+    return rng.permutation(np.concatenate([detections, new])), trackers
+
+
+def timed(func, detections, trackers, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(detections, trackers, 0.3)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, nargs='+', default=[50, 100, 200, 400, 800])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--jitter', type=float, default=4., help='detection noise in pixels; higher means more conflicts')
+    args = parser.parse_args()
+
+    print('{:>7} {:>8} {:>12} {:>12} {:>8}'.format('tracks', 'matches', 'dense ms', 'gated ms', 'speedup'))
+    for n_tracks in args.tracks:
+        detections, trackers = synthetic_frame(n_tracks, jitter=args.jitter)
+        dense, dense_time = timed(associate_detections_to_trackers, detections, trackers, args.repeat)
+        gated, gated_time = timed(associate_gated, detections, trackers, args.repeat)
+
+        assert np.array_equal(dense[0][np.argsort(dense[0][:, 0])], gated[0]), 'gated association matched other pairs'
+        assert np.array_equal(np.sort(dense[1]), gated[1]) and np.array_equal(np.sort(dense[2]), gated[2])
+
+        print('{:>7} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            n_tracks, len(gated[0]), 1000 * dense_time, 1000 * gated_time, dense_time / gated_time))
+
+
+if __name__ == '__main__':
+    main()
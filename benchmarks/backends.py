@@ -0,0 +1,116 @@
+"""
+Parity and latency benchmark of the inference backends against the PyTorch path.
+
+Runs the stock ultralytics model and each requested backend on the same frames, matches their
+boxes by IoU and reports how far the exported/quantized graph drifts, plus per-frame latency with
+one frame per call and with --batch frames per call, the way detect_batches feeds the models.
+
+    python -m benchmarks.backends --model yolov8n.pt --video media/camera_feeds/cam1.mp4 \
+        --backend onnx openvino --int8 --calibration media/calibration --batch 8
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from alpr.core.backends import load_yolo
+from alpr.sort.sort import iou_batch
+
+
+def read_frames(video_path, limit, stride):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    frame_nmr = 0
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_nmr % stride == 0:
+            frames.append(frame)
+        frame_nmr += 1
+    cap.release()
+    return frames
+
+
+def run(model, frames, batch=1, warmup=3):
+    """ Boxes of every frame and the latency per frame, calling the model on batch frames at a time """
+    for start in range(0, min(warmup * batch, len(frames)), batch):
+        model(frames[start:start + batch], verbose=False)
+
+    boxes = []
+    latencies = []
+    for start in range(0, len(frames), batch):
+        chunk = frames[start:start + batch]
+        begin = time.perf_counter()
+        results = model(chunk, verbose=False)
+        latencies.extend([(time.perf_counter() - begin) / len(chunk)] * len(chunk))
+        boxes.extend(result.boxes.data.cpu().numpy() for result in results)
+    return boxes, np.array(latencies)
+
+
+def compare(reference, candidate, iou_threshold=0.5):
+    """ Match boxes per frame by IoU and class; returns (recall, precision, mean IoU, max score diff) """
+    matched = ref_total = cand_total = 0
+    ious = []
+    score_diff = 0.
+    for ref, cand in zip(reference, candidate):
+        ref_total += len(ref)
+        cand_total += len(cand)
+        if len(ref) == 0 or len(cand) == 0:
+            continue
+        iou = iou_batch(ref[:, :4], cand[:, :4])
+        iou[ref[:, 5][:, None] != cand[:, 5][None, :]] = 0.
+        for i in range(len(ref)):
+            j = int(np.argmax(iou[i]))
+            if iou[i, j] >= iou_threshold:
+                matched += 1
+                ious.append(iou[i, j])
+                score_diff = max(score_diff, abs(ref[i, 4] - cand[j, 4]))
+                iou[:, j] = 0.
+    recall = matched / ref_total if ref_total else 1.
+    precision = matched / cand_total if cand_total else 1.
+    return recall, precision, float(np.mean(ious)) if ious else 0., score_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--stride', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=8, help='frames per call of the batched run')
+    parser.add_argument('--backend', nargs='+', default=['onnx', 'openvino'])
+    parser.add_argument('--int8', action='store_true', help='also benchmark the int8 graphs')
+    parser.add_argument('--calibration', help='frames used to calibrate int8 (defaults to --video)')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames, args.stride)
+    torch_model = load_yolo(args.model)
+    reference, torch_latency = run(torch_model, frames)
+    _, torch_batched = run(torch_model, frames, args.batch)
+
+    print('{:<16} {:>9} {:>9} {:>9} {:>8} {:>8} {:>9} {:>9}'.format(
+        'backend', 'mean ms', 'p95 ms', f'b{args.batch} ms', 'recall', 'prec.', 'mean IoU', 'max dS'))
+    print('{:<16} {:>9.1f} {:>9.1f} {:>9.1f} {:>8} {:>8} {:>9} {:>9}'.format(
+        'torch', 1000 * torch_latency.mean(), 1000 * np.percentile(torch_latency, 95),
+        1000 * torch_batched.mean(), '-', '-', '-', '-'))
+
+    variants = [(backend, False) for backend in args.backend]
+    if args.int8:
+        variants += [(backend, True) for backend in args.backend]
+    for backend, int8 in variants:
+        model = load_yolo(args.model, backend=backend, int8=int8, calibration=args.calibration or args.video)
+        boxes, latency = run(model, frames)
+        batched_boxes, batched = run(model, frames, args.batch)
+        # the pipeline calls the graph with batches, so report the worse parity of the two runs
+        recall, precision, mean_iou, score_diff = compare(reference, boxes)
+        b_recall, b_precision, b_mean_iou, b_score_diff = compare(reference, batched_boxes)
+        print('{:<16} {:>9.1f} {:>9.1f} {:>9.1f} {:>8.3f} {:>8.3f} {:>9.3f} {:>9.3f}'.format(
+            backend + (' int8' if int8 else ''), 1000 * latency.mean(), 1000 * np.percentile(latency, 95),
+            1000 * batched.mean(), min(recall, b_recall), min(precision, b_precision), min(mean_iou, b_mean_iou),
+            max(score_diff, b_score_diff)))
+
+
+if __name__ == '__main__':
+    main()
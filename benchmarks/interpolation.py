@@ -0,0 +1,128 @@
+"""
+Scaling benchmark for the track interpolation step.
+
+Builds synthetic process_video output (cars x frames, with random detection gaps), checks that the
+vectorized engine returns exactly the rows of the previous per-car implementation, and times both.
+
+    python -m benchmarks.interpolation [--cars 10 50 200] [--frames 1800]
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.interpolate import interp1d
+
+from alpr.core.interpolation import interpolate_rows
+
+
+def legacy_interpolate(data):
+    """ The per-car implementation interpolate_bounding_boxes used before the vectorized engine """
+    frame_numbers = np.array([int(row['frame_nmr']) for row in data])
+    car_ids = np.array([int(float(row['car_id'])) for row in data])
+    car_bboxes = np.array([list(map(float, row['car_bbox'][1:-1].split())) for row in data])
+    license_plate_bboxes = np.array([list(map(float, row['license_plate_bbox'][1:-1].split())) for row in data])
+
+    interpolated_data = []
+    for car_id in np.unique(car_ids):
+        frame_numbers_ = [p['frame_nmr'] for p in data if int(float(p['car_id'])) == int(float(car_id))]
+        car_mask = car_ids == car_id
+        car_frame_numbers = frame_numbers[car_mask]
+        car_bboxes_interpolated = []
+        license_plate_bboxes_interpolated = []
+        first_frame_number = car_frame_numbers[0]
+
+        for i in range(len(car_bboxes[car_mask])):
+            frame_number = car_frame_numbers[i]
+            car_bbox = car_bboxes[car_mask][i]
+            license_plate_bbox = license_plate_bboxes[car_mask][i]
+            if i > 0:
+                prev_frame_number = car_frame_numbers[i - 1]
+                prev_car_bbox = car_bboxes_interpolated[-1]
+                prev_license_plate_bbox = license_plate_bboxes_interpolated[-1]
+                if frame_number - prev_frame_number > 1:
+                    frames_gap = frame_number - prev_frame_number
+                    x = np.array([prev_frame_number, frame_number])
+                    x_new = np.linspace(prev_frame_number, frame_number, num=frames_gap, endpoint=False)
+                    interp_func = interp1d(x, np.vstack((prev_car_bbox, car_bbox)), axis=0, kind='linear')
+                    car_bboxes_interpolated.extend(interp_func(x_new)[1:])
+                    interp_func = interp1d(x, np.vstack((prev_license_plate_bbox, license_plate_bbox)), axis=0, kind='linear')
+                    license_plate_bboxes_interpolated.extend(interp_func(x_new)[1:])
+            car_bboxes_interpolated.append(car_bbox)
+            license_plate_bboxes_interpolated.append(license_plate_bbox)
+
+        for i in range(len(car_bboxes_interpolated)):
+            frame_number = first_frame_number + i
+            row = {
+                'frame_nmr': str(frame_number),
+                'car_id': str(car_id),
+                'car_bbox': ' '.join(map(str, car_bboxes_interpolated[i])),
+                'license_plate_bbox': ' '.join(map(str, license_plate_bboxes_interpolated[i])),
+            }
+            if str(frame_number) not in frame_numbers_:
+                row['license_plate_bbox_score'] = '0'
+                row['license_number'] = '0'
+                row['license_number_score'] = '0'
+            else:
+                original_row = [p for p in data if int(p['frame_nmr']) == frame_number and int(float(p['car_id'])) == int(float(car_id))][0]
+                row['license_plate_bbox_score'] = original_row['license_plate_bbox_score']
+                row['license_number'] = original_row['license_number']
+                row['license_number_score'] = original_row['license_number_score']
+            interpolated_data.append(row)
+
+    return interpolated_data
+
+
+def synthetic_rows(n_cars, n_frames, keep=0.6, seed=0):
+    """ Rows as csv.DictReader returns them: each car is visible for a random span and detected in ~keep of it """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for frame_nmr in range(n_frames):
+        for car_id in range(1, n_cars + 1):
+            start = (car_id * 37) % max(1, n_frames // 2)
+            if not start <= frame_nmr < start + n_frames // 2 or rng.random() > keep:
+                continue
+            x, y = 10. * car_id + frame_nmr, 5. * car_id + 0.5 * frame_nmr
+            rows.append({
+                'frame_nmr': str(frame_nmr),
+                'car_id': str(float(car_id)),
+                'car_bbox': '[{} {} {} {}]'.format(x, y, x + 200.5, y + 150.25),
+                'license_plate_bbox': '[{} {} {} {}]'.format(x + 60, y + 100, x + 140.75, y + 125.5),
+                'license_plate_bbox_score': str(rng.random()),
+                'license_number': 'AB12CDE',
+                'license_number_score': str(rng.random()),
+            })
+    return rows
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cars', type=int, nargs='+', default=[5, 20, 50, 100])
+    parser.add_argument('--frames', type=int, default=900)
+    parser.add_argument('--skip-legacy-above', type=int, default=20000,
+                        help='only time the legacy implementation up to this many input rows')
+    args = parser.parse_args()
+
+    print('{:>6} {:>8} {:>10} {:>12} {:>12} {:>8}'.format('cars', 'rows', 'out rows', 'legacy s', 'vector s', 'speedup'))
+    for n_cars in args.cars:
+        data = synthetic_rows(n_cars, args.frames)
+        rows, vector_time = timed(interpolate_rows, data)
+
+        if len(data) <= args.skip_legacy_above:
+            expected, legacy_time = timed(legacy_interpolate, data)
+            assert rows == expected, 'vectorized interpolation differs from the legacy rows'
+            legacy = '{:.3f}'.format(legacy_time)
+            speedup = '{:.1f}x'.format(legacy_time / vector_time)
+        else:
+            legacy, speedup = '-', '-'
+
+        print('{:>6} {:>8} {:>10} {:>12} {:>12.3f} {:>8}'.format(n_cars, len(data), len(rows), legacy, vector_time, speedup))
+
+
+if __name__ == '__main__':
+    main()
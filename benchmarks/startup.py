@@ -0,0 +1,84 @@
+"""
+Startup-time guard for manage.py.
+
+Runs a management command (``check`` by default) in fresh interpreters with -X importtime, reports
+the wall time and the slowest top-level imports, and exits non-zero when the command is slower
+than --max-seconds or when it imported one of the ML frameworks, which must only be loaded on
+first use.
+
+    python -m benchmarks.startup [--runs 5] [--max-seconds 2.0] [--command check]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MANAGE_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'manage.py')
+
+# Top-level packages a plain manage.py invocation must not import
+HEAVY_MODULES = ('torch', 'torchvision', 'tensorflow', 'tensorflow_hub', 'ultralytics', 'easyocr', 'cv2',
+                 'pandas', 'scipy', 'filterpy', 'onnxruntime', 'openvino')
+
+
+def parse_importtime(stderr):
+    """ Cumulative microseconds of every top-level package imported, from -X importtime output """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        package = name.strip().split('.')[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return packages
+
+
+def run(command):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', MANAGE_PY] + command,
+                          capture_output=True, text=True, cwd=os.path.dirname(MANAGE_PY))
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith('import time:')]
+        raise SystemExit('manage.py {} failed:\n{}'.format(' '.join(command), '\n'.join(errors)))
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--command', nargs='+', default=['check'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=2.0,
+                        help='fail when the median wall time is above this')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to list')
+    args = parser.parse_args()
+
+    timings = []
+    packages = {}
+    for _ in range(args.runs):
+        elapsed, packages = run(args.command)
+        timings.append(elapsed)
+
+    median = statistics.median(timings)
+    print('manage.py {}: median {:.2f}s, min {:.2f}s over {} runs'.format(
+        ' '.join(args.command), median, min(timings), args.runs))
+    print('{:<24} {:>10}'.format('import', 'ms'))
+    for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print('{:<24} {:>10.1f}'.format(package, micros / 1000.))
+
+    failures = []
+    heavy = [name for name in HEAVY_MODULES if name in packages]
+    if heavy:
+        failures.append('imported at startup: ' + ', '.join(heavy))
+    if median > args.max_seconds:
+        failures.append('median {:.2f}s is above the {:.2f}s budget'.format(median, args.max_seconds))
+    if failures:
+        raise SystemExit('FAIL: ' + '; '.join(failures))
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
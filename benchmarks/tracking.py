@@ -0,0 +1,69 @@
+"""
+Parity and scaling benchmark of the vectorized SORT (BankSort) against the filterpy-based Sort.
+
+Builds a synthetic scene of cars moving across the frame with noisy, sometimes missing detections,
+feeds the same detections to both trackers, checks that every frame returns the same track ids
+(and boxes up to float rounding) and times both.
+
+    python -m benchmarks.tracking [--tracks 10 40 80 160] [--frames 300]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from alpr.sort.bank import BankSort
+from alpr.sort.sort import Sort
+
+
+def synthetic_detections(n_tracks, n_frames, keep=0.9, seed=0):
+    """ Per frame, an (N, 5) array of [x1, y1, x2, y2, score] for the cars detected in it """
+    rng = np.random.default_rng(seed)
+    # cars on a grid of lanes, so they rarely overlap
+    cols = int(np.ceil(np.sqrt(n_tracks)))
+    start = np.stack([(np.arange(n_tracks) % cols) * 120., (np.arange(n_tracks) // cols) * 90.], axis=1)
+    velocity = rng.uniform(-1.5, 1.5, size=(n_tracks, 2))
+    size = rng.uniform([60, 40], [90, 60], size=(n_tracks, 2))
+
+    frames = []
+    for frame_nmr in range(n_frames):
+        centre = start + velocity * frame_nmr + rng.normal(0, 0.5, size=(n_tracks, 2))
+        boxes = np.concatenate([centre - size / 2, centre + size / 2, rng.uniform(0.5, 1., (n_tracks, 1))], axis=1)
+        frames.append(boxes[rng.random(n_tracks) < keep])
+    return frames
+
+
+def run(tracker, frames):
+    outputs = []
+    start = time.perf_counter()
+    for dets in frames:
+        outputs.append(tracker.update(dets))
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, nargs='+', default=[10, 40, 80, 160])
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    print('{:>7} {:>10} {:>10} {:>8} {:>12}'.format('tracks', 'sort s', 'bank s', 'speedup', 'max |dbox|'))
+    for n_tracks in args.tracks:
+        frames = synthetic_detections(n_tracks, args.frames)
+        expected, sort_time = run(Sort(), frames)
+        rows, bank_time = run(BankSort(), frames)
+
+        max_diff = 0.
+        for frame_nmr, (a, b) in enumerate(zip(expected, rows)):
+            assert a.shape == b.shape and np.array_equal(a[:, 4], b[:, 4]), \
+                'BankSort returned different tracks in frame {}'.format(frame_nmr)
+            if len(a):
+                max_diff = max(max_diff, float(np.abs(a[:, :4] - b[:, :4]).max()))
+        assert max_diff < 1e-6, 'BankSort boxes drift from Sort by {}'.format(max_diff)
+
+        print('{:>7} {:>10.3f} {:>10.3f} {:>7.1f}x {:>12.2e}'.format(
+            n_tracks, sort_time, bank_time, sort_time / bank_time, max_diff))
+
+
+if __name__ == '__main__':
+    main()